@@ -0,0 +1,142 @@
+"""
+Out-of-core PCA of the bow strokes of an experiment, measurement device and timepoint.
+
+Every bow stroke (participant_id, bow_stroke, up_down) is one sample, its features are the waveforms of all
+(target, axis) channels (the column layout of DatapointRepository.get_feature_matrix). The strokes are streamed from
+DatapointRepository.iter_feature_matrices and fitted with scikit-learn's IncrementalPCA (partial_fit) as they arrive,
+a second streaming pass projects them to their scores. Memory is bounded by the batch size (and the scores), not by
+the size of the experiment. Strokes with missing values (a channel or time point that was not recorded) are skipped.
+
+Run from the src folder, e.g.:
+    python -m analysis.incremental_pca --db ../data/PAH_database.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from typing import Iterator
+import numpy as np
+from sklearn.decomposition import IncrementalPCA
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+from models.feature_matrix import FeatureMatrix
+
+@dataclass
+class StreamingPCAResult:
+    pca: IncrementalPCA             # the fitted model (components_, explained_variance_ratio_, ...)
+    scores: np.ndarray              # (strokes x n_components) projection of the complete strokes
+    row_labels: np.ndarray          # structured array (participant_id, bow_stroke, up_down), one entry per row of scores
+    column_labels: np.ndarray       # structured array (target, axis, time_point), one entry per feature (column of components_)
+    n_skipped: int                  # strokes left out because of missing values
+    seconds: float
+    peak_rss_bytes: int | None      # peak resident set size of the process (None where it cannot be determined)
+
+
+def fit_incremental_pca(exp_id: int, device: str, timepoint: str, n_components: int = 10, batch_size: int = 1_000,
+                        targets: list[str] | None = None, axes: list[str] | None = None,
+                        repo: DatapointRepository | None = None) -> StreamingPCAResult | None:
+    """
+    Fits an IncrementalPCA on the bow strokes of an experiment, measurement device and timepoint and projects
+    the strokes to their scores, streaming the datapoints twice (see the module docstring).
+
+    Args:
+        exp_id (int): The ID of the experiment.
+        device (str): The name of the measurement device (e.g., 'mocap').
+        timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+        n_components (int): The number of principal components.
+        batch_size (int): The number of strokes per partial_fit/transform batch (at least n_components).
+        targets (list[str] | None): Optional list of measurement targets, all targets are used if None.
+        axes (list[str] | None): Optional list of measurement axes, all axes are used if None.
+        repo (DatapointRepository | None): The repository to stream from (default: a new DatapointRepository).
+
+    Returns:
+        StreamingPCAResult | None: The fitted model and the scores, None if no data found.
+    """
+    if batch_size < n_components:
+        raise ValueError(f"batch_size ({batch_size}) must be at least n_components ({n_components})")
+    start = time.perf_counter()
+    repo = repo or DatapointRepository()
+
+    # first pass: partial_fit, one batch is held back so the last (possibly smaller) batch can be merged into it;
+    # batches are stacked until they have at least n_components strokes (e.g. after incomplete strokes)
+    pca = IncrementalPCA(n_components=n_components)
+    pending, n_skipped, column_labels = None, 0, None
+    for batch, skipped in _complete_batches(repo, exp_id, device, timepoint, targets, axes, batch_size):
+        n_skipped += skipped
+        column_labels = batch.column_labels
+        batch = batch.values
+        if pending is not None and len(pending) >= n_components and len(batch) >= n_components:
+            pca.partial_fit(pending)
+            pending = batch
+        else:
+            pending = batch if pending is None else np.vstack([pending, batch])
+    if pending is None and n_skipped == 0:
+        return None
+    if pending is None or len(pending) < n_components:
+        raise ValueError(f"{0 if pending is None else len(pending)} complete strokes are not enough "
+                         f"for {n_components} components")
+    pca.partial_fit(pending)
+    del pending
+
+    # second pass: transform
+    scores, row_labels = [], []
+    for batch, _ in _complete_batches(repo, exp_id, device, timepoint, targets, axes, batch_size):
+        if len(batch.values) == 0:
+            continue
+        scores.append(pca.transform(batch.values))
+        row_labels.append(batch.row_labels)
+    return StreamingPCAResult(pca=pca, scores=np.vstack(scores), row_labels=np.concatenate(row_labels),
+                              column_labels=column_labels, n_skipped=n_skipped,
+                              seconds=time.perf_counter() - start, peak_rss_bytes=peak_rss_bytes())
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    Returns the peak resident set size of the current process in bytes (None on platforms without the resource module).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024        # bytes on macOS, kilobytes on Linux
+
+
+def _complete_batches(repo: DatapointRepository, exp_id: int, device: str, timepoint: str, targets: list[str] | None,
+                      axes: list[str] | None, batch_size: int) -> Iterator[tuple[FeatureMatrix, int]]:
+    """
+    Streams the strokes in batches (DatapointRepository.iter_feature_matrices) and drops the incomplete ones.
+
+    Yields:
+        tuple[FeatureMatrix, int]: The complete strokes of the batch and the number of strokes that were skipped
+        because of missing values (the matrix may have no rows).
+    """
+    for batch in repo.iter_feature_matrices(exp_id, device, timepoint, targets, axes, batch_size):
+        complete = ~np.isnan(batch.values).any(axis=1)
+        yield (FeatureMatrix(values=batch.values[complete], row_labels=batch.row_labels[complete],
+                             column_labels=batch.column_labels), int((~complete).sum()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--timepoint", default="pre")
+    parser.add_argument("--n-components", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    result = fit_incremental_pca(args.exp_id, args.device, args.timepoint, args.n_components, args.batch_size)
+    if result is None:
+        print("no data found")
+        return
+    print(f"{len(result.scores)} strokes ({result.n_skipped} skipped), {len(result.column_labels)} features")
+    print(f"explained variance ratio: {np.round(result.pca.explained_variance_ratio_, 4)}")
+    print(f"{result.seconds:.2f} s, peak RSS {result.peak_rss_bytes / 2**20:.1f} MB" if result.peak_rss_bytes
+          else f"{result.seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
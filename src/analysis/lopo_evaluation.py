@@ -0,0 +1,197 @@
+"""
+Leave-one-participant-out (LOPO) evaluation of PCA -> LDA classifiers of the PRMD pain labels.
+
+Every bow stroke is one sample (features: the waveforms of the selected device/timepoint/targets/axes, see
+DatapointRepository.get_feature_matrix), its label is the PRMD flag of its participant. For every label and every
+participant, PCA + LDA are fitted on the strokes of all other participants and evaluated on the held-out participant.
+
+The feature matrix is built once and placed in shared memory, the folds run in parallel in a process pool whose
+workers attach to it (the matrix is not pickled per fold or per worker).
+
+Run from the src folder, e.g.:
+    python -m analysis.lopo_evaluation --db ../data/PAH_database.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+from data_access.participant_repository import ParticipantRepository
+
+# the pain label columns of the participant table
+PRMD_LABELS = ("PRMD_ever", "PRMD_shoulder_neck_right", "PRMD_shoulder_neck_left", "PRMD_upper_arm_right",
+               "PRMD_upper_arm_left")
+
+@dataclass
+class FoldResult:
+    label: str                      # the PRMD label column
+    participant_id: str             # the held-out participant
+    n_train: int                    # number of training strokes
+    n_test: int                     # number of test strokes (of the held-out participant)
+    accuracy: float | None          # share of correctly classified test strokes, None if the fold could not be evaluated
+    fit_seconds: float
+    predict_seconds: float
+    error: str | None = None        # why the fold could not be evaluated (e.g. only one class in the training data)
+
+@dataclass
+class LOPOReport:
+    label: str
+    folds: list[FoldResult]
+
+    @property
+    def accuracy(self) -> float | None:
+        """
+        Accuracy over all test strokes of the evaluated folds.
+        """
+        evaluated = [fold for fold in self.folds if fold.accuracy is not None]
+        n_test = sum(fold.n_test for fold in evaluated)
+        return sum(fold.accuracy * fold.n_test for fold in evaluated) / n_test if n_test else None
+
+    @property
+    def participant_accuracy(self) -> float | None:
+        """
+        Mean of the fold accuracies (every participant weighs the same).
+        """
+        evaluated = [fold.accuracy for fold in self.folds if fold.accuracy is not None]
+        return float(np.mean(evaluated)) if evaluated else None
+
+
+def evaluate_lopo(exp_id: int, device: str, timepoint: str, labels: tuple[str, ...] = PRMD_LABELS,
+                  targets: list[str] | None = None, axes: list[str] | None = None, n_components: int = 10,
+                  workers: int | None = None) -> dict[str, LOPOReport] | None:
+    """
+    Runs the leave-one-participant-out evaluation of PCA -> LDA for every label (see the module docstring).
+
+    Args:
+        exp_id (int): The ID of the experiment.
+        device (str): The name of the measurement device (e.g., 'mocap').
+        timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+        labels (tuple[str, ...]): The PRMD label columns to classify.
+        targets (list[str] | None): Optional list of measurement targets, all targets are used if None.
+        axes (list[str] | None): Optional list of measurement axes, all axes are used if None.
+        n_components (int): The number of principal components (fewer if a fold has fewer training strokes).
+        workers (int | None): Number of worker processes (default: number of CPUs).
+
+    Returns:
+        dict[str, LOPOReport] | None: The fold results per label, None if no data found.
+    """
+    for label in labels:
+        if label not in PRMD_LABELS:
+            raise ValueError(f"unknown label column '{label}', expected one of {PRMD_LABELS}")
+    matrix = DatapointRepository().get_feature_matrix(exp_id, device, timepoint, targets, axes)
+    participants = ParticipantRepository().get_participants_by_exp_id(exp_id)
+    if matrix is None or participants.empty:
+        return None
+
+    # strokes with missing values (a target/axis/time point that was not recorded) cannot be used
+    complete = ~np.isnan(matrix.values).any(axis=1)
+    values = matrix.values[complete]
+    groups, participant_ids = pd.factorize(matrix.row_labels["participant_id"][complete])
+    participant_labels = participants.set_index("participant_id")[list(labels)].astype(float)
+    label_values = participant_labels.reindex(participant_ids).to_numpy()[groups]       # (strokes x labels), NaN if unknown
+
+    shared = SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shared.buf)[:] = values
+        del values
+        matrix_spec = (shared.name, matrix.values.dtype.str, (int(complete.sum()), matrix.values.shape[1]))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(matrix_spec, groups, label_values, n_components)) as pool:
+            futures = [(label, pool.submit(_run_fold, label_index, group))
+                       for label_index, label in enumerate(labels)
+                       for group in range(len(participant_ids))
+                       if not np.isnan(participant_labels.at[participant_ids[group], label])]
+            reports = {label: LOPOReport(label=label, folds=[]) for label in labels}
+            for label, future in futures:
+                fold = future.result()
+                fold.label, fold.participant_id = label, participant_ids[fold.participant_id]
+                reports[label].folds.append(fold)
+    finally:
+        shared.close()
+        shared.unlink()
+    return reports
+
+
+# data of the worker processes, set by _attach
+_worker = {}
+
+def _attach(matrix_spec: tuple, groups: np.ndarray, label_values: np.ndarray, n_components: int):
+    """
+    Initializer of the worker processes: attaches to the shared feature matrix.
+    """
+    name, dtype, shape = matrix_spec
+    shared = SharedMemory(name=name)
+    _worker.update(shared=shared, values=np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared.buf),
+                   groups=groups, label_values=label_values, n_components=n_components)
+
+def _run_fold(label_index: int, group: int) -> FoldResult:
+    """
+    Fits PCA + LDA on all strokes except those of participant `group` and evaluates on the held-out strokes.
+    The returned FoldResult carries the participant index in participant_id (resolved by evaluate_lopo).
+    """
+    values, groups = _worker["values"], _worker["groups"]
+    y = _worker["label_values"][:, label_index]
+    labelled = ~np.isnan(y)
+    train = labelled & (groups != group)
+    test = labelled & (groups == group)
+    result = FoldResult(label="", participant_id=group, n_train=int(train.sum()), n_test=int(test.sum()),
+                        accuracy=None, fit_seconds=0.0, predict_seconds=0.0)
+    if len(np.unique(y[train])) < 2:
+        result.error = "only one class in the training data"
+        return result
+
+    start = time.perf_counter()
+    pca = PCA(n_components=min(_worker["n_components"], result.n_train - 1, values.shape[1]))
+    lda = LinearDiscriminantAnalysis().fit(pca.fit_transform(values[train]), y[train])
+    result.fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    predicted = lda.predict(pca.transform(values[test]))
+    result.predict_seconds = time.perf_counter() - start
+    result.accuracy = float((predicted == y[test]).mean())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--timepoint", default="pre")
+    parser.add_argument("--targets", nargs="+", default=None)
+    parser.add_argument("--axes", nargs="+", default=None)
+    parser.add_argument("--labels", nargs="+", default=list(PRMD_LABELS))
+    parser.add_argument("--n-components", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="print every fold")
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    start = time.perf_counter()
+    reports = evaluate_lopo(args.exp_id, args.device, args.timepoint, tuple(args.labels), args.targets, args.axes,
+                            args.n_components, args.workers)
+    if reports is None:
+        print("no data found")
+        return
+    print(f"{'label':<26} {'folds':>5} {'accuracy':>9} {'per participant':>16} {'fit [s]':>8}")
+    for report in reports.values():
+        accuracy, participant_accuracy = report.accuracy, report.participant_accuracy
+        print(f"{report.label:<26} {len(report.folds):>5} "
+              f"{'n/a' if accuracy is None else f'{accuracy:.3f}':>9} "
+              f"{'n/a' if participant_accuracy is None else f'{participant_accuracy:.3f}':>16} "
+              f"{sum(fold.fit_seconds + fold.predict_seconds for fold in report.folds):>8.2f}")
+        if args.verbose:
+            for fold in report.folds:
+                print(f"    {fold.participant_id}: {fold.n_test} strokes, "
+                      + (f"accuracy {fold.accuracy:.3f}, fit {fold.fit_seconds:.3f} s, predict {fold.predict_seconds:.3f} s"
+                         if fold.accuracy is not None else fold.error))
+    print(f"total: {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
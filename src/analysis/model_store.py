@@ -0,0 +1,272 @@
+"""
+Content-addressed store of fitted PCA (and LDA) models, so refitting the same selection is served from disk.
+
+A model is stored under the hash of its input: the query arguments (experiment, device, timepoint, targets, axes),
+the model parameters, the shape of the feature matrix and a checksum of its values, labels and the label of every
+row (the y of the LDA). A lookup alias (query arguments + data_folder/upload_complete state of the experiment and
+a checksum of its participant rows -> content key) makes later fits of the same
+selection instant, without loading the datapoints again. Models are only stored for experiments whose upload is
+complete, and the aliases of an experiment are removed whenever its data changes through the repositories
+(data_access.query_cache.invalidate_experiment). The least recently used models are evicted once the store
+exceeds its size limit.
+
+Layout of the store directory:
+    exp_<exp_id>/<lookup hash>.json     alias of a selection -> content key
+    models/<content key>/               pca.pkl, lda.pkl, arrays.npz (explained variance, loadings, scores, labels),
+                                        meta.json (the selection; its modification time is the last use)
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from dataclasses import dataclass
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sqlite3 import Connection
+from db.connection import get_connection, get_read_connection
+from data_access.datapoint_repository import DatapointRepository
+from data_access.participant_repository import ParticipantRepository
+from data_access.query_cache import default_cache_dir, register_cache_dir
+from models.feature_matrix import ROW_LABEL_DTYPE, COLUMN_LABEL_DTYPE
+
+# the default store directory, next to the database (see data_access.query_cache.default_cache_dir)
+DEFAULT_STORE_DIR_NAME = 'models'
+DEFAULT_MAX_BYTES = 1 << 30         # 1 GB
+
+@dataclass
+class FittedModels:
+    key: str                                # content key of the models in the store (None if they were not stored)
+    pca: PCA
+    lda: LinearDiscriminantAnalysis | None  # LDA on the PCA scores, None if no label was given
+    explained_variance_ratio: np.ndarray
+    loadings: np.ndarray                    # (n_components x features), pca.components_
+    scores: np.ndarray                      # (strokes x n_components)
+    row_labels: np.ndarray                  # structured array (participant_id, bow_stroke, up_down), one entry per row of scores
+    column_labels: np.ndarray               # structured array (target, axis, time_point), one entry per feature
+    cached: bool                            # whether the models were loaded from the store
+
+
+class ModelStore:
+    def __init__(self, store_dir: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Initializes the ModelStore (see the module docstring).
+
+        Args:
+            store_dir (str | None): The directory the models are stored in, 'models' next to the database if None.
+            max_bytes (int): The maximum total size of the stored models, least recently used models are evicted beyond it.
+        """
+        self.conn = get_connection()
+        self.store_dir = default_cache_dir(DEFAULT_STORE_DIR_NAME) if store_dir is None else os.path.abspath(store_dir)
+        self.max_bytes = max_bytes
+        register_cache_dir(self.store_dir)
+
+    @property
+    def read_conn(self) -> Connection:
+        """
+        The read-only connection of the calling thread (see db.connection.get_read_connection).
+        """
+        return get_read_connection()
+
+    def fit(self, exp_id: int, device: str, timepoint: str, targets: list[str] | None = None,
+            axes: list[str] | None = None, n_components: int = 10, label: str | None = None) -> FittedModels | None:
+        """
+        Returns the PCA (and optionally LDA) of the bow strokes of a selection, from the store if it was fitted before.
+        Strokes with missing values are left out.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'mocap').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            targets (list[str] | None): Optional list of measurement targets, all targets are used if None.
+            axes (list[str] | None): Optional list of measurement axes, all axes are used if None.
+            n_components (int): The number of principal components.
+            label (str | None): Optional participant column (e.g. 'PRMD_ever') to fit an LDA on the PCA scores.
+
+        Returns:
+            FittedModels | None: The fitted models, None if no data found.
+        """
+        selection = {"exp_id": exp_id, "device": device, "timepoint": timepoint, "targets": targets, "axes": axes,
+                     "n_components": n_components, "label": label}
+        state = self._experiment_state(exp_id)
+        alias_path = None
+        if state is not None:
+            alias_path = os.path.join(self.store_dir, f"exp_{exp_id}", f"{_hash(json.dumps([selection, state]))}.json")
+            models = self._load_alias(alias_path)
+            if models is not None:
+                return models
+
+        matrix = DatapointRepository().get_feature_matrix(exp_id, device, timepoint, targets, axes)
+        if matrix is None:
+            return None
+        complete = ~np.isnan(matrix.values).any(axis=1)
+        values, row_labels = matrix.values[complete], matrix.row_labels[complete]
+        y = _label_values(exp_id, row_labels, label)
+
+        key = None
+        if state is not None:
+            key = _hash(json.dumps(selection), str(values.shape), np.ascontiguousarray(values).tobytes(),
+                        repr(row_labels.tolist()), repr(matrix.column_labels.tolist()),
+                        b"" if y is None else y.tobytes())
+            models = self._load(key)
+            if models is None:
+                models = _fit(values, row_labels, matrix.column_labels, n_components, y, key)
+                self._save(models, selection)
+            _write_json(alias_path, {"key": key})
+            return models
+        return _fit(values, row_labels, matrix.column_labels, n_components, y, key)
+
+    def size(self) -> int:
+        """
+        Returns the total size of the stored models in bytes.
+        """
+        return sum(size for _, _, size in self._models())
+
+    def evict(self):
+        """
+        Removes the least recently used models until the store is within max_bytes.
+        """
+        models = sorted(self._models())
+        total = sum(size for _, _, size in models)
+        for _, path, size in models:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """
+        Removes all models and aliases.
+        """
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def _experiment_state(self, exp_id: int) -> list | None:
+        """
+        Returns the data_folder/upload_complete state of an experiment and a checksum of its participant rows (so
+        updated labels, e.g. by ParticipantRepository.update_pain_data, change the state), None if its upload is not
+        complete (the data may still change, nothing is stored).
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute("SELECT data_folder, upload_complete FROM experiment WHERE id = ?", (exp_id,))
+        row = cursor.fetchone()
+        if not row or not row[1]:
+            return None
+        cursor.execute("SELECT * FROM participant WHERE experiment_id = ? ORDER BY id", (exp_id,))
+        return [*row, _hash(repr(cursor.fetchall()))]
+
+    def _model_dir(self, key: str) -> str:
+        return os.path.join(self.store_dir, "models", key)
+
+    def _load_alias(self, alias_path: str) -> FittedModels | None:
+        try:
+            with open(alias_path) as file:
+                key = json.load(file)["key"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        return self._load(key)
+
+    def _load(self, key: str) -> FittedModels | None:
+        """
+        Loads the models stored under a content key (and marks them as recently used), None if they are not stored.
+        """
+        model_dir = self._model_dir(key)
+        try:
+            with open(os.path.join(model_dir, "pca.pkl"), "rb") as file:
+                pca = pickle.load(file)
+            with open(os.path.join(model_dir, "lda.pkl"), "rb") as file:
+                lda = pickle.load(file)
+            with np.load(os.path.join(model_dir, "arrays.npz"), allow_pickle=True) as arrays:
+                models = FittedModels(key=key, pca=pca, lda=lda,
+                                      explained_variance_ratio=arrays["explained_variance_ratio"],
+                                      loadings=arrays["loadings"], scores=arrays["scores"],
+                                      row_labels=np.array(list(map(tuple, arrays["row_labels"])), dtype=ROW_LABEL_DTYPE),
+                                      column_labels=np.array(list(map(tuple, arrays["column_labels"])), dtype=COLUMN_LABEL_DTYPE),
+                                      cached=True)
+            os.utime(os.path.join(model_dir, "meta.json"))
+        except (FileNotFoundError, OSError, pickle.UnpicklingError, KeyError, ValueError):
+            return None
+        return models
+
+    def _save(self, models: FittedModels, selection: dict):
+        """
+        Stores the models under their content key (written to a temporary directory first, so readers never see
+        a partial entry) and evicts the least recently used models if the store is too large.
+        """
+        model_dir = self._model_dir(models.key)
+        tmp_dir = f"{model_dir}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        with open(os.path.join(tmp_dir, "pca.pkl"), "wb") as file:
+            pickle.dump(models.pca, file)
+        with open(os.path.join(tmp_dir, "lda.pkl"), "wb") as file:
+            pickle.dump(models.lda, file)
+        np.savez(os.path.join(tmp_dir, "arrays.npz"), explained_variance_ratio=models.explained_variance_ratio,
+                 loadings=models.loadings, scores=models.scores,
+                 row_labels=np.array(models.row_labels.tolist(), dtype=object),
+                 column_labels=np.array(models.column_labels.tolist(), dtype=object))
+        _write_json(os.path.join(tmp_dir, "meta.json"), selection)
+        try:
+            os.replace(tmp_dir, model_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)      # stored concurrently by another process
+        self.evict()
+
+    def _models(self) -> list[tuple[float, str, int]]:
+        """
+        Returns (last use, path, size in bytes) of every stored model.
+        """
+        models_dir = os.path.join(self.store_dir, "models")
+        if not os.path.isdir(models_dir):
+            return []
+        models = []
+        for entry in os.scandir(models_dir):
+            if not entry.is_dir() or entry.name.endswith(".tmp"):
+                continue
+            try:
+                last_use = os.stat(os.path.join(entry.path, "meta.json")).st_mtime
+                size = sum(file.stat().st_size for file in os.scandir(entry.path))
+            except FileNotFoundError:
+                continue
+            models.append((last_use, entry.path, size))
+        return models
+
+
+def _label_values(exp_id: int, row_labels: np.ndarray, label: str | None) -> np.ndarray | None:
+    """
+    Returns the label of every row (the label column of its participant, NaN if missing), None if no label is given.
+    """
+    if label is None:
+        return None
+    participants = ParticipantRepository().get_participants_by_exp_id(exp_id).set_index("participant_id")
+    return participants[label].astype(float).reindex(row_labels["participant_id"]).to_numpy()
+
+def _fit(values: np.ndarray, row_labels: np.ndarray, column_labels: np.ndarray, n_components: int,
+         y: np.ndarray | None, key: str | None) -> FittedModels:
+    """
+    Fits the PCA (and the LDA of the labels y on the PCA scores, strokes without a label are left out).
+    """
+    pca = PCA(n_components=min(n_components, *values.shape))
+    scores = pca.fit_transform(values)
+    lda = None
+    if y is not None:
+        labelled = ~np.isnan(y)
+        lda = LinearDiscriminantAnalysis().fit(scores[labelled], y[labelled])
+    return FittedModels(key=key, pca=pca, lda=lda, explained_variance_ratio=pca.explained_variance_ratio_,
+                        loadings=pca.components_, scores=scores, row_labels=row_labels, column_labels=column_labels,
+                        cached=False)
+
+def _hash(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode())
+    return digest.hexdigest()[:32]
+
+def _write_json(path: str, data):
+    """
+    Writes a JSON file atomically.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
@@ -0,0 +1,69 @@
+"""
+Benchmark: parallel query throughput of the read connection pool vs. the single shared connection, for an increasing
+number of threads. Every thread runs datapoint queries (one per timepoint/target of the device) through the repositories.
+SQLite releases the GIL while a query runs, so with the pool the throughput scales with the number of CPU cores,
+while all threads serialize on the shared connection.
+
+Run from the src folder, e.g.:
+    python -m benchmarks.connection_pool --db ../data/PAH_database.db --exp-id 1 --device mocap --threads 1 2 4 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from db.connection import configure_connections, release_read_connection, close_connection
+from data_access.datapoint_repository import DatapointRepository
+from data_access.measurement_repository import MeasurementRepository
+
+
+def run_queries(queries: list[tuple[str, str]], exp_id: int, device: str, threads: int) -> float:
+    """
+    Runs the (timepoint, target) queries on a thread pool.
+
+    Returns:
+        float: The queries per second.
+    """
+    repo = DatapointRepository()
+
+    def query(timepoint_target):
+        repo.get_datapoints_by_exp_id_device_timepoint_target(exp_id, device, *timepoint_target)
+
+    def release(_):
+        release_read_connection()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(query, queries[:threads]))                   # warm up (opens the read connections)
+        start = time.perf_counter()
+        list(pool.map(query, queries))
+        seconds = time.perf_counter() - start
+        list(pool.map(release, range(threads)))
+    return len(queries) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=4, help="number of times every (timepoint, target) query is run")
+    args = parser.parse_args()
+
+    configure_connections(args.db)
+    measurements = MeasurementRepository()
+    targets = sorted(set(measurements.get_measurements_by_device(args.device, args.exp_id)["target"]))
+    timepoints = measurements.get_measurement_timepoints(args.exp_id, args.device) or []
+    queries = [(timepoint, target) for timepoint in timepoints for target in targets] * args.repeat
+    print(f"{len(queries)} queries ({len(timepoints)} timepoints x {len(targets)} targets x {args.repeat})")
+
+    print(f"{'threads':>7} {'shared conn [q/s]':>18} {'read pool [q/s]':>16} {'speedup':>8}")
+    for threads in args.threads:
+        configure_connections(args.db, read_pool=False)
+        shared = run_queries(queries, args.exp_id, args.device, threads)
+        configure_connections(args.db, pool_size=threads)
+        pooled = run_queries(queries, args.exp_id, args.device, threads)
+        print(f"{threads:>7} {shared:>18.1f} {pooled:>16.1f} {pooled / shared:>7.2f}x")
+    close_connection()
+
+
+if __name__ == "__main__":
+    main()
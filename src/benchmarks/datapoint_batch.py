@@ -0,0 +1,83 @@
+"""
+Benchmark: memory and insert throughput of the datapoints of an experiment (optionally one device and timepoint)
+    - dataclass:    one Datapoint object per datapoint, DatapointRepository.insert_many_datapoints(list[Datapoint])
+    - batch:        models.datapoint_batch.DatapointBatch (NumPy columns), DatapointRepository.insert_datapoint_batch
+Both paths run in a fresh process on a temporary copy of the database: the memory of the datapoints (tracemalloc,
+after building them from the columns read with get_datapoint_batch), the insert rate (one transaction, rolled back,
+the aggregates are not refreshed) and the peak RSS of the process are reported.
+
+Run from the src folder, e.g.:
+    python -m benchmarks.datapoint_batch --db ../data/PAH_database.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+from analysis.incremental_pca import peak_rss_bytes
+
+
+def insert_path(name: str, db: str, exp_id: int, device: str | None, timepoint: str | None) -> tuple:
+    get_connection(db)
+    repo = DatapointRepository()
+    source = repo.get_datapoint_batch(exp_id, device, timepoint)
+    if source is None:
+        return 0, 0, 0.0, 0.0, peak_rss_bytes()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if name == "dataclass":
+        datapoints = source.to_datapoints()
+    else:
+        datapoints = source.take(np.arange(len(source)))
+    build_seconds = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    if name == "dataclass":
+        repo.insert_many_datapoints(datapoints, commit=False)
+    else:
+        repo.insert_datapoint_batch(datapoints, commit=False)
+    insert_seconds = time.perf_counter() - start
+    repo.conn.rollback()
+    return len(source), size, build_seconds, insert_seconds, peak_rss_bytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--timepoint", default=None)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, os.path.basename(args.db))
+        with sqlite3.connect(args.db) as source, sqlite3.connect(db) as target:
+            source.backup(target)                   # includes the changes still in the WAL of the source
+        print(f"{'path':<10} {'datapoints':>11} {'memory [MB]':>12} {'bytes/dp':>9} {'build [s]':>10} "
+              f"{'insert [s]':>11} {'rows/s':>11} {'peak RSS [MB]':>14}")
+        rates = {}
+        for name in ("dataclass", "batch"):
+            with context.Pool(1) as pool:
+                n, size, build_seconds, insert_seconds, peak = pool.apply(
+                    insert_path, (name, db, args.exp_id, args.device, args.timepoint))
+            if n == 0:
+                print("no data found")
+                return
+            rates[name] = n / insert_seconds
+            peak_mb = f"{peak / 2**20:>14.1f}" if peak else f"{'n/a':>14}"
+            print(f"{name:<10} {n:>11} {size / 2**20:>12.1f} {size / n:>9.1f} {build_seconds:>10.2f} "
+                  f"{insert_seconds:>11.2f} {rates[name]:>11,.0f} {peak_mb}")
+    print(f"insert speedup: {rates['batch'] / rates['dataclass']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
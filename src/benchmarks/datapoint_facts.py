@@ -0,0 +1,41 @@
+"""
+Benchmark: memory and load time of a full-experiment load, long-format DataFrame (get_datapoints_by_exp_id) vs.
+star-schema facts + dimensions (get_datapoint_facts).
+
+Run from the src folder, e.g.:
+    python -m benchmarks.datapoint_facts --db ../data/PAH_database.db --exp-id 1
+"""
+import argparse
+import time
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    repo = DatapointRepository()
+
+    start = time.perf_counter()
+    df = repo.get_datapoints_by_exp_id(args.exp_id)
+    long_seconds = time.perf_counter() - start
+    long_bytes = int(df.memory_usage(deep=True).sum())
+    n_rows = len(df)
+    del df
+
+    start = time.perf_counter()
+    facts = repo.get_datapoint_facts(args.exp_id)
+    facts_seconds = time.perf_counter() - start
+
+    print(f"datapoints: {n_rows}")
+    print(f"long format:  {long_bytes / 2**20:8.1f} MB  {long_seconds:6.2f} s")
+    print(f"facts + dims: {facts.nbytes / 2**20:8.1f} MB  {facts_seconds:6.2f} s  "
+          f"({long_bytes / facts.nbytes:.1f}x less memory)")
+
+
+if __name__ == "__main__":
+    main()
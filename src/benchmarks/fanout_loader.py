@@ -0,0 +1,60 @@
+"""
+Benchmark: wall time of a full-body feature matrix (every timepoint, target and axis of a measurement device)
+    - sequential:   DatapointRepository.get_datapoints_by_exp_id_device_timepoint_target once per target, one after another
+                    (the long-format results, not yet assembled into a matrix)
+    - fan-out:      data_access.fanout_loader.load_feature_matrix, one selection per (timepoint, target, axis),
+                    for an increasing number of workers of the thread and the process executor
+The fan-out time includes the assembly of the matrix (and the start of the processes).
+
+Run from the src folder, e.g.:
+    python -m benchmarks.fanout_loader --db ../data/PAH_database.db --exp-id 1 --device mocap --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+from db.connection import configure_connections, close_connection, release_read_connection
+from data_access.datapoint_repository import DatapointRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.fanout_loader import EXECUTOR_PROCESS, EXECUTOR_THREAD, Selection, load_feature_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--missing", default="nan", help="missing policy of the fan-out loader")
+    args = parser.parse_args()
+
+    configure_connections(args.db, pool_size=max(args.workers))
+    measurements = MeasurementRepository().get_measurements_by_device(args.device, args.exp_id)
+    if measurements is None or measurements.empty:
+        print("no data found")
+        return
+    channels = sorted({(row.timepoint, row.target, row.axis) for row in measurements.itertuples()},
+                      key=lambda channel: tuple("" if label is None else label for label in channel))
+    targets = sorted({(timepoint, target) for timepoint, target, _ in channels})
+    selections = [Selection(args.device, timepoint, target, axis) for timepoint, target, axis in channels]
+    print(f"{len(targets)} (timepoint, target) queries, {len(selections)} selections, {os.cpu_count()} CPUs")
+
+    repo = DatapointRepository()
+    start = time.perf_counter()
+    n_rows = sum(len(repo.get_datapoints_by_exp_id_device_timepoint_target(args.exp_id, args.device, timepoint, target))
+                 for timepoint, target in targets)
+    sequential = time.perf_counter() - start
+    release_read_connection()
+    print(f"sequential: {sequential:.2f} s ({n_rows} datapoint rows)")
+
+    print(f"{'executor':<9} {'workers':>7} {'time [s]':>9} {'speedup':>8}  matrix")
+    for executor in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+        for workers in args.workers:
+            start = time.perf_counter()
+            matrix = load_feature_matrix(args.exp_id, selections, args.missing, workers, executor)
+            seconds = time.perf_counter() - start
+            print(f"{executor:<9} {workers:>7} {seconds:>9.2f} {sequential / seconds:>7.2f}x  {matrix.values.shape}")
+    close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: building the (strokes x targets*axes*time_points) PCA input matrix
+    - pivot:   get_datapoints_by_exp_id_device_and_timepoint + pandas pivot_table (current path)
+    - direct:  DatapointRepository.get_feature_matrix (fills a preallocated NumPy matrix from the cursor)
+
+Run from the src folder, e.g.:
+    python -m benchmarks.feature_matrix --db ../data/PAH_database.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+
+
+def pivot_path(repo: DatapointRepository, exp_id: int, device: str, timepoint: str) -> np.ndarray:
+    df = repo.get_datapoints_by_exp_id_device_and_timepoint(exp_id, device, timepoint)
+    wide = df.pivot_table(index=["participant_id", "bow_stroke", "up_down"],
+                          columns=["target", "axis", "dp_time_point"], values="value")
+    return wide.to_numpy()
+
+
+def direct_path(repo: DatapointRepository, exp_id: int, device: str, timepoint: str, dtype) -> np.ndarray:
+    return repo.get_feature_matrix(exp_id, device, timepoint, dtype=dtype).values
+
+
+def measure(func, repeat: int) -> tuple[float, float, tuple]:
+    """
+    Runs func repeat times and returns the best wall-clock time (s), the peak traced memory (MB) and the result shape.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1e6, result.shape
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--timepoint", default="pre")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    repo = DatapointRepository()
+    candidates = {
+        "pivot (pandas)": lambda: pivot_path(repo, args.exp_id, args.device, args.timepoint),
+        "direct float64": lambda: direct_path(repo, args.exp_id, args.device, args.timepoint, np.float64),
+        "direct float32": lambda: direct_path(repo, args.exp_id, args.device, args.timepoint, np.float32),
+    }
+    print(f"{'path':<16} {'time [s]':>10} {'peak mem [MB]':>14}  shape")
+    for name, func in candidates.items():
+        seconds, peak_mb, shape = measure(func, args.repeat)
+        print(f"{name:<16} {seconds:>10.3f} {peak_mb:>14.1f}  {shape}")
+
+
+if __name__ == "__main__":
+    main()
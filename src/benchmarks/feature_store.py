@@ -0,0 +1,87 @@
+"""
+Benchmark: keeping the feature matrix of an experiment, measurement device and timepoint up to date when a participant
+is added, on a temporary copy of the database:
+    - rebuild:      DatapointRepository.get_feature_matrix of the whole selection (the matrix built from scratch)
+    - refresh:      data_access.feature_store.FeatureMatrixStore.refresh (only the new measurements are loaded)
+The new participant is a copy of the measurements and datapoints of an existing participant (values shifted by 1).
+The copy of the database gets the aggregate tables if they are missing (the store fingerprints the measurements by them).
+
+Run from the src folder, e.g.:
+    python -m benchmarks.feature_store --db ../data/PAH_database.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from db.connection import configure_connections, close_connection
+from db.schema import has_aggregate_tables
+from data_access.datapoint_repository import DatapointRepository
+from data_access.feature_store import FeatureMatrixStore
+from models.datapoint_batch import DatapointBatch
+
+
+def add_participant_copy(repo: DatapointRepository, exp_id: int, device: str, timepoint: str) -> int:
+    """
+    Inserts a copy of the first participant (its measurements of the device/timepoint and their datapoints).
+
+    Returns:
+        int: The number of datapoints inserted.
+    """
+    cursor = repo.conn.cursor()
+    cursor.execute("SELECT id, participant_id FROM participant WHERE experiment_id = ? ORDER BY id LIMIT 1", (exp_id,))
+    source_db_id, source_id = cursor.fetchone()
+    cursor.execute("INSERT INTO participant (experiment_id, participant_id) VALUES (?, ?)", (exp_id, f"{source_id}_copy"))
+    participant_db_id = cursor.lastrowid
+    cursor.execute("SELECT id, target, axis, unit FROM measurement WHERE participant_id = ? AND device = ? AND timepoint = ?",
+                   (source_db_id, device, timepoint))
+    batch = repo.get_datapoint_batch(exp_id, device, timepoint)
+    copies = []
+    for measurement_id, target, axis, unit in cursor.fetchall():
+        cursor.execute("""
+            INSERT INTO measurement (participant_id, timepoint, device, target, axis, unit) VALUES (?, ?, ?, ?, ?, ?)
+        """, (participant_db_id, timepoint, device, target, axis, unit))
+        copy = batch.take(batch.measurement_id == measurement_id)
+        copy.measurement_id[:] = cursor.lastrowid
+        copy.value += 1
+        copies.append(copy)
+    batch = DatapointBatch.concatenate(copies)
+    repo.insert_datapoint_batch(batch)              # commits the participant and measurements as well
+    return len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--timepoint", default="pre")
+    args = parser.parse_args()
+    selection = (args.exp_id, args.device, args.timepoint)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, os.path.basename(args.db))
+        with sqlite3.connect(args.db) as source, sqlite3.connect(db) as target:
+            source.backup(target)
+        configure_connections(db)
+        repo = DatapointRepository()
+        if not has_aggregate_tables(repo.conn):
+            repo.refresh_aggregates([row[0] for row in repo.conn.execute("SELECT id FROM measurement")])
+        store = FeatureMatrixStore(os.path.join(tmp, "features"))
+
+        print(f"initial build:   {store.refresh(*selection)}")
+        print(f"no change:       {store.refresh(*selection)}")
+        n_datapoints = add_participant_copy(repo, *selection)
+        print(f"participant added ({n_datapoints} datapoints)")
+        report = store.refresh(*selection)
+        print(f"refresh:         {report}")
+        start = time.perf_counter()
+        matrix = repo.get_feature_matrix(*selection)
+        rebuild = time.perf_counter() - start
+        print(f"rebuild:         {matrix.values.shape[0]} rows in {rebuild:.2f} s")
+        print(f"speedup: {rebuild / report.seconds:.1f}x")
+        close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: PCA of the bow strokes of an experiment, measurement device and timepoint
+    - in-memory:  get_datapoints_by_exp_id_device_and_timepoint + pandas pivot_table + sklearn PCA (current path)
+    - streaming:  analysis.incremental_pca.fit_incremental_pca (IncrementalPCA fed batch by batch from the database)
+Every path runs in a fresh process, so the reported peak RSS is the peak of that path alone.
+
+Run from the src folder, e.g.:
+    python -m benchmarks.incremental_pca --db ../data/PAH_database.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import multiprocessing
+import time
+import numpy as np
+from sklearn.decomposition import PCA
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+from analysis.incremental_pca import fit_incremental_pca, peak_rss_bytes
+from benchmarks.feature_matrix import pivot_path
+
+
+def in_memory_path(db: str, exp_id: int, device: str, timepoint: str, n_components: int, batch_size: int) -> tuple:
+    get_connection(db)
+    start = time.perf_counter()
+    matrix = pivot_path(DatapointRepository(), exp_id, device, timepoint)
+    matrix = matrix[~np.isnan(matrix).any(axis=1)]
+    pca = PCA(n_components=n_components).fit(matrix)
+    pca.transform(matrix)
+    return time.perf_counter() - start, peak_rss_bytes(), pca.explained_variance_ratio_
+
+
+def streaming_path(db: str, exp_id: int, device: str, timepoint: str, n_components: int, batch_size: int) -> tuple:
+    get_connection(db)
+    result = fit_incremental_pca(exp_id, device, timepoint, n_components, batch_size)
+    return result.seconds, result.peak_rss_bytes, result.pca.explained_variance_ratio_
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--timepoint", default="pre")
+    parser.add_argument("--n-components", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+
+    arguments = (args.db, args.exp_id, args.device, args.timepoint, args.n_components, args.batch_size)
+    context = multiprocessing.get_context("spawn")
+    print(f"{'path':<12} {'time [s]':>10} {'peak RSS [MB]':>14}  explained variance ratio (first 3)")
+    for name, path in (("in-memory", in_memory_path), ("streaming", streaming_path)):
+        with context.Pool(1) as pool:
+            seconds, peak, ratio = pool.apply(path, arguments)
+        peak_mb = f"{peak / 2**20:>14.1f}" if peak else f"{'n/a':>14}"
+        print(f"{name:<12} {seconds:>10.2f} {peak_mb}  {np.round(ratio[:3], 4)}")
+
+
+if __name__ == "__main__":
+    main()
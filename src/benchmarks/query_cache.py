@@ -0,0 +1,45 @@
+"""
+Benchmark: cold (SQLite) vs. warm (cache directory next to the database) loads of a datapoint query through the QueryCache.
+
+Run from the src folder, e.g.:
+    python -m benchmarks.query_cache --db ../data/PAH_database.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import time
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+from data_access.query_cache import QueryCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--cache-dir", default=None, help="default: cache next to the database")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--timepoint", default="pre")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    repo = DatapointRepository()
+    cache = QueryCache(args.cache_dir)
+    cache.invalidate_experiment(args.exp_id)
+    query = repo.get_datapoints_by_exp_id_device_and_timepoint
+
+    start = time.perf_counter()
+    df = cache.call(query, args.exp_id, args.device, args.timepoint)
+    cold = time.perf_counter() - start
+    warm = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        cache.call(query, args.exp_id, args.device, args.timepoint)
+        warm = min(warm, time.perf_counter() - start)
+
+    print(f"rows: {0 if df is None else len(df)}")
+    print(f"cold (SQLite + store): {cold:8.3f} s")
+    print(f"warm (cache):          {warm:8.3f} s  ({cold / warm:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Benchmark suite of the data access layer: times every public getter (get_*/iter_*) of ExperimentRepository,
+ParticipantRepository, MeasurementRepository and DatapointRepository plus the bulk inserts, and writes latency
+(best/median of --repeat runs), throughput (result rows per second) and peak Python memory (tracemalloc) to a JSON
+file, so the numbers can be compared across commits (--compare).
+
+By default the suite runs on a synthetic database (db/synthetic_database.py) generated in a temporary directory,
+pass --db to run it on an existing database (the bulk inserts always run on a temporary copy).
+
+Run from the src folder, e.g.:
+    python -m benchmarks.repository_suite --output ../data/benchmarks/$(git rev-parse --short HEAD).json
+    python -m benchmarks.repository_suite --participants 30 --strokes 40 --compare ../data/benchmarks/baseline.json
+"""
+import argparse
+import datetime
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+import numpy as np
+import pandas as pd
+from db.connection import get_connection, close_connection
+from db.schema import get_datapoint_layout
+from db.synthetic_database import SyntheticScale, generate_database
+from data_access.experiment_repository import ExperimentRepository
+from data_access.participant_repository import ParticipantRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.datapoint_repository import DatapointRepository
+from models.participant import Participant
+from models.measurement import Measurement
+from models.datapoint_batch import DatapointBatch
+
+REPOSITORIES = (ExperimentRepository, ParticipantRepository, MeasurementRepository, DatapointRepository)
+
+# arguments that mean something else than the default of the same name (see benchmark_arguments)
+_ARGUMENT_OVERRIDES = {
+    "ParticipantRepository.get_participant_by_id": {"participant_id": "participant_db_id"},
+}
+
+
+def benchmark_arguments(conn: sqlite3.Connection) -> dict:
+    """
+    Picks the arguments of the getters (by parameter name) from the database: the first experiment,
+    its first participant/measurement/datapoint, and the first mocap target of the 'pre' timepoint.
+    """
+    exp_id, name, data_state = conn.execute("SELECT id, name, data_state FROM experiment ORDER BY id").fetchone()
+    participant_db_id, participant_id = conn.execute(
+        "SELECT id, participant_id FROM participant WHERE experiment_id = ? ORDER BY id", (exp_id,)).fetchone()
+    measurement_id, device, timepoint, target, axis = conn.execute("""
+        SELECT id, device, timepoint, target, axis FROM measurement
+        WHERE participant_id = ? ORDER BY device = 'mocap' DESC, timepoint = 'pre' DESC, id
+    """, (participant_db_id,)).fetchone()
+    experiment_ids = [row[0] for row in conn.execute("SELECT id FROM experiment ORDER BY id")]
+    participant_ids = [row[0] for row in conn.execute("SELECT id FROM participant WHERE experiment_id = ? ORDER BY id",
+                                                      (exp_id,))]
+    measurement_ids = [row[0] for row in conn.execute("""
+        SELECT measurement.id FROM measurement JOIN participant ON measurement.participant_id = participant.id
+        WHERE participant.experiment_id = ? ORDER BY measurement.id
+    """, (exp_id,))]
+    return {
+        "exp_id": exp_id, "experiment_id": exp_id, "exp_name": name, "experiment_name": name, "data_state": data_state,
+        "participant_id": participant_id, "participant_db_id": participant_db_id, "measurement_id": measurement_id,
+        "datapoint_id": 1, "device": device, "timepoint": timepoint, "target": target, "axis": axis,
+        "targets": [target], "axes": [axis], "experiment_ids": experiment_ids, "participant_ids": participant_ids,
+        "measurement_ids": measurement_ids,
+    }
+
+
+def run_getter_benchmarks(arguments: dict, repeat: int) -> list[dict]:
+    """
+    Times every public getter of the repositories.
+
+    Returns:
+        list[dict]: One result per method (see measure).
+    """
+    results = []
+    for repository_class in REPOSITORIES:
+        repo = repository_class()
+        for name, method in inspect.getmembers(repo, inspect.ismethod):
+            if not name.startswith(("get_", "iter_")):
+                continue
+            qualified_name = f"{repository_class.__name__}.{name}"
+            overrides = _ARGUMENT_OVERRIDES.get(qualified_name, {})
+            kwargs = {parameter: arguments[overrides.get(parameter, parameter)]
+                      for parameter in inspect.signature(method).parameters
+                      if overrides.get(parameter, parameter) in arguments}
+            if name.startswith("iter_"):
+                call = lambda method=method, kwargs=kwargs: list(method(**kwargs))
+            else:
+                call = lambda method=method, kwargs=kwargs: method(**kwargs)
+            results.append(measure(qualified_name, call, repeat))
+    return results
+
+
+def run_insert_benchmarks(db_path: str, arguments: dict, repeat: int, n_rows: int) -> list[dict]:
+    """
+    Times the bulk inserts on temporary copies of the database (every run starts from the same copy).
+
+    Returns:
+        list[dict]: One result per insert method (see measure).
+    """
+    measurements = [Measurement(id=None, participant_id=arguments["participant_db_id"], timepoint="bench",
+                                device=arguments["device"], target=f"target {i}", axis=arguments["axis"], unit="degree")
+                    for i in range(max(1, n_rows // 101))]
+    participants = [Participant(id=None, participant_id=f"B{i:05d}", experiment_id=arguments["exp_id"], instrument="violin")
+                    for i in range(max(1, n_rows // 101))]
+
+    def datapoint_rows():
+        return [(arguments["measurement_id"], 100_000 + i // 101, i // 101 % 2, None, i % 101, float(i)) for i in range(n_rows)]
+
+    def datapoint_batch():
+        i = np.arange(n_rows)
+        return DatapointBatch(measurement_id=arguments["measurement_id"], bow_stroke=100_000 + i // 101,
+                              up_down=i // 101 % 2, key=None, time_point=i % 101, value=i.astype(np.float64))
+
+    cases = {
+        "ParticipantRepository.insert_many_participants": (participants, lambda: ParticipantRepository().insert_many_participants(participants)),
+        "MeasurementRepository.insert_many_measurements": (measurements, lambda: MeasurementRepository().insert_many_measurements(measurements)),
+        "DatapointRepository.insert_datapoint_rows": (range(n_rows), lambda: DatapointRepository().insert_datapoint_rows(datapoint_rows())),
+        "DatapointRepository.insert_datapoint_batch": (range(n_rows), lambda: DatapointRepository().insert_datapoint_batch(datapoint_batch())),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        copy_path = os.path.join(tmp_dir, "insert.db")
+        def fresh_copy():
+            close_connection()
+            _copy_database(db_path, copy_path)
+            get_connection(copy_path)
+
+        for name, (rows, insert) in cases.items():
+            results.append(measure(name, insert, repeat, n_rows=len(rows), setup=fresh_copy))
+        close_connection()
+    get_connection(db_path)
+    return results
+
+
+def measure(name: str, call, repeat: int, n_rows: int | None = None, setup=None) -> dict:
+    """
+    Runs call once to warm up, repeat times for the latency and once more under tracemalloc for the peak memory.
+    setup (not timed) runs before every call.
+
+    Returns:
+        dict: name, latency (best/median in seconds), rows, rows_per_second, peak_mb, error.
+    """
+    setup = setup or (lambda: None)
+    try:
+        setup()
+        call()
+        latencies = []
+        for _ in range(repeat):
+            setup()
+            start = time.perf_counter()
+            result = call()
+            latencies.append(time.perf_counter() - start)
+        setup()
+        tracemalloc.start()
+        try:
+            call()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as exception:
+        return {"name": name, "error": f"{type(exception).__name__}: {exception}"}
+    rows = n_rows if n_rows is not None else _result_rows(result)
+    best = min(latencies)
+    return {
+        "name": name,
+        "latency_best_s": best,
+        "latency_median_s": statistics.median(latencies),
+        "rows": rows,
+        "rows_per_second": rows / best if best > 0 else None,
+        "peak_mb": peak / 2**20,
+        "error": None,
+    }
+
+
+def _result_rows(result) -> int:
+    """
+    Number of rows (or datapoints) of a getter result.
+    """
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return sum(_result_rows(item) for item in result) if result and not isinstance(result[0], (str, int)) else len(result)
+    if isinstance(result, (pd.DataFrame, np.ndarray, DatapointBatch)):
+        return len(result)
+    for attribute in ("values", "facts"):            # FeatureMatrix, DatapointFacts
+        if hasattr(result, attribute):
+            return int(np.size(getattr(result, attribute)))
+    return 1
+
+
+def _copy_database(source: str, target: str):
+    if os.path.exists(target):
+        os.remove(target)
+    source_conn, target_conn = sqlite3.connect(source), sqlite3.connect(target)
+    source_conn.backup(target_conn)
+    target_conn.close()
+    source_conn.close()
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict], baseline_path: str):
+    """
+    Prints the best latency of every method relative to a previous result file.
+    """
+    with open(baseline_path) as file:
+        baseline = {result["name"]: result for result in json.load(file)["results"]}
+    print(f"\ncompared to {baseline_path}:")
+    for result in results:
+        previous = baseline.get(result["name"])
+        if result.get("error") or not previous or previous.get("error"):
+            continue
+        ratio = result["latency_best_s"] / previous["latency_best_s"]
+        print(f"{result['name']:<70} {previous['latency_best_s']:>9.4f} -> {result['latency_best_s']:>9.4f} s  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing database (default: a generated synthetic database)")
+    parser.add_argument("--participants", type=int, default=SyntheticScale.participants)
+    parser.add_argument("--targets", type=int, default=SyntheticScale.targets)
+    parser.add_argument("--emg-targets", type=int, default=SyntheticScale.emg_targets)
+    parser.add_argument("--strokes", type=int, default=SyntheticScale.strokes)
+    parser.add_argument("--layout", choices=["rows", "waveform"], default="rows")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--insert-rows", type=int, default=100_000, help="rows per bulk insert benchmark")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous result file to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scale = None
+        db_path = args.db
+        if db_path is None:
+            scale = SyntheticScale(participants=args.participants, targets=args.targets, emg_targets=args.emg_targets,
+                                   strokes=args.strokes)
+            db_path = os.path.join(tmp_dir, "synthetic.db")
+            generate_database(db_path, scale, args.layout)
+
+        close_connection()
+        conn = get_connection(db_path)
+        if args.db is None:
+            DatapointRepository().refresh_aggregates()
+        arguments = benchmark_arguments(conn)
+        results = run_getter_benchmarks(arguments, args.repeat)
+        results += run_insert_benchmarks(db_path, arguments, args.repeat, args.insert_rows)
+        layout = get_datapoint_layout(get_connection())
+        close_connection()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "db": args.db,
+            "scale": asdict(scale) if scale else None,
+            "layout": layout,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"{'method':<70} {'best [s]':>9} {'rows/s':>12} {'peak [MB]':>10}")
+    for result in results:
+        if result.get("error"):
+            print(f"{result['name']:<70} error: {result['error']}")
+            continue
+        rows_per_second = f"{result['rows_per_second']:,.0f}" if result["rows_per_second"] else "-"
+        print(f"{result['name']:<70} {result['latency_best_s']:>9.4f} {rows_per_second:>12} {result['peak_mb']:>10.1f}")
+    print(f"results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: reads and writes of one experiment while another experiment is being uploaded, single database vs. sharded
+(db/sharding.py, one database per experiment), on temporary copies of the database:
+    - upload:   a spawned process inserts the datapoints of experiment A again in one transaction and keeps it open
+                for --hold seconds (a long bulk upload), then rolls it back
+    - reads:    meanwhile DatapointRepository.get_feature_matrix of experiment B, repeatedly (latency)
+    - write:    then ParticipantRepository.update_pain_data of a participant of experiment B (time until committed,
+                in the single database it waits for the upload to end)
+
+Run from the src folder, e.g.:
+    python -m benchmarks.sharding --db ../data/PAH_database.db --exp-a 1 --exp-b 2 --hold 3
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import numpy as np
+from db.connection import configure_connections, close_connection
+from db.sharding import experiment_scope, split_database
+from data_access.participant_repository import ParticipantRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.datapoint_repository import DatapointRepository
+
+
+def upload(db: str, shard_dir: str | None, exp_id: int, hold: float, started):
+    configure_connections(db, shard_dir=shard_dir)
+    repo = DatapointRepository()
+    batch = repo.get_datapoint_batch(exp_id)
+    with experiment_scope(exp_id):
+        repo.insert_datapoint_batch(batch, commit=False)
+        started.set()
+        time.sleep(hold)
+        repo.conn.rollback()
+    close_connection()
+
+
+def run(db: str, shard_dir: str | None, exp_a: int, exp_b: int, hold: float) -> tuple:
+    configure_connections(db, shard_dir=shard_dir)
+    measurement_repo = MeasurementRepository()
+    device = measurement_repo.get_measurement_devices(exp_b)[0]
+    timepoint = measurement_repo.get_measurement_timepoints(exp_b, device)[0]
+    participant_repo = ParticipantRepository()
+    participant = participant_repo.get_participant_by_id(int(participant_repo.get_participants_by_exp_id(exp_b)["id"].iloc[0]))
+    datapoint_repo = DatapointRepository()
+
+    context = multiprocessing.get_context("spawn")
+    started = context.Event()
+    process = context.Process(target=upload, args=(db, shard_dir, exp_a, hold, started))
+    process.start()
+    started.wait()
+    upload_start = time.perf_counter()
+
+    latencies = []
+    while time.perf_counter() - upload_start < hold / 2:
+        start = time.perf_counter()
+        datapoint_repo.get_feature_matrix(exp_b, device, timepoint)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    participant_repo.update_pain_data(participant, exp_b)
+    write_seconds = time.perf_counter() - start
+    process.join()
+    close_connection()
+    return np.median(latencies), max(latencies), len(latencies), write_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-a", type=int, default=1, help="the experiment that is uploaded")
+    parser.add_argument("--exp-b", type=int, default=2, help="the experiment that is read and written meanwhile")
+    parser.add_argument("--hold", type=float, default=3.0, help="seconds the upload transaction stays open")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, os.path.basename(args.db))
+        with sqlite3.connect(args.db) as source, sqlite3.connect(db) as target:
+            source.backup(target)
+        catalog, shard_dir = os.path.join(tmp, "catalog.db"), os.path.join(tmp, "shards")
+        split_database(db, catalog, shard_dir)
+
+        print(f"upload of experiment {args.exp_a} open for {args.hold:.1f} s, experiment {args.exp_b} read and written meanwhile")
+        print(f"{'database':<9} {'reads':>6} {'read p50 [ms]':>14} {'read max [ms]':>14} {'write [s]':>10}")
+        for name, path, shards in (("single", db, None), ("sharded", catalog, shard_dir)):
+            median, maximum, n_reads, write_seconds = run(path, shards, args.exp_a, args.exp_b, args.hold)
+            print(f"{name:<9} {n_reads:>6} {median * 1000:>14.1f} {maximum * 1000:>14.1f} {write_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: cold-start time of a minimal query script (a new Python process that looks up one experiment ID and
+lists the experiments), including the interpreter start and all imports:
+    - eager:    the previous way, the four repository modules imported (with pandas) and all repositories created
+                up front, the experiments returned as DataFrame
+    - lazy:     data_access.repositories.Repositories(result_type='tuples'), only the ExperimentRepository is
+                imported and created, pandas is not imported
+Every variant runs --repeat times in a fresh process, the best and median wall time are reported.
+With --baseline-src the eager script runs in the src folder of another checkout (e.g. a git worktree of the commit
+before the lazy read path), otherwise the previous import-time cost of pandas is reproduced by importing it.
+
+Run from the src folder, e.g.:
+    python -m benchmarks.startup_time --db ../data/PAH_database.db
+    git worktree add /tmp/pah_baseline <commit> && python -m benchmarks.startup_time --baseline-src /tmp/pah_baseline/src
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+_EAGER_SCRIPT = """
+import sys
+import pandas
+from db.connection import get_connection
+from data_access.experiment_repository import ExperimentRepository
+from data_access.participant_repository import ParticipantRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.datapoint_repository import DatapointRepository
+get_connection({db!r})
+experiment_repo = ExperimentRepository()
+participant_repo = ParticipantRepository()
+measurement_repo = MeasurementRepository()
+datapoint_repo = DatapointRepository()
+experiment_repo.get_experiment_id_by_name({name!r})
+experiments = experiment_repo.get_all_experiments()
+print(len(experiments), 'pandas' in sys.modules)
+"""
+
+_LAZY_SCRIPT = """
+import sys
+from db.connection import get_connection
+from data_access.repositories import Repositories
+get_connection({db!r})
+repos = Repositories(result_type='tuples')
+repos.experiment.get_experiment_id_by_name({name!r})
+experiments = repos.experiment.get_all_experiments()
+print(len(experiments), 'pandas' in sys.modules)
+"""
+
+
+def cold_start(script: str, src: str, repeat: int) -> tuple[list[float], str]:
+    """
+    Runs a script in repeat fresh processes (working directory src).
+
+    Returns:
+        tuple[list[float], str]: The wall time of every run in seconds and the output of the last run.
+    """
+    env = dict(os.environ, PYTHONPATH=src)
+    env.pop("PAH_PROFILE", None)
+    seconds, output = [], ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", script], cwd=src, env=env, capture_output=True, text=True,
+                                check=True)
+        seconds.append(time.perf_counter() - start)
+        output = result.stdout.strip()
+    return seconds, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--name", default="mpa", help="experiment name looked up by the scripts")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--baseline-src", default=None, help="src folder of another checkout for the eager script")
+    args = parser.parse_args()
+
+    src = os.getcwd()
+    db = os.path.abspath(args.db)
+    variants = (("eager", _EAGER_SCRIPT, os.path.abspath(args.baseline_src) if args.baseline_src else src),
+                ("lazy", _LAZY_SCRIPT, src))
+    cold_start("pass", src, 1)                  # warms the file system cache of the interpreter
+    print(f"{'script':<8} {'best [ms]':>10} {'median [ms]':>12} {'pandas imported':>16}")
+    best = {}
+    for name, script, folder in variants:
+        if args.baseline_src and name == "eager":
+            script = script.replace("import pandas\n", "")
+        seconds, output = cold_start(script.format(db=db, name=args.name), folder, args.repeat)
+        best[name] = min(seconds)
+        print(f"{name:<8} {1000 * min(seconds):>10.0f} {1000 * statistics.median(seconds):>12.0f} "
+              f"{output.split()[-1]:>16}")
+    print(f"speedup (best): {best['eager'] / best['lazy']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
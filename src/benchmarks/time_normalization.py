@@ -0,0 +1,60 @@
+"""
+Benchmark: resampling the bow strokes of a raw experiment (one measurement device and timepoint) to 101 time points
+    - per stroke:   np.interp in a Python loop over the strokes
+    - vectorized:   ingestion.time_normalization.resample_strokes (all strokes at once)
+Reports the throughput in strokes per second and the largest difference between both results.
+
+Run from the src folder, e.g. on a synthetic raw database:
+    python -m db.synthetic_database ../data/synthetic_raw.db --raw
+    python -m benchmarks.time_normalization --db ../data/synthetic_raw.db --exp-id 1 --device mocap --timepoint pre
+"""
+import argparse
+import time
+import numpy as np
+from db.connection import get_connection
+from data_access.datapoint_repository import DatapointRepository
+from ingestion.time_normalization import N_TIME_POINTS, _resample_facts
+
+
+def per_stroke_path(facts: np.ndarray, n_points: int) -> np.ndarray:
+    facts = facts[np.lexsort((facts["time_point"], facts["up_down"], facts["bow_stroke"], facts["measurement_id"]))]
+    keys = np.stack([facts["measurement_id"], facts["bow_stroke"], facts["up_down"]], axis=1)
+    starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+    ends = np.append(starts[1:], len(facts))
+    resampled = np.empty((len(starts), n_points))
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        time_points, values = facts["time_point"][start:end], facts["value"][start:end]
+        resampled[i] = np.interp(np.linspace(time_points[0], time_points[-1], n_points), time_points, values)
+    return resampled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, default=1)
+    parser.add_argument("--device", default="mocap")
+    parser.add_argument("--timepoint", default="pre")
+    parser.add_argument("--n-points", type=int, default=N_TIME_POINTS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    facts = DatapointRepository().get_datapoint_facts(args.exp_id, args.device, args.timepoint)
+    if facts is None:
+        print("no data found")
+        return
+    results = {}
+    print(f"{len(facts.facts)} samples")
+    print(f"{'path':<12} {'time [s]':>10} {'strokes/s':>12}")
+    for name, path in (("per stroke", per_stroke_path), ("vectorized", lambda f, n: _resample_facts(f, n)[1])):
+        seconds = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[name] = path(facts.facts, args.n_points)
+            seconds.append(time.perf_counter() - start)
+        print(f"{name:<12} {min(seconds):>10.3f} {len(results[name]) / min(seconds):>12,.0f}")
+    print(f"max difference: {np.abs(results['per stroke'] - results['vectorized']).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
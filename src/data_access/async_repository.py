@@ -0,0 +1,223 @@
+"""
+Asyncio facades of the repositories, for asyncio applications (e.g. a dashboard service) that must not block the event loop.
+
+Every public method of a repository is available as coroutine on its facade, the iter_* methods as async generators:
+    repo = AsyncDatapointRepository(timeout=30)
+    df = await repo.get_datapoints_by_exp_id_device_and_timepoint(exp_id, 'mocap', 'pre')
+    async for chunk in repo.iter_datapoints_by_exp_id(exp_id):
+        ...
+
+The queries run on a RepositoryExecutor: a bounded number of reader threads, every one with its own (dedicated) read
+connection from db.connection, plus one writer thread for the inserts/updates (so write transactions never interleave).
+Cancelling a call (task.cancel(), asyncio.wait_for, or the timeout of the facade) interrupts its running query
+(sqlite3.Connection.interrupt), calls that have not started yet are dropped. Writes are never interrupted, they are
+only abandoned by the caller.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from db.connection import get_connection_manager, get_read_connection, release_read_connection
+from data_access.experiment_repository import ExperimentRepository
+from data_access.participant_repository import ParticipantRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.datapoint_repository import DatapointRepository
+
+# sentinel for an exhausted iterator
+_DONE = object()
+
+class RepositoryExecutor:
+    def __init__(self, max_workers: int = 4):
+        """
+        Initializes the RepositoryExecutor with max_workers reader threads (every one with a dedicated read connection)
+        and one writer thread. A call runs on the reader with the fewest pending calls, the chunks of an async iteration
+        all run on the same reader (the cursor of the iteration belongs to the reader's connection).
+
+        Args:
+            max_workers (int): The number of reader threads, i.e. the maximum number of concurrently running queries.
+        """
+        self._readers = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"repository-reader-{i}")
+                         for i in range(max_workers)]
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="repository-writer")
+        self._pending = [0] * max_workers
+        self._lock = threading.Lock()
+
+    def pick_reader(self) -> int:
+        """
+        Returns the index of the reader thread with the fewest pending calls.
+        """
+        with self._lock:
+            return min(range(len(self._readers)), key=self._pending.__getitem__)
+
+    async def run(self, function, *args, reader: int | None = None, write: bool = False,
+                  timeout: float | None = None, **kwargs):
+        """
+        Runs function(*args, **kwargs) on a reader thread (or on the writer thread) without blocking the event loop.
+
+        Args:
+            function: The (blocking) function to call.
+            reader (int | None): The index of the reader thread (default: pick_reader()).
+            write (bool): Whether the function writes to the database (runs on the writer thread, is not interrupted).
+            timeout (float | None): Seconds after which the call is cancelled (raises TimeoutError).
+
+        Returns:
+            The result of the function.
+        """
+        loop = asyncio.get_running_loop()
+        call = _InterruptibleCall(functools.partial(function, *args, **kwargs), interruptible=not write)
+        if write:
+            future = loop.run_in_executor(self._writer, call.run)
+        else:
+            reader = self.pick_reader() if reader is None else reader
+            with self._lock:
+                self._pending[reader] += 1
+            future = loop.run_in_executor(self._readers[reader], call.run)
+            future.add_done_callback(lambda _: self._done(reader))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            call.interrupt()
+            raise
+
+    def shutdown(self, wait: bool = True):
+        """
+        Returns the read connections of the reader threads to the pool and stops the threads.
+        """
+        for reader in self._readers:
+            reader.submit(release_read_connection)
+            reader.shutdown(wait=wait)
+        self._writer.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def _done(self, reader: int):
+        with self._lock:
+            self._pending[reader] -= 1
+
+
+class _InterruptibleCall:
+    """
+    A call running on a reader thread, interrupt() aborts its running query (or prevents it from starting).
+    """
+    def __init__(self, function, interruptible: bool):
+        self.function = function
+        self.interruptible = interruptible
+        self._lock = threading.Lock()
+        self._thread = None         # the reader thread while the call is running
+        self._cancelled = False
+
+    def run(self):
+        with self._lock:
+            if self._cancelled:
+                raise asyncio.CancelledError()
+            # the pool falls back to the writer connection (e.g. in-memory databases), which must not be interrupted
+            if self.interruptible and get_connection_manager().read_pool:
+                get_read_connection()
+                self._thread = threading.current_thread()
+        try:
+            return self.function()
+        finally:
+            with self._lock:
+                self._thread = None
+
+    def interrupt(self):
+        with self._lock:
+            self._cancelled = True
+            if self._thread is not None:
+                # all read connections of the thread: in a sharded database (db/sharding.py) the query may run
+                # on the connection of a shard instead of the catalog
+                get_connection_manager().interrupt_read_connections(self._thread)
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+def get_default_executor() -> RepositoryExecutor:
+    """
+    Returns the RepositoryExecutor shared by all facades that are created without an executor.
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                _default_executor = RepositoryExecutor()
+    return _default_executor
+
+
+class AsyncRepository:
+    # the wrapped repository class, set by the subclasses
+    repository_class = None
+
+    def __init__(self, executor: RepositoryExecutor | None = None, timeout: float | None = None):
+        """
+        Initializes the facade with a (synchronous) repository.
+
+        Args:
+            executor (RepositoryExecutor | None): The executor the queries run on (default: get_default_executor()).
+            timeout (float | None): Seconds after which a call (or the next chunk of an async iteration) is cancelled.
+        """
+        self.repository = self.repository_class()
+        self.executor = executor or get_default_executor()
+        self.timeout = timeout
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Adds the async variant of every public method of repository_class to the facade.
+        """
+        super().__init_subclass__(**kwargs)
+        for name, method in inspect.getmembers(cls.repository_class, inspect.isfunction):
+            if name.startswith("_"):
+                continue
+            if name.startswith("iter_"):
+                setattr(cls, name, _async_iterator(name, method))
+            else:
+                setattr(cls, name, _async_call(name, method, write=not name.startswith("get_")))
+
+    async def _iterate(self, name: str, *args, **kwargs) -> AsyncIterator:
+        """
+        Runs a streaming getter on one reader thread, every chunk is fetched by a separate (cancellable) call.
+        """
+        reader = self.executor.pick_reader()
+        iterator = await self.executor.run(getattr(self.repository, name), *args, reader=reader, timeout=self.timeout,
+                                           **kwargs)
+        try:
+            while True:
+                chunk = await self.executor.run(next, iterator, _DONE, reader=reader, timeout=self.timeout)
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            # closes the cursor of the iteration (on its reader thread)
+            await asyncio.shield(self.executor.run(iterator.close, reader=reader))
+
+
+def _async_call(name: str, method, write: bool):
+    @functools.wraps(method)
+    async def call(self, *args, **kwargs):
+        return await self.executor.run(getattr(self.repository, name), *args, write=write, timeout=self.timeout, **kwargs)
+    return call
+
+def _async_iterator(name: str, method):
+    @functools.wraps(method)
+    def iterate(self, *args, **kwargs) -> AsyncIterator:
+        return self._iterate(name, *args, **kwargs)
+    return iterate
+
+
+class AsyncExperimentRepository(AsyncRepository):
+    repository_class = ExperimentRepository
+
+class AsyncParticipantRepository(AsyncRepository):
+    repository_class = ParticipantRepository
+
+class AsyncMeasurementRepository(AsyncRepository):
+    repository_class = MeasurementRepository
+
+class AsyncDatapointRepository(AsyncRepository):
+    repository_class = DatapointRepository
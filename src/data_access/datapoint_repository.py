@@ -1,13 +1,104 @@
-import pandas as pd
-from db.connection import get_connection
+from __future__ import annotations
+from typing import Iterator
+import numpy as np
+from sqlite3 import Connection
+from db.connection import get_connection, get_read_connection
+from db.instrumentation import instrument_repository
+from db.sharding import route_to_shards
+from data_access.results import RESULT_FRAME, RESULT_RECORDS, check_result_type, arrays_to_result, rows_to_result, pd
+from data_access.query_cache import invalidate_experiment
+from db.schema import (LAYOUT_WAVEFORM, WAVEFORM_SAMPLE_DTYPE, create_aggregate_tables, get_datapoint_layout,
+                       has_aggregate_tables, pack_waveform, unpack_waveform)
 from models.datapoint import Datapoint
+from models.datapoint_batch import DatapointBatch
+from models.feature_matrix import FeatureMatrix, ROW_LABEL_DTYPE, COLUMN_LABEL_DTYPE
+from models.datapoint_facts import DatapointFacts, FACT_DTYPE
 
+# SELECT lists of the experiment/participant/measurement columns returned along with the datapoints
+_METADATA_COLUMNS_BY_EXP_ID = """
+        experiment.id AS experiment_id,
+        experiment.name AS experiment_name,
+        participant.participant_id,
+        participant.instrument,
+        participant.PRMD_shoulder_neck_right,
+        participant.PRMD_shoulder_neck_left,
+        participant.PRMD_upper_arm_right,
+        participant.PRMD_upper_arm_left,
+        participant.PRMD_ever,
+        measurement.id AS measurement_id,
+        measurement.timepoint,
+        measurement.device,
+        measurement.target,
+        measurement.axis,
+        measurement.unit"""
+_METADATA_COLUMNS = """
+        experiment.id AS experiment_id,
+        experiment.name AS experiment_name,
+        participant.participant_id,
+        participant.instrument,
+        participant.PRMD_shoulder_neck_right,
+        participant.PRMD_shoulder_neck_left,
+        participant.PRMD_upper_arm_right,
+        participant.PRMD_upper_arm_left,
+        participant.PRMD_ever,
+        measurement.id AS measurement_id,
+        measurement.timepoint AS measurement_time_point,
+        measurement.device,
+        measurement.target,
+        measurement.axis,
+        measurement.unit"""
+_METADATA_COLUMNS_NOPAIN = """
+        experiment.id AS experiment_id,
+        experiment.name AS experiment_name,
+        participant.participant_id,
+        measurement.id AS measurement_id,
+        measurement.timepoint AS measurement_time_point,
+        measurement.device,
+        measurement.target,
+        measurement.axis,
+        measurement.unit"""
+
+# WHERE clauses of the datapoint getters (on the joined experiment/participant/measurement tables)
+_WHERE_EXP_ID = "experiment.id = ?"
+_WHERE_EXP_ID_AND_DEVICE = "experiment.id = ? AND measurement.device = ?"
+_WHERE_EXP_ID_DEVICE_AND_TIMEPOINT = "experiment.id = ? AND measurement.device = ? AND measurement.timepoint = ?"
+_WHERE_EXP_ID_DEVICE_TIMEPOINT_TARGET = "experiment.id = ? AND measurement.device = ? AND measurement.timepoint = ? AND measurement.target = ?"
+
+# dtype of the rows read by get_datapoint_batch (up_down is -1 where it is not set, a NULL value becomes NaN)
+_BATCH_ROW_DTYPE = np.dtype([("measurement_id", np.int64), ("bow_stroke", np.int64), ("up_down", np.int8),
+                             ("key", object), ("time_point", np.int64), ("value", np.float64)])
+
+# order of the streamed datapoints, all datapoints of a bow stroke (of all measurements of a participant) are consecutive
+_STROKE_ORDER = "participant.participant_id, {table}.bow_stroke, {table}.up_down, measurement.id"
+
+@instrument_repository
+@route_to_shards
 class DatapointRepository:
-    def __init__(self):
+    def __init__(self, result_type: str = RESULT_FRAME):
         """
         Initializes the DatapointRepository with a database connection.
+
+        Args:
+            result_type (str): The result type of the getters that return tables: 'frame' (pandas DataFrame),
+                               'records' (NumPy record array) or 'tuples' (list of row tuples), see data_access/results.py.
+        """
+        self.result_type = check_result_type(result_type)
+        self.layout = get_datapoint_layout(self.conn)     # 'rows' (datapoint table) or 'waveform' (waveform table)
+
+    @property
+    def conn(self) -> Connection:
+        """
+        The writer connection (see db.connection.get_connection), used by the setters; the one of the experiment's
+        shard in a sharded database (see db/sharding.py).
         """
-        self.conn = get_connection()
+        return get_connection()
+
+    @property
+    def read_conn(self) -> Connection:
+        """
+        The read-only connection of the calling thread (see db.connection.get_read_connection), used by the getters.
+        """
+        return get_read_connection()
 
 # region Setter
     def insert_datapoint(self, datapoint: Datapoint):
@@ -18,33 +109,110 @@ class DatapointRepository:
             datapoint (Datapoint): The Datapoint object containing measurement ID, bow stroke, 
                                    time point, and value.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO datapoint (measurement_id, bow_stroke, up_down, key, time_point, value)
-            VALUES (?, ?, ?, ?, ?)
-        """, (datapoint.measurement_id, datapoint.bow_stroke, datapoint.up_down, datapoint.key, datapoint.time_point, 
-              datapoint.value))
-        self.conn.commit()
+        self.insert_many_datapoints([datapoint])
         
-    def insert_many_datapoints(self, datapoints: list[Datapoint]):
+    def insert_many_datapoints(self, datapoints: list[Datapoint] | DatapointBatch, commit: bool = True):
         """
         Inserts multiple datapoints into the database in a single batch operation.
+        In the waveform layout, the datapoints are grouped by (measurement_id, bow_stroke, up_down) and merged 
+        into the existing waveforms.
 
         Args:
-            datapoints (list[Datapoint]): A list of Datapoint objects, each containing:
+            datapoints (list[Datapoint] | DatapointBatch): A list of Datapoint objects, each containing:
                 - measurement_id
                 - bow_stroke
                 - up_down
+                - key
                 - time_point
                 - value
+                or a DatapointBatch with these columns (inserted by insert_datapoint_batch).
+            commit (bool): Whether the transaction is committed (set to False to insert as part of a larger transaction).
         """
-        
+        if isinstance(datapoints, DatapointBatch):
+            self.insert_datapoint_batch(datapoints, commit)
+            return
+        self.insert_datapoint_rows([(dp.measurement_id, dp.bow_stroke, dp.up_down, dp.key, dp.time_point, dp.value) 
+                                    for dp in datapoints], commit)
+
+    def insert_datapoint_rows(self, rows: list[tuple], commit: bool = True):
+        """
+        Inserts multiple datapoints given as plain tuples (without building Datapoint objects), e.g. for bulk ingestion.
+
+        Args:
+            rows (list[tuple]): (measurement_id, bow_stroke, up_down, key, time_point, value) per datapoint.
+            commit (bool): Whether the transaction is committed (set to False to insert as part of a larger transaction).
+        """
+        if self.layout == LAYOUT_WAVEFORM:
+            self._insert_waveform_rows(rows)
+        else:
+            cursor = self.conn.cursor()
+            cursor.executemany("""
+            INSERT INTO datapoint (measurement_id, bow_stroke, up_down, key, time_point, value)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+        self._finish_insert({row[0] for row in rows}, commit)
+
+    def insert_datapoint_batch(self, batch: DatapointBatch, commit: bool = True):
+        """
+        Inserts the datapoints of a DatapointBatch (NumPy columns, see models/datapoint_batch.py) without building
+        Datapoint objects or a list of row tuples: executemany binds the rows from a generator that converts the
+        columns chunk by chunk. In the waveform layout the strokes are grouped by sorting the columns.
+
+        Args:
+            batch (DatapointBatch): The datapoints (up_down -1 and value NaN are stored as NULL).
+            commit (bool): Whether the transaction is committed (set to False to insert as part of a larger transaction).
+        """
+        if len(batch) == 0:
+            return
+        if self.layout == LAYOUT_WAVEFORM:
+            self._insert_waveform_batch(batch)
+        else:
+            cursor = self.conn.cursor()
+            cursor.executemany("""
+            INSERT INTO datapoint (measurement_id, bow_stroke, up_down, key, time_point, value)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, batch.rows())
+        self._finish_insert(set(np.unique(batch.measurement_id).tolist()), commit)
+
+    def refresh_aggregates(self, measurement_ids: list[int] | None = None, commit: bool = True,
+                           batch_size: int = 500) -> int:
+        """
+        Recomputes the aggregate tables (stroke_summary and waveform_summary, see db/schema.py) of measurements
+        from their datapoints. Inserts only list their measurements as stale (bulk loads call this once at the end,
+        see also python -m db.aggregates); the getters of the aggregates never write, they compute the aggregates of
+        the stale measurements on the fly.
+
+        Args:
+            measurement_ids (list[int] | None): The measurements to recompute, the stale measurements if None.
+            commit (bool): Whether the transaction is committed (set to False to refresh as part of a larger transaction).
+            batch_size (int): Number of measurements recomputed at once (bounds the memory use).
+
+        Returns:
+            int: The number of measurements recomputed.
+        """
+        create_aggregate_tables(self.conn, commit=False)
         cursor = self.conn.cursor()
-        cursor.executemany("""
-        INSERT INTO datapoint (measurement_id, bow_stroke, up_down, key, time_point, value)
-        VALUES (?, ?, ?, ?, ?)
-        """, [(dp.measurement_id, dp.bow_stroke, dp.up_down, dp.key, dp.time_point, dp.value) for dp in datapoints])
-        self.conn.commit()
+        if measurement_ids is None:
+            cursor.execute("SELECT measurement_id FROM aggregate_stale")
+            measurement_ids = [row[0] for row in cursor.fetchall()]
+        for start in range(0, len(measurement_ids), batch_size):
+            batch = measurement_ids[start:start + batch_size]
+            placeholders = ', '.join('?' * len(batch))
+            facts = self._query_facts(batch)
+            for table in ("stroke_summary", "waveform_summary", "aggregate_stale"):
+                cursor.execute(f"DELETE FROM {table} WHERE measurement_id IN ({placeholders})", batch)
+            cursor.executemany("""
+                INSERT INTO stroke_summary (measurement_id, bow_stroke, up_down, n_time_points, mean, min, max,
+                                            range_of_motion, peak_time_point)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, _stroke_summaries(facts))
+            cursor.executemany("""
+                INSERT INTO waveform_summary (measurement_id, time_point, n_strokes, mean, sd)
+                VALUES (?, ?, ?, ?, ?)
+            """, _waveform_summaries(facts))
+        if commit:
+            self.conn.commit()
+        return len(measurement_ids)
 # endregion Setter
 
 #region Getter
@@ -62,42 +230,7 @@ class DatapointRepository:
             pd.DataFrame | None: A DataFrame containing datapoint information along with 
             measurement metadata and participant pain-related fields. Returns None if no data found.
         """
-        cursor = self.conn.cursor()
-        query = """
-            SELECT 
-                experiment.id AS experiment_id,
-                experiment.name AS experiment_name,
-                participant.participant_id,
-                participant.instrument,
-                participant.PRMD_shoulder_neck_right,
-                participant.PRMD_shoulder_neck_left,
-                participant.PRMD_upper_arm_right,
-                participant.PRMD_upper_arm_left,
-                participant.PRMD_ever,
-                measurement.id AS measurement_id,
-                measurement.timepoint,
-                measurement.device,
-                measurement.target,
-                measurement.axis,
-                measurement.unit,
-                datapoint.id AS datapoint_id,
-                datapoint.bow_stroke,
-                datapoint.up_down,
-                datapoint.key,
-                datapoint.time_point AS dp_time_point,
-                datapoint.value
-            FROM datapoint
-            JOIN measurement ON datapoint.measurement_id = measurement.id
-            JOIN participant ON measurement.participant_id = participant.id
-            JOIN experiment ON participant.experiment_id = experiment.id
-            WHERE experiment.id = ?
-        """
-        cursor.execute(query, (exp_id,))
-        rows = cursor.fetchall()
-        if not rows:
-            return None
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)
+        return self._query_datapoints(_METADATA_COLUMNS_BY_EXP_ID, _WHERE_EXP_ID, (exp_id,))
     
     def get_datapoints_by_exp_id_and_device(self, exp_id:int, device:str) -> pd.DataFrame | None:
         """
@@ -112,42 +245,7 @@ class DatapointRepository:
             pd.DataFrame | None: A DataFrame containing datapoint information along with 
             measurement metadata and participant pain-related fields. Returns None if no data found.
         """
-        cursor = self.conn.cursor()
-        query = """
-            SELECT 
-                experiment.id AS experiment_id,
-                experiment.name AS experiment_name,
-                participant.participant_id,
-                participant.instrument,
-                participant.PRMD_shoulder_neck_right,
-                participant.PRMD_shoulder_neck_left,
-                participant.PRMD_upper_arm_right,
-                participant.PRMD_upper_arm_left,
-                participant.PRMD_ever,
-                measurement.id AS measurement_id,
-                measurement.timepoint AS measurement_time_point,
-                measurement.device,
-                measurement.target,
-                measurement.axis,
-                measurement.unit,
-                datapoint.id AS datapoint_id,
-                datapoint.bow_stroke,
-                datapoint.up_down,
-                datapoint.key,
-                datapoint.time_point AS dp_time_point,
-                datapoint.value
-            FROM datapoint
-            JOIN measurement ON datapoint.measurement_id = measurement.id
-            JOIN participant ON measurement.participant_id = participant.id
-            JOIN experiment ON participant.experiment_id = experiment.id
-            WHERE experiment.id = ? AND measurement.device = ?
-        """
-        cursor.execute(query, (exp_id, device))
-        rows = cursor.fetchall()
-        if not rows:
-            return None
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)
+        return self._query_datapoints(_METADATA_COLUMNS, _WHERE_EXP_ID_AND_DEVICE, (exp_id, device))
     
     def get_datapoints_by_exp_id_device_and_timepoint(self, exp_id:int, device:str, timepoint:str) -> pd.DataFrame | None:
         """
@@ -163,42 +261,7 @@ class DatapointRepository:
             pd.DataFrame | None: A DataFrame containing datapoint information along with 
             measurement metadata and participant pain-related fields. Returns None if no data found.
         """
-        cursor = self.conn.cursor()
-        query = """
-            SELECT                
-                experiment.id AS experiment_id,
-                experiment.name AS experiment_name,
-                participant.participant_id,
-                participant.instrument,
-                participant.PRMD_shoulder_neck_right,
-                participant.PRMD_shoulder_neck_left,
-                participant.PRMD_upper_arm_right,
-                participant.PRMD_upper_arm_left,
-                participant.PRMD_ever,
-                measurement.id AS measurement_id,
-                measurement.timepoint AS measurement_time_point,
-                measurement.device,
-                measurement.target,
-                measurement.axis,
-                measurement.unit,
-                datapoint.id AS datapoint_id,
-                datapoint.bow_stroke,
-                datapoint.up_down,
-                datapoint.key,
-                datapoint.time_point AS dp_time_point,
-                datapoint.value
-            FROM datapoint
-            JOIN measurement ON datapoint.measurement_id = measurement.id
-            JOIN participant ON measurement.participant_id = participant.id
-            JOIN experiment ON participant.experiment_id = experiment.id
-            WHERE experiment.id = ? AND measurement.device = ? AND measurement.timepoint = ?
-        """
-        cursor.execute(query, (exp_id, device, timepoint))
-        rows = cursor.fetchall()
-        if not rows:
-            return None
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)
+        return self._query_datapoints(_METADATA_COLUMNS, _WHERE_EXP_ID_DEVICE_AND_TIMEPOINT, (exp_id, device, timepoint))
     
     def get_datapoints_nopain_by_exp_id_device_and_timepoint(self, exp_id:int, device:str, timepoint:str) -> pd.DataFrame | None:
         """
@@ -214,36 +277,7 @@ class DatapointRepository:
             pd.DataFrame | None: A DataFrame containing datapoint information along with 
             measurement metadata and participant pain-related fields. Returns None if no data found.
         """
-        cursor = self.conn.cursor()
-        query = """
-            SELECT 
-                experiment.id AS experiment_id,
-                experiment.name AS experiment_name,
-                participant.participant_id,
-                measurement.id AS measurement_id,
-                measurement.timepoint AS measurement_time_point,
-                measurement.device,
-                measurement.target,
-                measurement.axis,
-                measurement.unit,
-                datapoint.id AS datapoint_id,
-                datapoint.bow_stroke,
-                datapoint.up_down,
-                datapoint.key,
-                datapoint.time_point AS dp_time_point,
-                datapoint.value
-            FROM datapoint
-            JOIN measurement ON datapoint.measurement_id = measurement.id
-            JOIN participant ON measurement.participant_id = participant.id
-            JOIN experiment ON participant.experiment_id = experiment.id
-            WHERE experiment.id = ? AND measurement.device = ? AND measurement.timepoint = ?
-        """
-        cursor.execute(query, (exp_id, device, timepoint))
-        rows = cursor.fetchall()
-        if not rows:
-            return None
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)   
+        return self._query_datapoints(_METADATA_COLUMNS_NOPAIN, _WHERE_EXP_ID_DEVICE_AND_TIMEPOINT, (exp_id, device, timepoint))
 
     def get_datapoints_by_exp_id_device_timepoint_target(self, exp_id:int, device:str, timepoint:str, target:str) -> pd.DataFrame | None:
         """
@@ -259,9 +293,218 @@ class DatapointRepository:
             pd.DataFrame | None: A DataFrame containing datapoint information along with 
             measurement metadata and participant pain-related fields. Returns None if no data found.
         """
-        cursor = self.conn.cursor()
-        query = """
-            SELECT                
+        return self._query_datapoints(_METADATA_COLUMNS, _WHERE_EXP_ID_DEVICE_TIMEPOINT_TARGET, (exp_id, device, timepoint, target))
+    
+    def get_datapoint_by_id(self, datapoint_id: int) -> Datapoint | None:
+        """
+        Retrieves a datapoint from the database using its unique ID.
+
+        Args:
+            datapoint_id (int): The primary key ID of the datapoint in the database.
+
+        Returns:
+            Datapoint | None: A Datapoint object containing the fields:
+                - id
+                - measurement_id
+                - bow_stroke
+                - up_down
+                - key
+                - time_point
+                - value
+            If no matching datapoint is found (or the database uses the waveform layout, 
+            where single datapoints have no ID), returns None.
+        """
+        if self.layout == LAYOUT_WAVEFORM:
+            return None
+        
+        cursor = self.read_conn.cursor()
+        cursor.execute("""
+            SELECT id, measurement_id, bow_stroke, up_down, key, time_point, value FROM datapoint WHERE id = ?
+        """, (datapoint_id,))
+        row = cursor.fetchone()
+        if row:
+            return Datapoint(*row)
+        return None
+
+    def get_feature_matrix(self, exp_id:int, device:str, timepoint:str, targets:list[str] | None = None,
+                           axes:list[str] | None = None, dtype=np.float64, batch_size:int = 100_000,
+                           measurement_ids:list[int] | None = None) -> FeatureMatrix | None:
+        """
+        Retrieves the datapoints of an experiment, measurement device and timepoint directly as a wide
+        (strokes x targets*axes*time_points) NumPy matrix, e.g. as input for PCA.
+        The matrix is preallocated and filled straight from the cursor, no long-format DataFrame is built.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'mocap').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            targets (list[str] | None): Optional list of measurement targets (e.g., ['left elbow joint angle']), 
+                                        all targets are used if None.
+            axes (list[str] | None): Optional list of measurement axes (e.g., ['X', 'Y']), all axes are used if None.
+            dtype: The float dtype of the matrix (np.float32 or np.float64).
+            batch_size (int): Number of rows fetched from the cursor at once.
+            measurement_ids (list[int] | None): Optional list of measurement IDs the matrix is restricted to
+                                                (e.g. the new measurements of an incremental update), all if None.
+
+        Returns:
+            FeatureMatrix | None: The matrix with one row per (participant_id, bow_stroke, up_down; -1 if not set) and one column
+            per (target, axis, time_point), together with the row and column labels. Missing values are NaN.
+            Returns None if no data found.
+        """
+        cursor = self.read_conn.cursor()
+        measurement_filter, params = self._measurement_filter(exp_id, device, timepoint, targets, axes, measurement_ids)
+        columns = self._feature_columns(measurement_filter, params)
+        if columns is None:
+            return None
+        channels, measurement_info, strokes, min_time_point, n_time_points = columns
+        # row layout: one row per stroke, the per-stroke summary is much smaller than the datapoints themselves
+        row_keys = sorted({(measurement_info[m_id][0], bow_stroke, up_down) for m_id, bow_stroke, up_down, _, _ in strokes},
+                          key=_label_sort_key)
+        row_index = {row_key: i for i, row_key in enumerate(row_keys)}
+
+        values = np.full((len(row_keys), len(channels) * n_time_points), np.nan, dtype=dtype)
+        flat_values = values.reshape(-1)
+        n_columns = values.shape[1]
+        # flat offset of the first time point of every (measurement, stroke) waveform
+        stroke_offset = {}
+        for m_id, bow_stroke, up_down, _, _ in strokes:
+            participant_id, channel = measurement_info[m_id]
+            stroke_offset[(m_id, bow_stroke, up_down)] = (row_index[(participant_id, bow_stroke, up_down)] * n_columns
+                                                          + channel * n_time_points - min_time_point)
+
+        if self.layout == LAYOUT_WAVEFORM:
+            cursor.execute(f"""
+                SELECT 
+                    waveform.measurement_id,
+                    waveform.bow_stroke,
+                    COALESCE(waveform.up_down, -1),
+                    waveform.first_time_point,
+                    waveform.samples
+                FROM waveform
+                WHERE waveform.measurement_id IN (
+                    SELECT measurement.id
+                    FROM measurement
+                    JOIN participant ON measurement.participant_id = participant.id
+                    WHERE {measurement_filter}
+                )
+            """, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for m_id, bow_stroke, up_down, first_time_point, samples in rows:
+                    start = stroke_offset[(m_id, bow_stroke, up_down)] + first_time_point
+                    waveform = unpack_waveform(samples)
+                    flat_values[start:start + len(waveform)] = waveform
+        else:
+            cursor.execute(f"""
+                SELECT 
+                    datapoint.measurement_id,
+                    datapoint.bow_stroke,
+                    COALESCE(datapoint.up_down, -1),
+                    datapoint.time_point,
+                    datapoint.value
+                FROM datapoint
+                WHERE datapoint.measurement_id IN (
+                    SELECT measurement.id
+                    FROM measurement
+                    JOIN participant ON measurement.participant_id = participant.id
+                    WHERE {measurement_filter}
+                )
+            """, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                offsets = [stroke_offset[(m_id, bow_stroke, up_down)] + time_point 
+                           for m_id, bow_stroke, up_down, time_point, _ in rows]
+                flat_values[offsets] = [row[4] for row in rows]
+
+        row_labels = np.array(row_keys, dtype=ROW_LABEL_DTYPE)
+        column_labels = np.array([(target, axis, min_time_point + t) for target, axis in channels for t in range(n_time_points)],
+                                 dtype=COLUMN_LABEL_DTYPE)
+        return FeatureMatrix(values=values, row_labels=row_labels, column_labels=column_labels)
+
+    def get_strokes_by_exp_id_device_and_timepoint(self, exp_id:int, device:str, timepoint:str, targets:list[str] | None = None,
+                                                   axes:list[str] | None = None) -> pd.DataFrame | None:
+        """
+        Retrieves one row per stored bow stroke (per measurement) of an experiment, measurement device and timepoint,
+        without the datapoint values.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'mocap').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            targets (list[str] | None): Optional list of measurement targets, all targets are used if None.
+            axes (list[str] | None): Optional list of measurement axes, all axes are used if None.
+
+        Returns:
+            pd.DataFrame | None: A DataFrame with the columns measurement_id, participant_id, target, axis, 
+            bow_stroke, up_down, first_time_point and last_time_point. Returns None if no data found.
+        """
+        cursor = self.read_conn.cursor()
+        measurement_filter, params = self._measurement_filter(exp_id, device, timepoint, targets, axes)
+        cursor.execute(f"""
+            SELECT 
+                measurement.id,
+                participant.participant_id,
+                measurement.target,
+                measurement.axis
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {measurement_filter}
+        """, params)
+        measurement_info = {row[0]: row[1:] for row in cursor.fetchall()}
+        strokes = self._query_stroke_summary(measurement_filter, params)
+        if not strokes:
+            return None
+        rows = [(m_id, *measurement_info[m_id], bow_stroke, None if up_down < 0 else up_down, first_time_point,
+                 last_time_point) for m_id, bow_stroke, up_down, first_time_point, last_time_point in strokes]
+        columns = ["measurement_id", "participant_id", "target", "axis", "bow_stroke", "up_down", 
+                   "first_time_point", "last_time_point"]
+        return rows_to_result(rows, columns, self.result_type)
+
+    def get_datapoint_facts(self, exp_id:int, device:str | None = None, timepoint:str | None = None,
+                            target:str | None = None) -> DatapointFacts | None:
+        """
+        Retrieves the datapoints of an experiment (optionally of one measurement device, timepoint and target) in a
+        normalized star-schema form: a slim fact array plus small measurement and participant dimension frames, 
+        instead of repeating the experiment/participant/measurement columns on every datapoint row.
+        Use DatapointFacts.column or DatapointFacts.to_frame to join dimension columns when they are needed.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str | None): Optional name of the measurement device (e.g., 'emg').
+            timepoint (str | None): Optional name of the measurement timepoint (e.g., 'pre').
+            target (str | None): Optional name of the measurement target (e.g., 'left elbow joint angle').
+
+        Returns:
+            DatapointFacts | None: The facts (measurement_id, bow_stroke, up_down, time_point, value) with their
+            measurement and participant dimensions. Datapoints without a value are left out. Returns None if no data found.
+        """
+        clause, params = self._experiment_filter(exp_id, device, timepoint, target)
+        cursor = self.read_conn.cursor()
+        cursor.execute(f"""
+            SELECT 
+                measurement.id AS measurement_id,
+                measurement.participant_id AS participant_db_id,
+                measurement.timepoint,
+                measurement.device,
+                measurement.target,
+                measurement.axis,
+                measurement.unit
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {clause}
+        """, params)
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+        measurements = pd.DataFrame(rows, columns=[desc[0] for desc in cursor.description]).set_index("measurement_id")
+
+        cursor.execute("""
+            SELECT 
+                participant.id AS participant_db_id,
                 experiment.id AS experiment_id,
                 experiment.name AS experiment_name,
                 participant.participant_id,
@@ -270,13 +513,531 @@ class DatapointRepository:
                 participant.PRMD_shoulder_neck_left,
                 participant.PRMD_upper_arm_right,
                 participant.PRMD_upper_arm_left,
-                participant.PRMD_ever,
+                participant.PRMD_ever
+            FROM participant
+            JOIN experiment ON participant.experiment_id = experiment.id
+            WHERE participant.experiment_id = ?
+        """, (exp_id,))
+        participants = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+        participants = participants.set_index("participant_db_id")
+        participants = participants[participants.index.isin(measurements["participant_db_id"])]
+
+        measurement_ids = f"""
+            SELECT measurement.id
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {clause}
+        """
+        if self.layout == LAYOUT_WAVEFORM:
+            cursor.execute(f"""
+                SELECT 
+                    waveform.measurement_id,
+                    waveform.bow_stroke,
+                    COALESCE(waveform.up_down, -1),
+                    waveform.first_time_point,
+                    waveform.samples
+                FROM waveform
+                WHERE waveform.measurement_id IN ({measurement_ids})
+            """, params)
+            facts = _waveform_facts(cursor.fetchall())
+        else:
+            cursor.execute(f"""
+                SELECT 
+                    datapoint.measurement_id,
+                    datapoint.bow_stroke,
+                    COALESCE(datapoint.up_down, -1),
+                    datapoint.time_point,
+                    datapoint.value
+                FROM datapoint
+                WHERE datapoint.measurement_id IN ({measurement_ids}) AND datapoint.value IS NOT NULL
+            """, params)
+            # filled straight from the cursor, no list of row tuples is built
+            facts = np.fromiter(cursor, dtype=FACT_DTYPE)
+        if len(facts) == 0:
+            return None
+        return DatapointFacts(facts=facts, measurements=measurements, participants=participants)
+    
+    def get_datapoint_batch(self, exp_id:int, device:str | None = None, timepoint:str | None = None,
+                            target:str | None = None) -> DatapointBatch | None:
+        """
+        Retrieves the datapoints of an experiment (optionally of one measurement device, timepoint and target) as a
+        DatapointBatch (NumPy columns measurement_id, bow_stroke, up_down, key, time_point, value), filled straight
+        from the cursor without per-row objects, e.g. to copy or transform datapoints and write them back with
+        insert_datapoint_batch. Join the measurement columns through MeasurementRepository.get_measurements_by_ids.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str | None): Optional name of the measurement device (e.g., 'emg').
+            timepoint (str | None): Optional name of the measurement timepoint (e.g., 'pre').
+            target (str | None): Optional name of the measurement target (e.g., 'left elbow joint angle').
+
+        Returns:
+            DatapointBatch | None: The datapoints (in the row layout including the datapoints without a value, as NaN).
+            Returns None if no data found.
+        """
+        clause, params = self._experiment_filter(exp_id, device, timepoint, target)
+        measurement_ids = f"""
+            SELECT measurement.id
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {clause}
+        """
+        cursor = self.read_conn.cursor()
+        if self.layout == LAYOUT_WAVEFORM:
+            cursor.execute(f"""
+                SELECT 
+                    waveform.measurement_id,
+                    waveform.bow_stroke,
+                    COALESCE(waveform.up_down, -1),
+                    waveform.first_time_point,
+                    waveform.samples,
+                    waveform.key
+                FROM waveform
+                WHERE waveform.measurement_id IN ({measurement_ids})
+            """, params)
+            batch = _waveform_batch(cursor.fetchall())
+        else:
+            cursor.execute(f"""
+                SELECT 
+                    datapoint.measurement_id,
+                    datapoint.bow_stroke,
+                    COALESCE(datapoint.up_down, -1),
+                    datapoint.key,
+                    datapoint.time_point,
+                    datapoint.value
+                FROM datapoint
+                WHERE datapoint.measurement_id IN ({measurement_ids})
+            """, params)
+            rows = np.fromiter(cursor, dtype=_BATCH_ROW_DTYPE)
+            keys = rows["key"]
+            batch = DatapointBatch(measurement_id=rows["measurement_id"], bow_stroke=rows["bow_stroke"],
+                                   up_down=rows["up_down"], key=keys if np.not_equal(keys, None).any() else None,
+                                   time_point=rows["time_point"], value=rows["value"])
+        if len(batch) == 0:
+            return None
+        return batch
+
+    def get_stroke_summaries(self, exp_id:int, device:str, timepoint:str, targets:list[str] | None = None,
+                             axes:list[str] | None = None) -> pd.DataFrame | None:
+        """
+        Retrieves the per-stroke summaries (mean, min, max, range of motion, time point of the maximum) of an
+        experiment, measurement device and timepoint from the stroke_summary table, without reading the datapoints.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'mocap').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            targets (list[str] | None): Optional list of measurement targets, all targets are used if None.
+            axes (list[str] | None): Optional list of measurement axes, all axes are used if None.
+
+        Returns:
+            pd.DataFrame | None: A DataFrame with the columns measurement_id, participant_id, target, axis, bow_stroke,
+            up_down, n_time_points, mean, min, max, range_of_motion and peak_time_point. Returns None if no data
+            found (or the database has no aggregate tables, see db/aggregates.py).
+        """
+        if not has_aggregate_tables(self.read_conn):
+            return None
+        cursor = self.read_conn.cursor()
+        measurement_filter, params = self._measurement_filter(exp_id, device, timepoint, targets, axes)
+        stale, facts = self._stale_facts(measurement_filter, params)
+        cursor.execute(f"""
+            SELECT 
                 measurement.id AS measurement_id,
-                measurement.timepoint AS measurement_time_point,
-                measurement.device,
+                participant.participant_id,
                 measurement.target,
                 measurement.axis,
-                measurement.unit,
+                stroke_summary.bow_stroke,
+                stroke_summary.up_down,
+                stroke_summary.n_time_points,
+                stroke_summary.mean,
+                stroke_summary.min,
+                stroke_summary.max,
+                stroke_summary.range_of_motion,
+                stroke_summary.peak_time_point
+            FROM stroke_summary
+            JOIN measurement ON stroke_summary.measurement_id = measurement.id
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {measurement_filter}
+            ORDER BY participant.participant_id, measurement.target, measurement.axis, stroke_summary.bow_stroke
+        """, params)
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+        if stale:
+            labels = self._measurement_labels(stale)
+            rows = [row for row in rows if row[0] not in stale]
+            rows += [(m_id, *labels[m_id], *summary) for m_id, *summary in _stroke_summaries(facts)]
+            rows.sort(key=lambda row: _label_sort_key(row[1:5]))
+        if not rows:
+            return None
+        return rows_to_result(rows, columns, self.result_type)
+
+# endregion Getter
+
+# region Streaming Getter
+# generator variants of the datapoint getters, use these to process large results in bounded memory.
+# Every chunk contains about chunk_size datapoints, and a bow stroke is never split across two chunks.
+
+    def iter_datapoints_by_exp_id(self, exp_id:int, chunk_size:int = 100_000,
+                                  as_records:bool = False) -> Iterator[pd.DataFrame | np.recarray]:
+        """
+        Streams all datapoints associated with a specific experiment ID in chunks (see get_datapoints_by_exp_id).
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            chunk_size (int): The approximate number of datapoints per chunk.
+            as_records (bool): Whether the chunks are NumPy record arrays instead of DataFrames.
+
+        Yields:
+            pd.DataFrame | np.recarray: The next chunk of datapoints, with the columns of get_datapoints_by_exp_id.
+        """
+        return self._iter_datapoints(_METADATA_COLUMNS_BY_EXP_ID, _WHERE_EXP_ID, (exp_id,), chunk_size, as_records)
+
+    def iter_datapoints_by_exp_id_and_device(self, exp_id:int, device:str, chunk_size:int = 100_000,
+                                             as_records:bool = False) -> Iterator[pd.DataFrame | np.recarray]:
+        """
+        Streams all datapoints associated with a specific experiment ID and measurement device in chunks
+        (see get_datapoints_by_exp_id_and_device).
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'emg').
+            chunk_size (int): The approximate number of datapoints per chunk.
+            as_records (bool): Whether the chunks are NumPy record arrays instead of DataFrames.
+
+        Yields:
+            pd.DataFrame | np.recarray: The next chunk of datapoints, with the columns of get_datapoints_by_exp_id_and_device.
+        """
+        return self._iter_datapoints(_METADATA_COLUMNS, _WHERE_EXP_ID_AND_DEVICE, (exp_id, device), chunk_size, as_records)
+
+    def iter_datapoints_by_exp_id_device_and_timepoint(self, exp_id:int, device:str, timepoint:str, chunk_size:int = 100_000,
+                                                       as_records:bool = False) -> Iterator[pd.DataFrame | np.recarray]:
+        """
+        Streams all datapoints associated with a specific experiment ID, measurement device and timepoint in chunks
+        (see get_datapoints_by_exp_id_device_and_timepoint).
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'emg').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            chunk_size (int): The approximate number of datapoints per chunk.
+            as_records (bool): Whether the chunks are NumPy record arrays instead of DataFrames.
+
+        Yields:
+            pd.DataFrame | np.recarray: The next chunk of datapoints, with the columns of get_datapoints_by_exp_id_device_and_timepoint.
+        """
+        return self._iter_datapoints(_METADATA_COLUMNS, _WHERE_EXP_ID_DEVICE_AND_TIMEPOINT, (exp_id, device, timepoint),
+                                     chunk_size, as_records)
+
+    def iter_datapoints_nopain_by_exp_id_device_and_timepoint(self, exp_id:int, device:str, timepoint:str, chunk_size:int = 100_000,
+                                                              as_records:bool = False) -> Iterator[pd.DataFrame | np.recarray]:
+        """
+        Streams all datapoints (without the pain and instrument information) associated with a specific experiment ID,
+        measurement device and timepoint in chunks (see get_datapoints_nopain_by_exp_id_device_and_timepoint).
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'emg').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            chunk_size (int): The approximate number of datapoints per chunk.
+            as_records (bool): Whether the chunks are NumPy record arrays instead of DataFrames.
+
+        Yields:
+            pd.DataFrame | np.recarray: The next chunk of datapoints, with the columns of get_datapoints_nopain_by_exp_id_device_and_timepoint.
+        """
+        return self._iter_datapoints(_METADATA_COLUMNS_NOPAIN, _WHERE_EXP_ID_DEVICE_AND_TIMEPOINT, (exp_id, device, timepoint),
+                                     chunk_size, as_records)
+
+    def iter_datapoints_by_exp_id_device_timepoint_target(self, exp_id:int, device:str, timepoint:str, target:str,
+                                                          chunk_size:int = 100_000,
+                                                          as_records:bool = False) -> Iterator[pd.DataFrame | np.recarray]:
+        """
+        Streams all datapoints associated with a specific experiment ID, measurement device, timepoint and target in chunks
+        (see get_datapoints_by_exp_id_device_timepoint_target).
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'emg').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            target (str): The name of the measurement target (e.g., 'left elbow joint angle').
+            chunk_size (int): The approximate number of datapoints per chunk.
+            as_records (bool): Whether the chunks are NumPy record arrays instead of DataFrames.
+
+        Yields:
+            pd.DataFrame | np.recarray: The next chunk of datapoints, with the columns of get_datapoints_by_exp_id_device_timepoint_target.
+        """
+        return self._iter_datapoints(_METADATA_COLUMNS, _WHERE_EXP_ID_DEVICE_TIMEPOINT_TARGET, (exp_id, device, timepoint, target),
+                                     chunk_size, as_records)
+
+    def iter_feature_matrices(self, exp_id:int, device:str, timepoint:str, targets:list[str] | None = None,
+                              axes:list[str] | None = None, batch_size:int = 1_000,
+                              dtype=np.float64, measurement_ids:list[int] | None = None) -> Iterator[FeatureMatrix]:
+        """
+        Streams the feature matrix of an experiment, measurement device and timepoint (see get_feature_matrix)
+        in batches of complete bow strokes, e.g. as input for an out-of-core (incremental) PCA.
+        All batches have the same columns, only one batch is held in memory at a time.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'mocap').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            targets (list[str] | None): Optional list of measurement targets, all targets are used if None.
+            axes (list[str] | None): Optional list of measurement axes, all axes are used if None.
+            batch_size (int): The number of strokes (rows) per batch, the last batch may be smaller.
+            dtype: The float dtype of the matrices (np.float32 or np.float64).
+            measurement_ids (list[int] | None): Optional list of measurement IDs the matrices are restricted to, all if None.
+
+        Yields:
+            FeatureMatrix: The next batch of strokes, ordered by (participant_id, bow_stroke, up_down; -1 if not set).
+            Missing values are NaN.
+        """
+        measurement_filter, params = self._measurement_filter(exp_id, device, timepoint, targets, axes, measurement_ids)
+        columns = self._feature_columns(measurement_filter, params)
+        if columns is None:
+            return
+        channels, measurement_info, _, min_time_point, n_time_points = columns
+        column_labels = np.array([(target, axis, min_time_point + t) for target, axis in channels for t in range(n_time_points)],
+                                 dtype=COLUMN_LABEL_DTYPE)
+        waveform = self.layout == LAYOUT_WAVEFORM
+        table = "waveform" if waveform else "datapoint"
+        value_columns = "waveform.first_time_point, waveform.samples" if waveform else "datapoint.time_point, datapoint.value"
+
+        cursor = self.read_conn.cursor()
+        cursor.execute(f"""
+            SELECT 
+                participant.participant_id,
+                {table}.bow_stroke,
+                COALESCE({table}.up_down, -1),
+                {table}.measurement_id,
+                {value_columns}
+            FROM {table}
+            JOIN measurement ON {table}.measurement_id = measurement.id
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {measurement_filter}
+            ORDER BY {_STROKE_ORDER.format(table=table)}
+        """, params)
+
+        n_columns = len(channels) * n_time_points
+        values = np.full((batch_size, n_columns), np.nan, dtype=dtype)
+        row_keys, current_key = [], None
+        while True:
+            rows = cursor.fetchmany(10_000 if waveform else 100_000)
+            if not rows:
+                break
+            for participant_id, bow_stroke, up_down, m_id, time_point, value in rows:
+                if (participant_id, bow_stroke, up_down) != current_key:
+                    if len(row_keys) == batch_size:
+                        yield FeatureMatrix(values=values, row_labels=np.array(row_keys, dtype=ROW_LABEL_DTYPE),
+                                            column_labels=column_labels)
+                        values = np.full((batch_size, n_columns), np.nan, dtype=dtype)
+                        row_keys = []
+                    current_key = (participant_id, bow_stroke, up_down)
+                    row_keys.append(current_key)
+                start = measurement_info[m_id][1] * n_time_points + time_point - min_time_point
+                if waveform:
+                    samples = unpack_waveform(value)
+                    values[len(row_keys) - 1, start:start + len(samples)] = samples
+                else:
+                    values[len(row_keys) - 1, start] = np.nan if value is None else value
+        if row_keys:
+            yield FeatureMatrix(values=values[:len(row_keys)], row_labels=np.array(row_keys, dtype=ROW_LABEL_DTYPE),
+                                column_labels=column_labels)
+# endregion Streaming Getter
+
+# region Helper
+    def _invalidate_cached_experiments(self, measurement_ids: set[int]):
+        """
+        Removes the query cache entries (see data_access/query_cache.py) of the experiments the given measurements belong to.
+        """
+        if not measurement_ids:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT DISTINCT participant.experiment_id
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE measurement.id IN ({', '.join('?' * len(measurement_ids))})
+        """, tuple(measurement_ids))
+        for (exp_id,) in cursor.fetchall():
+            invalidate_experiment(exp_id)
+
+    def _finish_insert(self, measurement_ids: set[int], commit: bool):
+        """
+        Marks the aggregates of the inserted measurements stale, commits if commit is True and removes the query cache
+        entries of their experiments.
+        """
+        self._mark_aggregates_stale(measurement_ids)
+        if commit:
+            self.conn.commit()
+        self._invalidate_cached_experiments(measurement_ids)
+
+    def _mark_aggregates_stale(self, measurement_ids: set[int]):
+        """
+        Lists measurements whose aggregates must be recomputed (see refresh_aggregates), in the current transaction
+        (nothing to do in a database without aggregate tables, see db/aggregates.py).
+        """
+        if not has_aggregate_tables(self.conn):
+            return
+        self.conn.cursor().executemany("INSERT OR IGNORE INTO aggregate_stale (measurement_id) VALUES (?)",
+                                       [(measurement_id,) for measurement_id in measurement_ids])
+
+    def _stale_facts(self, measurement_filter: str, params: tuple) -> tuple[set[int], np.ndarray]:
+        """
+        Retrieves the stale measurements (see refresh_aggregates) selected by the given filter (see _measurement_filter)
+        and their facts through the read connection, for the getters that compute their aggregates on the fly.
+
+        Returns:
+            tuple[set[int], np.ndarray]: The IDs of the stale measurements and their fact array (FACT_DTYPE).
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute(f"""
+            SELECT aggregate_stale.measurement_id
+            FROM aggregate_stale
+            JOIN measurement ON aggregate_stale.measurement_id = measurement.id
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {measurement_filter}
+        """, params)
+        stale = [row[0] for row in cursor.fetchall()]
+        facts = [self._query_facts(stale[start:start + 500], self.read_conn) for start in range(0, len(stale), 500)]
+        return set(stale), np.concatenate(facts) if facts else np.empty(0, dtype=FACT_DTYPE)
+
+    def _measurement_labels(self, measurement_ids: set[int]) -> dict[int, tuple]:
+        """
+        Returns {measurement_id: (participant_id, target, axis)} of the given measurements.
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute(f"""
+            SELECT measurement.id, participant.participant_id, measurement.target, measurement.axis
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE measurement.id IN ({', '.join('?' * len(measurement_ids))})
+        """, tuple(measurement_ids))
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def _query_facts(self, measurement_ids: list[int], conn: Connection | None = None) -> np.ndarray:
+        """
+        Retrieves the datapoints of the given measurements as a fact array (FACT_DTYPE) through the writer connection
+        (i.e. including the datapoints of the current transaction) or the given connection.
+        Datapoints without a value are left out.
+        """
+        cursor = (conn or self.conn).cursor()
+        placeholders = ', '.join('?' * len(measurement_ids))
+        if self.layout == LAYOUT_WAVEFORM:
+            cursor.execute(f"""
+                SELECT measurement_id, bow_stroke, COALESCE(up_down, -1), first_time_point, samples
+                FROM waveform
+                WHERE measurement_id IN ({placeholders})
+            """, measurement_ids)
+            return _waveform_facts(cursor.fetchall())
+        cursor.execute(f"""
+            SELECT measurement_id, bow_stroke, COALESCE(up_down, -1), time_point, value
+            FROM datapoint
+            WHERE measurement_id IN ({placeholders}) AND value IS NOT NULL
+        """, measurement_ids)
+        return np.fromiter(cursor, dtype=FACT_DTYPE)
+
+    def _query_datapoints(self, metadata_columns:str, where:str, params:tuple) -> pd.DataFrame | None:
+        """
+        Runs a datapoint query in the storage layout of the database and returns the long-format result
+        (one row per time point), independent of the layout.
+
+        Args:
+            metadata_columns (str): The SELECT list of experiment/participant/measurement columns.
+            where (str): The WHERE clause (without 'WHERE') on the joined experiment/participant/measurement tables.
+            params (tuple): The query parameters of the WHERE clause.
+
+        Returns:
+            pd.DataFrame | None: The metadata columns followed by datapoint_id, bow_stroke, up_down, key, 
+            dp_time_point and value. Returns None if no data found.
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute(self._datapoint_query(metadata_columns, where), params)
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+        columns = [desc[0] for desc in cursor.description]
+        if self.layout == LAYOUT_WAVEFORM:
+            return arrays_to_result(_expand_waveforms(rows, columns[:-2]), self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
+
+    def _iter_datapoints(self, metadata_columns:str, where:str, params:tuple, chunk_size:int,
+                         as_records:bool) -> Iterator[pd.DataFrame | np.recarray]:
+        """
+        Streams the result of a datapoint query (see _query_datapoints) in chunks of about chunk_size datapoints,
+        fetched with fetchmany. The datapoints are ordered by (participant_id, bow_stroke, up_down), and chunks are only
+        cut between bow strokes, so all datapoints of a bow stroke (of all selected measurements) are in the same chunk.
+        A chunk is larger than chunk_size if a single bow stroke has more datapoints.
+
+        Yields:
+            pd.DataFrame | np.recarray: The next chunk, with the same columns as the result of _query_datapoints.
+        """
+        waveform = self.layout == LAYOUT_WAVEFORM
+        table = "waveform" if waveform else "datapoint"
+        cursor = self.read_conn.cursor()
+        order_by = _STROKE_ORDER.format(table=table) + ("" if waveform else ", datapoint.time_point")
+        cursor.execute(self._datapoint_query(metadata_columns, where, order_by), params)
+        columns = [desc[0] for desc in cursor.description]
+        key_index = [columns.index(column) for column in ("participant_id", "bow_stroke", "up_down")]
+        stroke_key = lambda row: tuple(row[i] for i in key_index)
+        if waveform:
+            columns = columns[:-2]
+            row_size = lambda row: len(row[-1]) // WAVEFORM_SAMPLE_DTYPE.itemsize
+            fetch_size = max(1, chunk_size // 101)
+        else:
+            row_size = lambda row: 1
+            fetch_size = chunk_size
+
+        result_type = RESULT_RECORDS if as_records else self.result_type
+        def to_chunk(rows):
+            if waveform:
+                return arrays_to_result(_expand_waveforms(rows, columns), result_type)
+            return rows_to_result(rows, columns, result_type)
+
+        pending, pending_size = [], 0
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            pending.extend(rows)
+            pending_size += sum(map(row_size, rows))
+            if pending_size < chunk_size:
+                continue
+            # cut before the last (possibly incomplete) bow stroke
+            last_key = stroke_key(pending[-1])
+            cut = len(pending) - 1
+            while cut > 0 and stroke_key(pending[cut - 1]) == last_key:
+                cut -= 1
+            if cut == 0:
+                continue
+            chunk, pending = pending[:cut], pending[cut:]
+            pending_size = sum(map(row_size, pending))
+            yield to_chunk(chunk)
+        if pending:
+            yield to_chunk(pending)
+
+    def _datapoint_query(self, metadata_columns:str, where:str, order_by:str | None = None) -> str:
+        """
+        Builds the datapoint query of _query_datapoints/_iter_datapoints for the storage layout of the database.
+        In the waveform layout, the last two columns are first_time_point and samples instead of dp_time_point and value
+        (and there is no datapoint_id), see _expand_waveforms.
+        """
+        order_clause = f"ORDER BY {order_by}" if order_by else ""
+        if self.layout == LAYOUT_WAVEFORM:
+            return f"""
+                SELECT {metadata_columns},
+                    waveform.bow_stroke,
+                    waveform.up_down,
+                    waveform.key,
+                    waveform.first_time_point,
+                    waveform.samples
+                FROM waveform
+                JOIN measurement ON waveform.measurement_id = measurement.id
+                JOIN participant ON measurement.participant_id = participant.id
+                JOIN experiment ON participant.experiment_id = experiment.id
+                WHERE {where}
+                {order_clause}
+            """
+        return f"""
+            SELECT {metadata_columns},
                 datapoint.id AS datapoint_id,
                 datapoint.bow_stroke,
                 datapoint.up_down,
@@ -287,40 +1048,306 @@ class DatapointRepository:
             JOIN measurement ON datapoint.measurement_id = measurement.id
             JOIN participant ON measurement.participant_id = participant.id
             JOIN experiment ON participant.experiment_id = experiment.id
-            WHERE experiment.id = ? AND measurement.device = ? AND measurement.timepoint = ? AND measurement.target = ?
+            WHERE {where}
+            {order_clause}
         """
-        cursor.execute(query, (exp_id, device, timepoint, target))
-        rows = cursor.fetchall()
-        if not rows:
-            return None
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)
-    
-    def get_datapoint_by_id(self, datapoint_id: int) -> Datapoint | None:
+
+    def _query_stroke_summary(self, measurement_filter:str, params:tuple) -> list[tuple]:
         """
-        Retrieves a datapoint from the database using its unique ID.
+        Retrieves one row per (measurement_id, bow_stroke, up_down) with the first and last time point of the stroke,
+        for the measurements selected by the given filter (see _measurement_filter).
 
-        Args:
-            datapoint_id (int): The primary key ID of the datapoint in the database.
+        Returns:
+            list[tuple]: (measurement_id, bow_stroke, up_down, first time point, last time point) per stroke
+            (up_down -1 where it is not set).
+        """
+        cursor = self.read_conn.cursor()
+        if self.layout == LAYOUT_WAVEFORM:
+            cursor.execute(f"""
+                SELECT 
+                    waveform.measurement_id,
+                    waveform.bow_stroke,
+                    COALESCE(waveform.up_down, -1),
+                    waveform.first_time_point,
+                    waveform.first_time_point + length(waveform.samples) / {WAVEFORM_SAMPLE_DTYPE.itemsize} - 1
+                FROM waveform
+                WHERE waveform.measurement_id IN (
+                    SELECT measurement.id
+                    FROM measurement
+                    JOIN participant ON measurement.participant_id = participant.id
+                    WHERE {measurement_filter}
+                )
+            """, params)
+        else:
+            cursor.execute(f"""
+                SELECT 
+                    datapoint.measurement_id,
+                    datapoint.bow_stroke,
+                    COALESCE(datapoint.up_down, -1),
+                    MIN(datapoint.time_point),
+                    MAX(datapoint.time_point)
+                FROM datapoint
+                WHERE datapoint.measurement_id IN (
+                    SELECT measurement.id
+                    FROM measurement
+                    JOIN participant ON measurement.participant_id = participant.id
+                    WHERE {measurement_filter}
+                )
+                GROUP BY datapoint.measurement_id, datapoint.bow_stroke, datapoint.up_down
+            """, params)
+        return cursor.fetchall()
+
+    def _feature_columns(self, measurement_filter:str, params:tuple) -> tuple | None:
+        """
+        Determines the column layout of a feature matrix (one block of time points per (target, axis) channel)
+        for the measurements selected by the given filter (see _measurement_filter).
 
         Returns:
-            Datapoint | None: A Datapoint object containing the fields:
-                - id
-                - measurement_id
-                - bow_stroke
-                - up_down
-                - key
-                - time_point
-                - value
-            If no matching datapoint is found, returns None.
+            tuple | None: The sorted channels, {measurement_id: (participant_id, channel index)}, the stroke summary
+            (see _query_stroke_summary), the first time point and the number of time points per channel.
+            None if no data found.
         """
-        
+        cursor = self.read_conn.cursor()
+        cursor.execute(f"""
+            SELECT 
+                measurement.id,
+                participant.participant_id,
+                measurement.target,
+                measurement.axis
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {measurement_filter}
+        """, params)
+        measurements = cursor.fetchall()
+        if not measurements:
+            return None
+        channels = sorted({(target, axis) for _, _, target, axis in measurements}, key=_label_sort_key)
+        channel_index = {channel: i for i, channel in enumerate(channels)}
+        measurement_info = {m_id: (participant_id, channel_index[(target, axis)])
+                            for m_id, participant_id, target, axis in measurements}
+
+        strokes = self._query_stroke_summary(measurement_filter, params)
+        if not strokes:
+            return None
+        min_time_point = min(stroke[3] for stroke in strokes)
+        n_time_points = max(stroke[4] for stroke in strokes) - min_time_point + 1
+        return channels, measurement_info, strokes, min_time_point, n_time_points
+
+    def _insert_waveform_rows(self, rows: list[tuple]):
+        """
+        Inserts datapoint rows (measurement_id, bow_stroke, up_down, key, time_point, value) into the waveform table. 
+        The rows are grouped per stroke and merged with the already stored waveform of that stroke 
+        (time points without a value are stored as NaN). Does not commit.
+        """
+        strokes = {}
+        for row in rows:
+            strokes.setdefault(row[:3], []).append(row)
+
         cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM datapoint WHERE id = ?", (datapoint_id,))
+        for (measurement_id, bow_stroke, up_down), stroke_rows in strokes.items():
+            self._merge_waveform(cursor, measurement_id, bow_stroke, up_down, stroke_rows[0][3],
+                                 {row[4]: row[5] for row in stroke_rows})
+
+    def _insert_waveform_batch(self, batch: DatapointBatch):
+        """
+        Inserts a DatapointBatch into the waveform table, like _insert_waveform_rows: the columns are sorted by stroke
+        and every stroke is merged with its stored waveform. Does not commit.
+        """
+        order = np.lexsort((batch.up_down, batch.bow_stroke, batch.measurement_id))
+        batch = batch.take(order)
+        strokes = np.column_stack((batch.measurement_id, batch.bow_stroke, batch.up_down))
+        bounds = np.flatnonzero(np.any(strokes[1:] != strokes[:-1], axis=1)) + 1
+        starts, stops = np.r_[0, bounds], np.r_[bounds, len(batch)]
+
+        cursor = self.conn.cursor()
+        for (measurement_id, bow_stroke, up_down), start, stop in zip(strokes[starts].tolist(), starts.tolist(),
+                                                                       stops.tolist()):
+            self._merge_waveform(cursor, measurement_id, bow_stroke, None if up_down < 0 else up_down,
+                                 batch.key[start] if batch.key is not None else None,
+                                 dict(zip(batch.time_point[start:stop].tolist(), batch.value[start:stop].tolist())))
+
+    def _merge_waveform(self, cursor, measurement_id: int, bow_stroke: int, up_down: int | None, key: str | None,
+                        values: dict[int, float | None]):
+        """
+        Merges the values of a stroke (by time point) with its stored waveform (the new values take precedence)
+        and writes the waveform. Does not commit.
+        The stored waveform is updated by its id: the UNIQUE constraint does not match strokes without up_down
+        (NULLs are distinct), so INSERT OR REPLACE would add a duplicate row for them.
+        """
+        cursor.execute("""
+            SELECT id, key, first_time_point, samples FROM waveform
+            WHERE measurement_id = ? AND bow_stroke = ? AND up_down IS ?
+        """, (measurement_id, bow_stroke, up_down))
         row = cursor.fetchone()
         if row:
-            return Datapoint(id=row["id"], measurement_id=row["measurement_id"], bow_stroke=row["bow_stroke"],
-                             up_down=row["up_down"], key = row["key"], time_point=row["time_point"], value=row["value"])
-        return None
-    
-# endregion Getter
\ No newline at end of file
+            key = row[1] if row[1] is not None else key
+            stored = unpack_waveform(row[3])
+            values = {row[2] + i: float(v) for i, v in enumerate(stored) if not np.isnan(v)} | values
+
+        first_time_point = min(values)
+        waveform = np.full(max(values) - first_time_point + 1, np.nan)
+        for time_point, value in values.items():
+            waveform[time_point - first_time_point] = np.nan if value is None else value
+        if row:
+            cursor.execute("UPDATE waveform SET key = ?, first_time_point = ?, samples = ? WHERE id = ?",
+                           (key, first_time_point, pack_waveform(waveform), row[0]))
+        else:
+            cursor.execute("""
+                INSERT INTO waveform (measurement_id, bow_stroke, up_down, key, first_time_point, samples)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (measurement_id, bow_stroke, up_down, key, first_time_point, pack_waveform(waveform)))
+
+    def _experiment_filter(self, exp_id:int, device:str | None = None, timepoint:str | None = None,
+                           target:str | None = None) -> tuple[str, tuple]:
+        """
+        Builds the WHERE clause (and its parameters) that selects the measurements of an experiment and optionally
+        one measurement device, timepoint and target.
+        The clause expects the measurement table to be joined with the participant table.
+
+        Returns:
+            tuple[str, tuple]: The WHERE clause (without 'WHERE') and the query parameters.
+        """
+        clause, params = "participant.experiment_id = ?", [exp_id]
+        for column, value in (("device", device), ("timepoint", timepoint), ("target", target)):
+            if value is not None:
+                clause += f" AND measurement.{column} = ?"
+                params.append(value)
+        return clause, tuple(params)
+
+    def _measurement_filter(self, exp_id:int, device:str, timepoint:str, targets:list[str] | None = None,
+                            axes:list[str] | None = None, measurement_ids:list[int] | None = None) -> tuple[str, tuple]:
+        """
+        Builds the WHERE clause (and its parameters) that selects the measurements of an experiment, 
+        measurement device, timepoint and optionally a list of targets, axes and measurement IDs.
+        The clause expects the measurement table to be joined with the participant table.
+
+        Returns:
+            tuple[str, tuple]: The WHERE clause (without 'WHERE') and the query parameters.
+        """
+        clause = "participant.experiment_id = ? AND measurement.device = ? AND measurement.timepoint = ?"
+        params = [exp_id, device, timepoint]
+        if targets is not None:
+            clause += f" AND measurement.target IN ({', '.join('?' * len(targets))})"
+            params.extend(targets)
+        if axes is not None:
+            clause += f" AND measurement.axis IN ({', '.join('?' * len(axes))})"
+            params.extend(axes)
+        if measurement_ids is not None:
+            clause += f" AND measurement.id IN ({', '.join('?' * len(measurement_ids))})"
+            params.extend(measurement_ids)
+        return clause, tuple(params)
+# endregion Helper
+
+
+def _expand_waveforms(rows: list[tuple], columns: list[str]) -> dict[str, np.ndarray]:
+    """
+    Expands waveform rows (metadata columns, bow_stroke, up_down, key, first_time_point, samples) into the
+    long format of the row layout (one row per time point, as arrays by column name, see data_access/results.py).
+    Time points stored as NaN are dropped.
+    """
+    waveforms = [unpack_waveform(row[-1]) for row in rows]
+    lengths = np.fromiter((len(w) for w in waveforms), dtype=np.int64, count=len(waveforms))
+    values = np.concatenate(waveforms).astype(np.float64)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    first_time_points = np.repeat(np.fromiter((row[-2] for row in rows), dtype=np.int64, count=len(rows)), lengths)
+    time_points = np.arange(len(values)) - starts + first_time_points
+    keep = ~np.isnan(values)
+
+    data = {}
+    n_metadata = len(columns) - 3
+    for i, column in enumerate(columns[:n_metadata]):
+        data[column] = np.repeat(np.array([row[i] for row in rows], dtype=object), lengths)[keep]
+    data["datapoint_id"] = np.full(keep.sum(), None, dtype=object)
+    for i, column in enumerate(columns[n_metadata:], start=n_metadata):
+        data[column] = np.repeat(np.array([row[i] for row in rows], dtype=object), lengths)[keep]
+    data["dp_time_point"] = time_points[keep]
+    data["value"] = values[keep]
+    return data
+
+def _waveform_facts(rows: list[tuple]) -> np.ndarray:
+    """
+    Expands waveform rows (measurement_id, bow_stroke, up_down, first_time_point, samples) into a fact array
+    (FACT_DTYPE, one entry per time point). Time points stored as NaN are dropped.
+    """
+    waveforms = [unpack_waveform(row[4]) for row in rows]
+    lengths = np.fromiter((len(w) for w in waveforms), dtype=np.int64, count=len(waveforms))
+    values = np.concatenate(waveforms) if waveforms else np.empty(0, dtype=WAVEFORM_SAMPLE_DTYPE)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    stroke_columns = np.array([row[:4] for row in rows], dtype=np.int64).reshape(-1, 4)
+    keep = ~np.isnan(values)
+
+    facts = np.empty(int(keep.sum()), dtype=FACT_DTYPE)
+    for i, name in enumerate(("measurement_id", "bow_stroke", "up_down")):
+        facts[name] = np.repeat(stroke_columns[:, i], lengths)[keep]
+    facts["time_point"] = (np.arange(len(values)) - starts + np.repeat(stroke_columns[:, 3], lengths))[keep]
+    facts["value"] = values[keep]
+    return facts
+
+def _waveform_batch(rows: list[tuple]) -> DatapointBatch:
+    """
+    Expands waveform rows (measurement_id, bow_stroke, up_down, first_time_point, samples, key) into a
+    DatapointBatch (one datapoint per time point). Time points stored as NaN are dropped.
+    """
+    facts = _waveform_facts(rows)
+    keys = [row[5] for row in rows]
+    key = None
+    if any(k is not None for k in keys):
+        lengths = np.fromiter((np.count_nonzero(~np.isnan(unpack_waveform(row[4]))) for row in rows), dtype=np.int64,
+                              count=len(rows))
+        key = np.repeat(np.array(keys, dtype=object), lengths)
+    return DatapointBatch(measurement_id=facts["measurement_id"], bow_stroke=facts["bow_stroke"],
+                          up_down=facts["up_down"], key=key, time_point=facts["time_point"], value=facts["value"])
+
+def _stroke_summaries(facts: np.ndarray) -> list[tuple]:
+    """
+    Computes the stroke_summary rows (measurement_id, bow_stroke, up_down, n_time_points, mean, min, max,
+    range_of_motion, peak_time_point) of a fact array, one row per (measurement_id, bow_stroke, up_down).
+    """
+    if len(facts) == 0:
+        return []
+    # sorted by stroke and descending value (ties: earliest time point), the first entry of a stroke is its maximum
+    facts = facts[np.lexsort((facts["time_point"], -facts["value"], facts["up_down"], facts["bow_stroke"],
+                              facts["measurement_id"]))]
+    new_stroke = np.ones(len(facts), dtype=bool)
+    new_stroke[1:] = ((facts["measurement_id"][1:] != facts["measurement_id"][:-1])
+                      | (facts["bow_stroke"][1:] != facts["bow_stroke"][:-1])
+                      | (facts["up_down"][1:] != facts["up_down"][:-1]))
+    starts = np.flatnonzero(new_stroke)
+    values = facts["value"]
+    counts = np.diff(np.append(starts, len(facts)))
+    maxima = values[starts]
+    minima = np.minimum.reduceat(values, starts)
+    means = np.add.reduceat(values, starts) / counts
+    first = facts[starts]
+    up_down = [None if u < 0 else u for u in first["up_down"].tolist()]
+    return list(zip(first["measurement_id"].tolist(), first["bow_stroke"].tolist(), up_down, counts.tolist(),
+                    means.tolist(), minima.tolist(), maxima.tolist(), (maxima - minima).tolist(),
+                    first["time_point"].tolist()))
+
+def _waveform_summaries(facts: np.ndarray) -> list[tuple]:
+    """
+    Computes the waveform_summary rows (measurement_id, time_point, n_strokes, mean, sd) of a fact array, one row per
+    (measurement_id, time_point). The standard deviation is the sample standard deviation (NULL for a single stroke).
+    """
+    if len(facts) == 0:
+        return []
+    facts = facts[np.lexsort((facts["time_point"], facts["measurement_id"]))]
+    new_point = np.ones(len(facts), dtype=bool)
+    new_point[1:] = ((facts["measurement_id"][1:] != facts["measurement_id"][:-1])
+                     | (facts["time_point"][1:] != facts["time_point"][:-1]))
+    starts = np.flatnonzero(new_point)
+    values = facts["value"]
+    counts = np.diff(np.append(starts, len(facts)))
+    means = np.add.reduceat(values, starts) / counts
+    squares = np.add.reduceat((values - np.repeat(means, counts)) ** 2, starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sds = np.where(counts > 1, np.sqrt(squares / (counts - 1)), np.nan)
+    first = facts[starts]
+    return list(zip(first["measurement_id"].tolist(), first["time_point"].tolist(), counts.tolist(), means.tolist(),
+                    [None if np.isnan(sd) else sd for sd in sds.tolist()]))
+
+def _label_sort_key(label: tuple) -> tuple:
+    """
+    Sort key for label tuples that may contain None (e.g. the axis of EMG measurements), None is sorted first.
+    """
+    return tuple((value is not None, value) for value in label)
\ No newline at end of file
@@ -1,14 +1,32 @@
-import pandas as pd
-from db.connection import get_connection
+from __future__ import annotations
+from sqlite3 import Connection
+from db.connection import get_connection, get_read_connection
+from db.instrumentation import instrument_repository
+from data_access.results import RESULT_FRAME, check_result_type, empty_result, rows_to_result, pd
+from data_access.identity_map import get_identity_map, invalidate_identity_map
+from data_access.query_cache import invalidate_experiment
 from models.experiment import Experiment
 
+@instrument_repository
 class ExperimentRepository:
-    def __init__(self):
+    def __init__(self, result_type: str = RESULT_FRAME):
         """
         Initializes the ExperimentRepository with a database connection.
+
+        Args:
+            result_type (str): The result type of the getters that return tables: 'frame' (pandas DataFrame),
+                               'records' (NumPy record array) or 'tuples' (list of row tuples), see data_access/results.py.
         """
+        self.result_type = check_result_type(result_type)
         self.conn = get_connection()
 
+    @property
+    def read_conn(self) -> Connection:
+        """
+        The read-only connection of the calling thread (see db.connection.get_read_connection), used by the getters.
+        """
+        return get_read_connection()
+
 # region Setter
     def insert_experiment(self, experiment: Experiment):
         """
@@ -26,6 +44,7 @@ class ExperimentRepository:
             VALUES (?, ?)
         """, (experiment.name, experiment.data_state))
         self.conn.commit()
+        invalidate_identity_map("experiment", [cursor.lastrowid])
         return cursor.lastrowid
 
     def experiment_upload_complete(self, relative_path, exp_id):
@@ -42,7 +61,9 @@ class ExperimentRepository:
             SET data_folder = ?, upload_complete = ?
             WHERE id = ?
         """, (relative_path, 1, exp_id))
-        self.conn.commit()      
+        self.conn.commit()
+        invalidate_identity_map("experiment", [exp_id])
+        invalidate_experiment(exp_id)
 # endregion Setter
 
 # region Getter
@@ -55,15 +76,14 @@ class ExperimentRepository:
         Returns:
             pd.DataFrame: A DataFrame containing all rows from the 'experiment' table.
         """
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         cursor.execute("SELECT * FROM experiment")
         rows = cursor.fetchall()
         
-        if not rows:
-            return pd.DataFrame()
-        
         columns = [description[0] for description in cursor.description]
-        return pd.DataFrame(rows, columns=columns)
+        if not rows:
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
     
     
     def get_experiment_by_id(self, experiment_id: int) -> Experiment | None:
@@ -76,16 +96,21 @@ class ExperimentRepository:
         Returns:
             Experiment | None: The experiment object if found, otherwise None.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM experiment WHERE id = ?", (experiment_id,))
-        row = cursor.fetchone()
-        if row:
-            return Experiment(id=row["id"], name=row["name"], data_state=row["data_state"], 
-                              data_folder = row["data_folder"], upload_complete = row["upload_complete"])
-        return None
-    
-    
-    
+        return self.get_experiments_by_ids([experiment_id]).get(experiment_id)
+
+    def get_experiments_by_ids(self, experiment_ids: list[int]) -> dict[int, Experiment]:
+        """
+        Retrieves experiments by their database IDs, from the identity map (see data_access/identity_map.py):
+        the experiment table is read once, further lookups do not query the database.
+
+        Args:
+            experiment_ids (list[int]): The IDs of the experiments to retrieve.
+
+        Returns:
+            dict[int, Experiment]: The experiment object of every ID found (shared, do not modify).
+        """
+        return get_identity_map().get("experiment", experiment_ids)
+
     def get_experiment_id_by_name(self, experiment_name: str) -> int | None:
         """
         Retrieves the ID of an experiment by its name.
@@ -96,7 +121,7 @@ class ExperimentRepository:
         Returns:
             int | None: The experiment ID if found, otherwise None.
         """
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         cursor.execute("SELECT id FROM experiment WHERE name = ?", (experiment_name,))
         row = cursor.fetchone()
         if row:
@@ -114,7 +139,7 @@ class ExperimentRepository:
         Returns:
             int | None: The experiment ID if found, otherwise None.
         """
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         cursor.execute("SELECT id FROM experiment WHERE name = ? AND data_state = ?", (experiment_name,data_state))
         row = cursor.fetchone()
         if row:
@@ -129,7 +154,7 @@ class ExperimentRepository:
             list[str] | None: A list of relative data folder paths if any exist, otherwise None.
         """
         
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         cursor.execute("SELECT data_folder FROM experiment WHERE upload_complete = 1")
         rows = cursor.fetchall()
         if rows:
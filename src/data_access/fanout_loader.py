@@ -0,0 +1,171 @@
+"""
+Concurrent fan-out loader of full-body feature matrices: one block per (device, timepoint, target, axis) selection,
+the blocks are loaded concurrently (DatapointRepository.get_feature_matrix of one target each) and assembled
+column-wise into one FeatureMatrix whose rows are aligned on (participant_id, bow_stroke, up_down):
+    selections = [Selection('mocap', 'pre', 'right elbow joint angle', 'X'), Selection('emg', 'pre', 'biceps')]
+    matrix = load_feature_matrix(exp_id, selections, missing='drop', workers=4)
+
+Executors:
+    'thread'    a thread pool, every thread queries through its own read connection (db.connection); SQLite releases
+                the GIL while a query runs, the Python work of filling a block (e.g. the rows of the 'rows' layout) does not
+    'process'   a process pool (spawned), every process opens its own connections to the database file, so the whole
+                block is built in parallel; pays off for large blocks (a process takes a few 100 ms to start),
+                not available for in-memory databases (like every spawned pool, the calling script needs the
+                if __name__ == '__main__' guard)
+Either way, the wall time is bounded by the number of workers (cores), not by the number of selections.
+
+Strokes missing in some selections (e.g. a target that was not recorded for a stroke) follow the missing policy:
+    'nan'       every stroke of any selection is a row, the blocks of the selections without the stroke are NaN
+    'drop'      only the strokes present in every selection are rows
+    'raise'     a ValueError is raised if any stroke is missing in any selection
+"""
+from __future__ import annotations
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+from db.connection import configure_connections, get_connection_manager, release_read_connection
+from data_access.datapoint_repository import DatapointRepository, _label_sort_key
+from models.feature_matrix import FeatureMatrix, ROW_LABEL_DTYPE, SELECTION_COLUMN_LABEL_DTYPE
+
+MISSING_NAN = "nan"
+MISSING_DROP = "drop"
+MISSING_RAISE = "raise"
+MISSING_POLICIES = (MISSING_NAN, MISSING_DROP, MISSING_RAISE)
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+@dataclass(frozen=True)
+class Selection:
+    device: str                     # measurement device (e.g. 'mocap')
+    timepoint: str                  # measurement timepoint (e.g. 'pre')
+    target: str                     # measurement target (e.g. 'right elbow joint angle')
+    axis: str | None = None         # measurement axis (e.g. 'X'), all axes of the target if None (e.g. emg)
+
+
+def load_feature_matrix(exp_id: int, selections: list[Selection | tuple], missing: str = MISSING_NAN,
+                        workers: int | None = None, executor: str = EXECUTOR_THREAD,
+                        dtype=np.float64) -> FeatureMatrix | None:
+    """
+    Loads the blocks of the selections concurrently and assembles them column-wise (see the module docstring).
+
+    Args:
+        exp_id (int): The ID of the experiment.
+        selections (list[Selection | tuple]): The blocks, as Selection or (device, timepoint, target[, axis]) tuples.
+        missing (str): The policy for strokes missing in some selections ('nan', 'drop' or 'raise').
+        workers (int | None): Number of concurrent loads (default: number of CPUs, at most the number of selections).
+        executor (str): 'thread' or 'process'.
+        dtype: The float dtype of the matrix (np.float32 or np.float64).
+
+    Returns:
+        FeatureMatrix | None: One row per (participant_id, bow_stroke, up_down), one column per
+        (device, timepoint, target, axis, time_point) in the order of the selections (column_labels of dtype
+        SELECTION_COLUMN_LABEL_DTYPE), selections without data are left out with the policy 'nan'.
+        Returns None if no selection has data ('drop': no stroke is in every selection).
+
+    Raises:
+        ValueError: For an unknown policy/executor, a selection without data (unless the policy is 'nan'),
+                    or a missing stroke with the policy 'raise'.
+    """
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"unknown missing policy '{missing}', expected one of {', '.join(MISSING_POLICIES)}")
+    selections = [selection if isinstance(selection, Selection) else Selection(*selection) for selection in selections]
+    if not selections:
+        return None
+    workers = min(workers or os.cpu_count() or 1, len(selections))
+
+    with _create_executor(executor, workers) as pool:
+        if executor == EXECUTOR_PROCESS:
+            blocks = list(pool.map(_load_block, _block_args(exp_id, selections, dtype)))
+        else:
+            repo = DatapointRepository()
+            blocks = list(pool.map(lambda args: _load_block_in_thread(repo, *args),
+                                   _block_args(exp_id, selections, dtype)))
+
+    empty = [selection for selection, block in zip(selections, blocks) if block is None]
+    if empty and missing != MISSING_NAN:
+        raise ValueError(f"no data found for {len(empty)} selection(s), e.g. {empty[0]}")
+    selected = [(selection, block) for selection, block in zip(selections, blocks) if block is not None]
+    if not selected:
+        return None
+    return _assemble(selected, missing, dtype)
+
+
+def _block_args(exp_id: int, selections: list[Selection], dtype) -> list[tuple]:
+    return [(exp_id, selection, dtype) for selection in selections]
+
+def _create_executor(executor: str, workers: int) -> Executor:
+    if executor == EXECUTOR_THREAD:
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout-loader")
+    if executor == EXECUTOR_PROCESS:
+        manager = get_connection_manager()
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=configure_connections,
+                                   initargs=(os.path.abspath(manager.db_path), manager.pool_size, manager.wal,
+                                             manager.timeout, manager.read_pool, _shard_dir(manager)))
+    raise ValueError(f"unknown executor '{executor}', expected '{EXECUTOR_THREAD}' or '{EXECUTOR_PROCESS}'")
+
+def _shard_dir(manager) -> str | None:
+    shard_dir = getattr(manager, "shard_dir", None)        # a sharded database (db/sharding.py)
+    return os.path.abspath(shard_dir) if shard_dir is not None else None
+
+def _load_block_in_thread(repo: DatapointRepository, exp_id: int, selection: Selection, dtype) -> FeatureMatrix | None:
+    """
+    Loads a block on a thread of the pool, through the read connection of the thread (returned to the pool afterwards).
+    """
+    try:
+        return _query_block(repo, exp_id, selection, dtype)
+    finally:
+        release_read_connection()
+
+def _load_block(args: tuple) -> FeatureMatrix | None:
+    """
+    Loads a block in a process of the pool (the connections are configured by the initializer of the pool).
+    """
+    global _process_repo
+    if _process_repo is None:
+        _process_repo = DatapointRepository()
+    return _query_block(_process_repo, *args)
+
+# repository of a pool process, created on its first block
+_process_repo = None
+
+def _query_block(repo: DatapointRepository, exp_id: int, selection: Selection, dtype) -> FeatureMatrix | None:
+    axes = None if selection.axis is None else [selection.axis]
+    return repo.get_feature_matrix(exp_id, selection.device, selection.timepoint, targets=[selection.target],
+                                   axes=axes, dtype=dtype)
+
+def _assemble(blocks: list[tuple[Selection, FeatureMatrix]], missing: str, dtype) -> FeatureMatrix | None:
+    """
+    Assembles the blocks column-wise, the rows aligned on (participant_id, bow_stroke, up_down) by the missing policy.
+    """
+    block_keys = [block.row_labels.tolist() for _, block in blocks]
+    if missing == MISSING_DROP:
+        row_keys = set(block_keys[0]).intersection(*block_keys[1:])
+    else:
+        row_keys = set().union(*block_keys)
+        if missing == MISSING_RAISE:
+            for (selection, _), keys in zip(blocks, block_keys):
+                if len(keys) < len(row_keys):
+                    absent = min(row_keys.difference(keys), key=_label_sort_key)
+                    raise ValueError(f"{len(row_keys) - len(keys)} stroke(s) missing in {selection}, e.g. {absent}")
+    if not row_keys:
+        return None
+    row_keys = sorted(row_keys, key=_label_sort_key)
+    row_index = {key: i for i, key in enumerate(row_keys)}
+
+    values = np.full((len(row_keys), sum(block.values.shape[1] for _, block in blocks)), np.nan, dtype=dtype)
+    column_labels = []
+    first = 0
+    for (selection, block), keys in zip(blocks, block_keys):
+        rows = np.array([row_index.get(key, -1) for key in keys], dtype=np.int64)
+        kept = rows >= 0
+        last = first + block.values.shape[1]
+        values[rows[kept], first:last] = block.values[kept]
+        column_labels.extend((selection.device, selection.timepoint, target, axis, time_point)
+                             for target, axis, time_point in block.column_labels.tolist())
+        first = last
+    return FeatureMatrix(values=values, row_labels=np.array(row_keys, dtype=ROW_LABEL_DTYPE),
+                         column_labels=np.array(column_labels, dtype=SELECTION_COLUMN_LABEL_DTYPE))
@@ -0,0 +1,337 @@
+"""
+Persistent, incrementally updated store of feature matrices (DatapointRepository.get_feature_matrix), one entry per
+(experiment, device, timepoint, targets, axes, dtype), so a new participant does not rebuild the whole matrix:
+    store = FeatureMatrixStore()
+    matrix = store.get(exp_id, 'mocap', 'pre')          # refreshes the entry, then reads it
+
+An entry records the measurements it contains, each with a fingerprint of its per-stroke aggregates (stroke_summary,
+see db/schema.py). A refresh compares them with the measurements of the selection:
+    - new measurements          their strokes are loaded (get_feature_matrix of these measurement IDs only), strokes
+                                not in the matrix yet are appended as new rows
+    - changed measurements      (other fingerprint, or aggregates stale/missing) their blocks are cleared and reloaded
+    - deleted measurements      their blocks are cleared (set to NaN)
+so the refresh reads the datapoints of the new and changed measurements only, plus the small measurement and stroke
+summary tables (without the aggregate tables, see db/aggregates.py, every measurement counts as changed). The entry is rebuilt from scratch when its column layout changes (a new target/axis or time points
+outside of the stored range). Rows are kept in the order they were added (the rows of a rebuild are sorted like
+get_feature_matrix); rows without any value (e.g. of a deleted participant) are left out when the matrix is read.
+
+Layout of an entry (<store_dir>/exp_<exp_id>/<hash of the database path and the selection>/, the store directory
+is 'features' next to the database by default):
+    values.bin          the matrix (rows x columns, C order, raw dtype), new rows are appended, blocks updated in place
+    row_labels.npy      (participant_id, bow_stroke, up_down) per row
+    meta.json           the selection, the column layout, the number of rows and the measurements with their fingerprints
+meta.json is written atomically as the last step of a refresh (measurements that are being updated are removed from it
+first), so an interrupted refresh is completed by the next one.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+import numpy as np
+from sqlite3 import Connection
+from db.connection import get_connection, get_connection_manager, get_read_connection
+from db.schema import has_aggregate_tables
+from db.sharding import route_to_shards
+from data_access.datapoint_repository import DatapointRepository
+from data_access.query_cache import default_cache_dir
+from models.feature_matrix import FeatureMatrix, ROW_LABEL_DTYPE, COLUMN_LABEL_DTYPE
+
+# the default store directory, next to the database (see data_access.query_cache.default_cache_dir)
+DEFAULT_STORE_DIR_NAME = 'features'
+
+@dataclass
+class RefreshReport:
+    n_added: int                    # measurements loaded for the first time
+    n_changed: int                  # measurements whose datapoints changed (reloaded)
+    n_removed: int                  # measurements no longer in the selection (their blocks cleared)
+    n_new_rows: int                 # strokes appended to the matrix
+    n_rows: int                     # rows of the matrix after the refresh
+    rebuilt: bool                   # whether the matrix was built from scratch (new entry or changed column layout)
+    seconds: float
+
+    def __str__(self) -> str:
+        action = "rebuilt" if self.rebuilt else (f"{self.n_added} added, {self.n_changed} changed, "
+                                                 f"{self.n_removed} removed measurements")
+        return f"{action}, {self.n_new_rows} new rows, {self.n_rows} rows in {self.seconds:.2f} s"
+
+
+@route_to_shards
+class FeatureMatrixStore:
+    def __init__(self, store_dir: str | None = None, dtype=np.float64):
+        """
+        Initializes the FeatureMatrixStore (see the module docstring).
+
+        Args:
+            store_dir (str | None): The directory the entries are stored in, 'features' next to the database if None.
+            dtype: The float dtype of the stored matrices (np.float32 or np.float64).
+        """
+        self.conn = get_connection()
+        self.store_dir = default_cache_dir(DEFAULT_STORE_DIR_NAME) if store_dir is None else os.path.abspath(store_dir)
+        self.dtype = np.dtype(dtype)
+        self.datapoint_repo = DatapointRepository()
+
+    @property
+    def read_conn(self) -> Connection:
+        """
+        The read-only connection of the calling thread (see db.connection.get_read_connection).
+        """
+        return get_read_connection()
+
+    def get(self, exp_id: int, device: str, timepoint: str, targets: list[str] | None = None,
+            axes: list[str] | None = None, refresh: bool = True) -> FeatureMatrix | None:
+        """
+        Returns the feature matrix of a selection from the store (like DatapointRepository.get_feature_matrix,
+        except for the order of the rows), refreshing the entry first.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+            device (str): The name of the measurement device (e.g., 'mocap').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            targets (list[str] | None): Optional list of measurement targets, all targets are used if None.
+            axes (list[str] | None): Optional list of measurement axes, all axes are used if None.
+            refresh (bool): Whether the entry is refreshed before it is read (False reads it as stored).
+
+        Returns:
+            FeatureMatrix | None: The matrix, None if no data found (or, with refresh=False, nothing stored).
+        """
+        if refresh:
+            self.refresh(exp_id, device, timepoint, targets, axes)
+        entry_dir = self._entry_dir(exp_id, device, timepoint, targets, axes)
+        meta = _read_meta(entry_dir)
+        if meta is None or meta["n_rows"] == 0:
+            return None
+        values = _open_values(entry_dir, meta, self.dtype, mode="r")
+        row_labels = np.load(os.path.join(entry_dir, "row_labels.npy"), allow_pickle=True)
+        filled = ~np.isnan(values).all(axis=1)
+        if not filled.any():
+            return None
+        return FeatureMatrix(values=np.array(values[filled]), row_labels=row_labels[filled],
+                             column_labels=_column_labels(meta))
+
+    def refresh(self, exp_id: int, device: str, timepoint: str, targets: list[str] | None = None,
+                axes: list[str] | None = None) -> RefreshReport:
+        """
+        Brings the entry of a selection up to date with the database (see the module docstring),
+        the arguments are the ones of get.
+
+        Returns:
+            RefreshReport: What was loaded, cleared or rebuilt.
+        """
+        start = time.perf_counter()
+        selection = [exp_id, device, timepoint, targets, axes, self.dtype.str]
+        entry_dir = self._entry_dir(exp_id, device, timepoint, targets, axes)
+        meta = _read_meta(entry_dir)
+        current = self._measurements(exp_id, device, timepoint, targets, axes)
+        fingerprints = self._fingerprints(list(current))
+
+        stored = {} if meta is None else {int(m_id): info for m_id, info in meta["measurements"].items()}
+        channel_index = {} if meta is None else {tuple(channel): i for i, channel in enumerate(meta["channels"])}
+        if meta is None or any(tuple(info[1:]) not in channel_index for info in current.values()):
+            return self._rebuild(entry_dir, selection, current, fingerprints, start)
+
+        removed = [m_id for m_id in stored if m_id not in current]
+        changed = [m_id for m_id in current if m_id in stored
+                   and (fingerprints[m_id] is None or fingerprints[m_id] != stored[m_id][2])]
+        added = [m_id for m_id in current if m_id not in stored]
+        reload = changed + added
+        if not removed and not reload:
+            return RefreshReport(0, 0, 0, 0, meta["n_rows"], False, time.perf_counter() - start)
+        block = None
+        if reload:
+            block = self.datapoint_repo.get_feature_matrix(exp_id, device, timepoint, targets, axes, self.dtype,
+                                                           measurement_ids=reload)
+            if block is not None:
+                time_points = block.column_labels["time_point"]
+                if (time_points.min() < meta["min_time_point"]
+                        or time_points.max() >= meta["min_time_point"] + meta["n_time_points"]):
+                    return self._rebuild(entry_dir, selection, current, fingerprints, start)
+
+        # the measurements being updated leave the entry first, an interrupted refresh reloads them
+        cleared = [stored.pop(m_id)[:2] for m_id in removed]
+        for m_id in changed:
+            del stored[m_id]
+        cleared += [_measurement_info(current[m_id], channel_index) for m_id in reload]
+        meta["measurements"] = {str(m_id): info for m_id, info in stored.items()}
+        _write_json(os.path.join(entry_dir, "meta.json"), meta)
+
+        row_labels = np.load(os.path.join(entry_dir, "row_labels.npy"), allow_pickle=True)
+        n_new_rows = 0
+        if block is not None:
+            row_keys = set(row_labels.tolist())
+            new_keys = [key for key in block.row_labels.tolist() if key not in row_keys]
+            if new_keys:
+                _append_rows(entry_dir, meta, len(new_keys), self.dtype)
+                row_labels = np.concatenate([row_labels, np.array(new_keys, dtype=ROW_LABEL_DTYPE)])
+                n_new_rows = len(new_keys)
+        meta["n_rows"] = len(row_labels)
+
+        values = _open_values(entry_dir, meta, self.dtype, mode="r+")
+        _clear_blocks(values, row_labels, cleared, meta)
+        if block is not None:
+            _fill_blocks(values, row_labels, block, [_measurement_info(current[m_id], channel_index) for m_id in reload],
+                         meta)
+        values.flush()
+        del values
+        np.save(os.path.join(entry_dir, "row_labels.npy"), row_labels, allow_pickle=True)
+
+        for m_id in reload:
+            stored[m_id] = _measurement_info(current[m_id], channel_index) + [fingerprints[m_id]]
+        meta["measurements"] = {str(m_id): info for m_id, info in stored.items()}
+        _write_json(os.path.join(entry_dir, "meta.json"), meta)
+        return RefreshReport(len(added), len(changed), len(removed), n_new_rows, meta["n_rows"], False,
+                             time.perf_counter() - start)
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def _entry_dir(self, exp_id: int, device: str, timepoint: str, targets: list[str] | None,
+                   axes: list[str] | None) -> str:
+        # the database is part of the key, so databases sharing a store directory do not share entries
+        database = os.path.abspath(get_connection_manager().db_path)
+        selection = json.dumps([database, exp_id, device, timepoint, targets, axes, self.dtype.str])
+        return os.path.join(self.store_dir, f"exp_{exp_id}", hashlib.sha1(selection.encode()).hexdigest()[:16])
+
+    def _measurements(self, exp_id: int, device: str, timepoint: str, targets: list[str] | None,
+                      axes: list[str] | None) -> dict[int, tuple]:
+        """
+        Returns {measurement_id: (participant_id, target, axis)} of the measurements of a selection.
+        """
+        measurement_filter, params = self.datapoint_repo._measurement_filter(exp_id, device, timepoint, targets, axes)
+        cursor = self.read_conn.cursor()
+        cursor.execute(f"""
+            SELECT measurement.id, participant.participant_id, measurement.target, measurement.axis
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {measurement_filter}
+        """, params)
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def _fingerprints(self, measurement_ids: list[int]) -> dict[int, str | None]:
+        """
+        Returns a fingerprint of the stroke summaries of every measurement, None where the aggregates are stale
+        or missing (the measurement is always reloaded then).
+        """
+        fingerprints = dict.fromkeys(measurement_ids)
+        if not measurement_ids or not has_aggregate_tables(self.read_conn):
+            return fingerprints
+        cursor = self.read_conn.cursor()
+        for first in range(0, len(measurement_ids), 10_000):
+            chunk = measurement_ids[first:first + 10_000]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f"""
+                SELECT measurement_id, COUNT(*), TOTAL(bow_stroke), TOTAL(COALESCE(up_down, -1)), TOTAL(n_time_points),
+                       TOTAL(mean), TOTAL(min), TOTAL(max), TOTAL(peak_time_point)
+                FROM stroke_summary
+                WHERE measurement_id IN ({placeholders})
+                  AND measurement_id NOT IN (SELECT measurement_id FROM aggregate_stale)
+                GROUP BY measurement_id
+            """, chunk)
+            for m_id, *summary in cursor.fetchall():
+                fingerprints[m_id] = repr(summary)
+        return fingerprints
+
+    def _rebuild(self, entry_dir: str, selection: list, current: dict[int, tuple], fingerprints: dict[int, str | None],
+                 start: float) -> RefreshReport:
+        """
+        Builds the entry of a selection from scratch.
+        """
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        exp_id, device, timepoint, targets, axes, _ = selection
+        matrix = self.datapoint_repo.get_feature_matrix(exp_id, device, timepoint, targets, axes, self.dtype)
+        if matrix is None:
+            return RefreshReport(0, 0, 0, 0, 0, True, time.perf_counter() - start)
+        channels = list(dict.fromkeys(zip(matrix.column_labels["target"].tolist(), matrix.column_labels["axis"].tolist())))
+        channel_index = {channel: i for i, channel in enumerate(channels)}
+        time_points = matrix.column_labels["time_point"]
+        meta = {"selection": selection, "channels": channels, "min_time_point": int(time_points.min()),
+                "n_time_points": int(time_points.max() - time_points.min() + 1), "n_rows": len(matrix.row_labels),
+                "measurements": {str(m_id): _measurement_info(current[m_id], channel_index) + [fingerprints[m_id]]
+                                 for m_id in current}}
+        os.makedirs(entry_dir, exist_ok=True)
+        np.ascontiguousarray(matrix.values, dtype=self.dtype).tofile(os.path.join(entry_dir, "values.bin"))
+        np.save(os.path.join(entry_dir, "row_labels.npy"), matrix.row_labels, allow_pickle=True)
+        _write_json(os.path.join(entry_dir, "meta.json"), meta)
+        return RefreshReport(len(current), 0, 0, meta["n_rows"], meta["n_rows"], True, time.perf_counter() - start)
+
+
+def _measurement_info(measurement: tuple, channel_index: dict[tuple, int]) -> list:
+    """
+    Returns [participant_id, channel index] of a measurement (participant_id, target, axis).
+    """
+    participant_id, target, axis = measurement
+    return [participant_id, channel_index[(target, axis)]]
+
+def _column_labels(meta: dict) -> np.ndarray:
+    time_points = range(meta["min_time_point"], meta["min_time_point"] + meta["n_time_points"])
+    return np.array([(target, axis, time_point) for target, axis in meta["channels"] for time_point in time_points],
+                    dtype=COLUMN_LABEL_DTYPE)
+
+def _open_values(entry_dir: str, meta: dict, dtype: np.dtype, mode: str) -> np.memmap:
+    return np.memmap(os.path.join(entry_dir, "values.bin"), dtype=dtype, mode=mode,
+                     shape=(meta["n_rows"], len(meta["channels"]) * meta["n_time_points"]))
+
+def _append_rows(entry_dir: str, meta: dict, n_rows: int, dtype: np.dtype):
+    """
+    Appends n_rows rows of NaN to the matrix of an entry with meta["n_rows"] rows
+    (bytes beyond them, left by an interrupted refresh, are cut off first).
+    """
+    row = np.full(len(meta["channels"]) * meta["n_time_points"], np.nan, dtype=dtype)
+    with open(os.path.join(entry_dir, "values.bin"), "r+b") as file:
+        file.truncate(meta["n_rows"] * row.nbytes)
+        file.seek(0, os.SEEK_END)
+        file.write(np.tile(row, n_rows).tobytes())
+
+def _clear_blocks(values: np.ndarray, row_labels: np.ndarray, measurements: list[list], meta: dict):
+    """
+    Sets the blocks (all rows of the participant, columns of the channel) of measurements [participant_id, channel] to NaN.
+    """
+    n_time_points = meta["n_time_points"]
+    for channel, participant_ids in _group_by_channel(measurements).items():
+        rows = np.flatnonzero(np.isin(row_labels["participant_id"], participant_ids))
+        values[rows, channel * n_time_points:(channel + 1) * n_time_points] = np.nan
+
+def _fill_blocks(values: np.ndarray, row_labels: np.ndarray, block: FeatureMatrix, measurements: list[list], meta: dict):
+    """
+    Writes the blocks of measurements [participant_id, channel] from a feature matrix of these measurements
+    (its rows are in row_labels already, its time points within the stored range).
+    """
+    row_index = {key: i for i, key in enumerate(row_labels.tolist())}
+    rows = np.array([row_index[key] for key in block.row_labels.tolist()], dtype=np.int64)
+    block_channels = list(dict.fromkeys(zip(block.column_labels["target"].tolist(),
+                                            block.column_labels["axis"].tolist())))
+    block_time_points = block.values.shape[1] // len(block_channels)
+    first = meta["n_time_points"] * np.arange(len(meta["channels"])) + (int(block.column_labels["time_point"].min())
+                                                                      - meta["min_time_point"])
+    for channel, participant_ids in _group_by_channel(measurements).items():
+        block_channel = block_channels.index(tuple(meta["channels"][channel]))
+        selected = np.isin(block.row_labels["participant_id"], participant_ids)
+        values[rows[selected], first[channel]:first[channel] + block_time_points] = block.values[
+            selected, block_channel * block_time_points:(block_channel + 1) * block_time_points]
+
+def _group_by_channel(measurements: list[list]) -> dict[int, list]:
+    participant_ids = {}
+    for participant_id, channel in measurements:
+        participant_ids.setdefault(channel, []).append(participant_id)
+    return participant_ids
+
+def _read_meta(entry_dir: str) -> dict | None:
+    try:
+        with open(os.path.join(entry_dir, "meta.json")) as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_json(path: str, data):
+    """
+    Writes a JSON file atomically.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file)
+    os.replace(tmp_path, path)
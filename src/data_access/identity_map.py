@@ -0,0 +1,132 @@
+import threading
+from typing import Iterable
+from db.connection import ConnectionManager, get_connection_manager, get_read_connection
+from db.sharding import get_catalog_read_connection, shard_of_id, shard_scopes
+from models.experiment import Experiment
+from models.participant import Participant
+from models.measurement import Measurement
+
+# model and columns of the tables held in the identity map
+_TABLES = {
+    "experiment": (Experiment, ("id", "name", "data_state", "data_folder", "upload_complete")),
+    "participant": (Participant, ("id", "participant_id", "experiment_id", "age", "height_cm", "weight_kg", "instrument",
+                                  "PRMD_shoulder_neck_right", "PRMD_shoulder_neck_left", "PRMD_upper_arm_right",
+                                  "PRMD_upper_arm_left", "PRMD_ever")),
+    "measurement": (Measurement, ("id", "participant_id", "timepoint", "device", "target", "axis", "unit")),
+}
+
+# maximum number of IDs per IN (...) query
+_MAX_IDS_PER_QUERY = 10_000
+
+class IdentityMap:
+    def __init__(self):
+        """
+        Initializes the IdentityMap, an in-process cache of the small metadata tables (experiment, participant,
+        measurement) that holds exactly one model object (models/) per database ID.
+
+        A table is loaded completely with one query on its first lookup, IDs that are not in the map (e.g. rows
+        inserted by another process since) are looked up in one batched query and added. The repositories' setters
+        remove the rows they insert or update (invalidate), so the next lookup reads them again.
+        The returned models are shared by all callers and must not be modified.
+        """
+        self._lock = threading.RLock()
+        self._rows = {table: {} for table in _TABLES}       # table -> {id: model}
+        self._loaded = set()                                # tables loaded completely
+
+    def get(self, table: str, ids: Iterable[int]) -> dict:
+        """
+        Returns the models of the given IDs.
+
+        Args:
+            table (str): 'experiment', 'participant' or 'measurement'.
+            ids (Iterable[int]): The database IDs.
+
+        Returns:
+            dict: The model of every ID found ({id: model}, in the order of ids, IDs not in the table are omitted).
+        """
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            rows = self._rows[table]
+            if table not in self._loaded:
+                self._load(table)
+            missing = [row_id for row_id in ids if row_id not in rows]
+            if missing:
+                self._load(table, missing)
+            return {row_id: rows[row_id] for row_id in ids if row_id in rows}
+
+    def invalidate(self, table: str, ids: Iterable[int] | None = None, **where):
+        """
+        Removes rows from the map (they are read again on their next lookup).
+
+        Args:
+            table (str): 'experiment', 'participant' or 'measurement'.
+            ids (Iterable[int] | None): The database IDs of the rows, None for all rows (matching where).
+            **where: Attribute values of the rows to remove, e.g. experiment_id=1, participant_id='P001'.
+        """
+        with self._lock:
+            rows = self._rows[table]
+            if ids is None and not where:
+                rows.clear()
+                self._loaded.discard(table)
+                return
+            candidates = list(rows) if ids is None else [row_id for row_id in ids if row_id in rows]
+            for row_id in candidates:
+                if all(getattr(rows[row_id], name) == value for name, value in where.items()):
+                    del rows[row_id]
+
+    def clear(self):
+        """
+        Removes all rows of all tables (e.g. after the database was changed without the repositories).
+        """
+        for table in _TABLES:
+            self.invalidate(table)
+
+    def _load(self, table: str, ids: list[int] | None = None):
+        """
+        Reads all rows of a table (ids None) or the rows of the given IDs into the map
+        (the participant and measurement rows shard by shard in a sharded database).
+        """
+        model, columns = _TABLES[table]
+        query = f"SELECT {', '.join(columns)} FROM {table}"
+        rows = self._rows[table]
+        if table == "experiment":
+            scopes = [None]
+        else:
+            scopes = shard_scopes(None if ids is None else {shard_of_id(row_id) for row_id in ids})
+        for exp_id in scopes:
+            cursor = (get_catalog_read_connection() if table == "experiment" else get_read_connection()).cursor()
+            if ids is None:
+                batches = [cursor.execute(query).fetchall()]
+            else:
+                shard_ids = ids if exp_id is None else [row_id for row_id in ids if shard_of_id(row_id) == exp_id]
+                batches = (cursor.execute(f"{query} WHERE id IN ({', '.join('?' * len(batch))})", batch).fetchall()
+                           for batch in (shard_ids[i:i + _MAX_IDS_PER_QUERY]
+                                         for i in range(0, len(shard_ids), _MAX_IDS_PER_QUERY)))
+            for batch in batches:
+                for row in batch:
+                    rows[row[0]] = model(**dict(zip(columns, row)))
+        if ids is None:
+            self._loaded.add(table)
+
+
+# the identity map of the current connection manager (a new database gets a new map)
+_identity_map: tuple[ConnectionManager, IdentityMap] | None = None
+_identity_map_lock = threading.Lock()
+
+def get_identity_map() -> IdentityMap:
+    """
+    Returns the identity map of the database of db.connection (one per connection manager).
+    """
+    global _identity_map
+    manager = get_connection_manager()
+    with _identity_map_lock:
+        if _identity_map is None or _identity_map[0] is not manager:
+            _identity_map = (manager, IdentityMap())
+        return _identity_map[1]
+
+def invalidate_identity_map(table: str, ids: Iterable[int] | None = None, **where):
+    """
+    Removes rows from the identity map (called by the repositories' setters, see IdentityMap.invalidate).
+    """
+    if _identity_map is not None:
+        _identity_map[1].invalidate(table, ids, **where)
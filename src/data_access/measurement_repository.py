@@ -1,13 +1,40 @@
-import pandas as pd
-from db.connection import get_connection
+from __future__ import annotations
+from sqlite3 import Connection
+from db.connection import get_connection, get_read_connection
+from db.instrumentation import instrument_repository
+from db.sharding import query_shards, route_to_shards
+from db.schema import has_aggregate_tables
+from data_access.results import RESULT_FRAME, check_result_type, empty_result, rows_to_result, pd
+from data_access.identity_map import get_identity_map, invalidate_identity_map
 from models.measurement import Measurement
 
+@instrument_repository
+@route_to_shards
 class MeasurementRepository:
-    def __init__(self):
+    def __init__(self, result_type: str = RESULT_FRAME):
         """
         Initializes the MeasurementRepository with a database connection.
+
+        Args:
+            result_type (str): The result type of the getters that return tables: 'frame' (pandas DataFrame),
+                               'records' (NumPy record array) or 'tuples' (list of row tuples), see data_access/results.py.
+        """
+        self.result_type = check_result_type(result_type)
+
+    @property
+    def conn(self) -> Connection:
+        """
+        The writer connection (see db.connection.get_connection), used by the setters; the one of the experiment's
+        shard in a sharded database (see db/sharding.py).
+        """
+        return get_connection()
+
+    @property
+    def read_conn(self) -> Connection:
+        """
+        The read-only connection of the calling thread (see db.connection.get_read_connection), used by the getters.
         """
-        self.conn = get_connection()
+        return get_read_connection()
 
 # region Setter
     def insert_measurement(self, measurement: Measurement):
@@ -29,7 +56,33 @@ class MeasurementRepository:
         """, (measurement.participant_id , measurement.timepoint, measurement.device, measurement.target,
               measurement.axis, measurement.unit))
         self.conn.commit()
+        invalidate_identity_map("measurement", [cursor.lastrowid])
         return cursor.lastrowid
+
+    def insert_many_measurements(self, measurements: list[Measurement], commit: bool = True) -> list[int]:
+        """
+        Inserts multiple measurement records in a single transaction.
+
+        Args:
+            measurements (list[Measurement]): The measurement objects to insert.
+            commit (bool): Whether the transaction is committed (set to False to insert as part of a larger transaction).
+
+        Returns:
+            list[int]: The IDs of the newly inserted measurement records (in the order of measurements).
+        """
+        cursor = self.conn.cursor()
+        ids = []
+        for measurement in measurements:
+            cursor.execute("""
+                INSERT INTO measurement (participant_id, timepoint, device, target, axis, unit)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (measurement.participant_id , measurement.timepoint, measurement.device, measurement.target,
+                  measurement.axis, measurement.unit))
+            ids.append(cursor.lastrowid)
+        if commit:
+            self.conn.commit()
+        invalidate_identity_map("measurement", ids)
+        return ids
 # endregion Setter
 
 # region Getter
@@ -37,7 +90,8 @@ class MeasurementRepository:
     def get_measurements_by_participant_id(self, participant_id: str) -> pd.DataFrame:
         """
         Retrieves all measurement data for a participant using their participant ID
-        (e.g., 'P001'), including associated participant metadata such as pain-related fields.
+        (e.g., 'P001'), including associated participant metadata such as pain-related fields
+        (of all experiments, i.e. of all shards in a sharded database).
 
         Args:
             participant_id (str): The external participant identifier.
@@ -45,12 +99,11 @@ class MeasurementRepository:
         Returns:
             pd.DataFrame: A DataFrame containing measurements joined with participant information.
         """
-        cursor = self.conn.cursor()
         query = """
             SELECT 
                 measurement.*,
                 participant.id,
-                participant.participant_id
+                participant.participant_id,
                 participant.instrument,
                 participant.PRMD_shoulder_neck_right,
                 participant.PRMD_shoulder_neck_left,
@@ -58,15 +111,13 @@ class MeasurementRepository:
                 participant.PRMD_upper_arm_left,
                 participant.PRMD_ever
             FROM measurement
-            JOIN participant ON measurement.participant_id = participant.participant_id
-            WHERE measurement.participant_id = ?
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE participant.participant_id = ?
         """
-        cursor.execute(query, (participant_id,))
-        rows = cursor.fetchall()
+        rows, columns = query_shards(query, (participant_id,))        # the participant in every experiment (shard)
         if not rows:
-            return pd.DataFrame()
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns) 
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
 
     def get_measurements_by_device(self, device: str, exp_id: int) -> pd.DataFrame:
         """
@@ -80,7 +131,7 @@ class MeasurementRepository:
         Returns:
             pd.DataFrame: A DataFrame containing joined data from measurement, participant, and experiment tables.
         """
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         query = """
             SELECT 
                 experiment.id AS experiment_id,
@@ -94,16 +145,16 @@ class MeasurementRepository:
                 participant.PRMD_ever,
                 measurement.*
             FROM measurement
-            JOIN participant ON measurement.participant_id = participant.participant_id
+            JOIN participant ON measurement.participant_id = participant.id
             JOIN experiment ON participant.experiment_id = experiment.id
             WHERE measurement.device = ? AND experiment.id = ?
         """
         cursor.execute(query, (device, exp_id))
         rows = cursor.fetchall()
-        if not rows:
-            return pd.DataFrame()
         columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)      
+        if not rows:
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
 
     def get_measurements_by_timepoint(self, timepoint: str, exp_id: int) -> pd.DataFrame:
         """
@@ -117,7 +168,7 @@ class MeasurementRepository:
         Returns:
             pd.DataFrame: A DataFrame containing joined data from measurement, participant, and experiment tables.
         """
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         query = """
             SELECT 
                 experiment.id AS experiment_id,
@@ -137,10 +188,10 @@ class MeasurementRepository:
         """
         cursor.execute(query, (timepoint, exp_id))
         rows = cursor.fetchall()
-        if not rows:
-            return pd.DataFrame()
         columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)   
+        if not rows:
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
     
     def get_measurements_by_target(self, target: str, exp_id: int) -> pd.DataFrame:
         """
@@ -154,7 +205,7 @@ class MeasurementRepository:
         Returns:
             pd.DataFrame: A DataFrame containing joined data from measurement, participant, and experiment tables.
         """
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         query = """
             SELECT 
                 experiment.id AS experiment_id,
@@ -174,10 +225,10 @@ class MeasurementRepository:
         """
         cursor.execute(query, (target, exp_id))
         rows = cursor.fetchall()
-        if not rows:
-            return pd.DataFrame()
         columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns) 
+        if not rows:
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
 
     def get_measurements_by_target_and_axis(self, target: str, axis: str, exp_id: int) -> pd.DataFrame:
         """
@@ -192,7 +243,7 @@ class MeasurementRepository:
         Returns:
             pd.DataFrame: A DataFrame containing joined data from measurement, participant, and experiment tables.
         """
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         query = """
             SELECT 
                 experiment.id AS experiment_id,
@@ -208,14 +259,14 @@ class MeasurementRepository:
             FROM measurement
             JOIN participant ON measurement.participant_id = participant.id
             JOIN experiment ON participant.experiment_id = experiment.id
-            WHERE measurement.target = ? AND experiment.id = ?
+            WHERE measurement.target = ? AND measurement.axis = ? AND experiment.id = ?
         """
         cursor.execute(query, (target, axis, exp_id))
         rows = cursor.fetchall()
-        if not rows:
-            return pd.DataFrame()
         columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns) 
+        if not rows:
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
     
     def get_measurement_by_id(self, measurement_id: int) -> Measurement | None:
         """
@@ -227,20 +278,20 @@ class MeasurementRepository:
         Returns:
             Measurement | None: The Measurement object if found, otherwise None.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM measurement WHERE id = ?", (measurement_id,))
-        row = cursor.fetchone()
-        if row:
-            return Measurement(
-                id=row["id"],
-                articipant_id=row["participant_id"],
-                timepoint=row["timepoint"],
-                device=row["device"],
-                target=row["target"],
-                axis=row["axis"],
-                unit=row["unit"]
-            )
-        return None
+        return self.get_measurements_by_ids([measurement_id]).get(measurement_id)
+
+    def get_measurements_by_ids(self, measurement_ids: list[int]) -> dict[int, Measurement]:
+        """
+        Retrieves measurement records by their IDs, from the identity map (see data_access/identity_map.py):
+        the measurement table is read once, further lookups do not query the database.
+
+        Args:
+            measurement_ids (list[int]): The IDs of the measurements to retrieve.
+
+        Returns:
+            dict[int, Measurement]: The Measurement object of every ID found (shared, do not modify).
+        """
+        return get_identity_map().get("measurement", measurement_ids)
 
     def get_measurement_target_by_id(self, measurement_id: int) -> str | None:
         """
@@ -252,11 +303,133 @@ class MeasurementRepository:
         Returns:
             int | None: The name of the target, if found, otherwise None.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT target FROM measurement WHERE id = ?", (measurement_id,))
-        row = cursor.fetchone()
-        if row:
-            return row[0]
+        return self.get_measurement_targets_by_ids([measurement_id]).get(measurement_id)
+
+    def get_measurement_targets_by_ids(self, measurement_ids: list[int]) -> dict[int, str]:
+        """
+        Retrieves the measurement targets of measurement IDs (from the identity map, see get_measurements_by_ids).
+
+        Args:
+            measurement_ids (list[int]): The IDs of the measurements.
+
+        Returns:
+            dict[int, str]: The name of the target of every ID found.
+        """
+        return {measurement_id: measurement.target
+                for measurement_id, measurement in self.get_measurements_by_ids(measurement_ids).items()}
+
+    def get_measurement_timepoints(self, exp_id: int, device: str) -> list[str] | None:
+        """
+        Retrieves the measurement timepoints (e.g. 'pre', 'post') of an experiment and measurement device,
+        in the order they were inserted.
+
+        Args:
+            exp_id (int): The id of the experiment.
+            device (str): The name of the measurement device (e.g., 'emg').
+
+        Returns:
+            list[str] | None: A list of timepoints if any exist, otherwise None.
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute("""
+            SELECT measurement.timepoint
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE participant.experiment_id = ? AND measurement.device = ?
+            GROUP BY measurement.timepoint
+            ORDER BY MIN(measurement.id)
+        """, (exp_id, device))
+        rows = cursor.fetchall()
+        if rows:
+            return [row[0] for row in rows]
         return None
 
+    def get_measurement_devices(self, exp_id: int) -> list[str] | None:
+        """
+        Retrieves the measurement devices (e.g. 'mocap', 'emg') of an experiment, in the order they were inserted.
+
+        Args:
+            exp_id (int): The id of the experiment.
+
+        Returns:
+            list[str] | None: A list of devices if any exist, otherwise None.
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute("""
+            SELECT measurement.device
+            FROM measurement
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE participant.experiment_id = ?
+            GROUP BY measurement.device
+            ORDER BY MIN(measurement.id)
+        """, (exp_id,))
+        rows = cursor.fetchall()
+        if rows:
+            return [row[0] for row in rows]
+        return None
+
+    def get_mean_waveforms(self, exp_id: int, device: str, timepoint: str, target: str | None = None,
+                           axis: str | None = None) -> pd.DataFrame | None:
+        """
+        Retrieves the mean and standard deviation waveform over the bow strokes of every measurement
+        (participant/target/axis) of an experiment, measurement device and timepoint from the waveform_summary table,
+        without reading the datapoints.
+
+        Args:
+            exp_id (int): The id of the experiment.
+            device (str): The name of the measurement device (e.g., 'mocap').
+            timepoint (str): The name of the measurement timepoint (e.g., 'pre').
+            target (str | None): Optional name of the measurement target (e.g., 'left elbow joint angle').
+            axis (str | None): Optional name of the measurement axis (e.g., 'X').
+
+        Returns:
+            pd.DataFrame | None: A DataFrame with the columns measurement_id, participant_id, target, axis, unit,
+            time_point, n_strokes, mean and sd (one row per time point). Returns None if no data found
+            (or the database has no aggregate tables, see db/aggregates.py).
+        """
+        if not has_aggregate_tables(self.read_conn):
+            return None
+        clause, params = "participant.experiment_id = ? AND measurement.device = ? AND measurement.timepoint = ?", [exp_id, device, timepoint]
+        for column, value in (("target", target), ("axis", axis)):
+            if value is not None:
+                clause += f" AND measurement.{column} = ?"
+                params.append(value)
+        cursor = self.read_conn.cursor()
+        cursor.execute(f"""
+            SELECT 
+                measurement.id AS measurement_id,
+                participant.participant_id,
+                measurement.target,
+                measurement.axis,
+                measurement.unit,
+                waveform_summary.time_point,
+                waveform_summary.n_strokes,
+                waveform_summary.mean,
+                waveform_summary.sd
+            FROM waveform_summary
+            JOIN measurement ON waveform_summary.measurement_id = measurement.id
+            JOIN participant ON measurement.participant_id = participant.id
+            WHERE {clause}
+            ORDER BY participant.participant_id, measurement.target, measurement.axis, waveform_summary.time_point
+        """, tuple(params))
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+        # the aggregates of stale measurements (see DatapointRepository.refresh_aggregates) are computed on the fly
+        from data_access.datapoint_repository import DatapointRepository, _label_sort_key, _waveform_summaries    # NumPy
+        stale, facts = DatapointRepository()._stale_facts(clause, tuple(params))
+        if stale:
+            cursor.execute(f"""
+                SELECT measurement.id, participant.participant_id, measurement.target, measurement.axis, measurement.unit
+                FROM measurement
+                JOIN participant ON measurement.participant_id = participant.id
+                WHERE measurement.id IN ({', '.join('?' * len(stale))})
+            """, tuple(stale))
+            labels = {row[0]: row[1:] for row in cursor.fetchall()}
+            rows = [row for row in rows if row[0] not in stale]
+            rows += [(m_id, *labels[m_id], *summary) for m_id, *summary in _waveform_summaries(facts)]
+            rows.sort(key=lambda row: _label_sort_key((row[1], row[2], row[3], row[5])))
+        if not rows:
+            return None
+        return rows_to_result(rows, columns, self.result_type)
+
 # endregion Getter
\ No newline at end of file
@@ -1,13 +1,40 @@
-import pandas as pd
-from db.connection import get_connection
+from __future__ import annotations
+from sqlite3 import Connection
+from db.connection import get_connection, get_read_connection
+from db.instrumentation import instrument_repository
+from db.sharding import get_catalog_read_connection, query_shards, route_to_shards
+from data_access.results import RESULT_FRAME, check_result_type, empty_result, rows_to_result, pd
+from data_access.identity_map import get_identity_map, invalidate_identity_map
+from data_access.query_cache import invalidate_experiment
 from models.participant import Participant
 
+@instrument_repository
+@route_to_shards
 class ParticipantRepository:
-    def __init__(self):
+    def __init__(self, result_type: str = RESULT_FRAME):
         """
         Initializes the ParticipantRepository with a database connection.
+
+        Args:
+            result_type (str): The result type of the getters that return tables: 'frame' (pandas DataFrame),
+                               'records' (NumPy record array) or 'tuples' (list of row tuples), see data_access/results.py.
+        """
+        self.result_type = check_result_type(result_type)
+
+    @property
+    def conn(self) -> Connection:
+        """
+        The writer connection (see db.connection.get_connection), used by the setters; the one of the experiment's
+        shard in a sharded database (see db/sharding.py).
+        """
+        return get_connection()
+
+    @property
+    def read_conn(self) -> Connection:
+        """
+        The read-only connection of the calling thread (see db.connection.get_read_connection), used by the getters.
         """
-        self.conn = get_connection()
+        return get_read_connection()
 
 # region Setter
     def insert_participant(self, participant: Participant):
@@ -25,10 +52,39 @@ class ParticipantRepository:
         cursor.execute("""
             INSERT INTO participant (experiment_id, participant_id)
             VALUES (?, ?)
-        """, (participant.ext_experiment_id, participant.participant_id))
+        """, (participant.experiment_id, participant.participant_id))
         self.conn.commit()
+        invalidate_identity_map("participant", [cursor.lastrowid])
         return cursor.lastrowid
 
+    def insert_many_participants(self, participants: list[Participant], commit: bool = True) -> list[int]:
+        """
+        Inserts multiple participants (including instrument and pain data) in a single transaction.
+
+        Args:
+            participants (list[Participant]): The Participant objects to insert.
+            commit (bool): Whether the transaction is committed (set to False to insert as part of a larger transaction).
+
+        Returns:
+            list[int]: The IDs of the newly inserted participant records (in the order of participants).
+        """
+        cursor = self.conn.cursor()
+        ids = []
+        for participant in participants:
+            cursor.execute("""
+                INSERT INTO participant (experiment_id, participant_id, age, height_cm, weight_kg, instrument, 
+                PRMD_shoulder_neck_right, PRMD_shoulder_neck_left, PRMD_upper_arm_right, PRMD_upper_arm_left, PRMD_ever)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (participant.experiment_id, participant.participant_id, participant.age, participant.height_cm,
+                  participant.weight_kg, participant.instrument, participant.PRMD_shoulder_neck_right,
+                  participant.PRMD_shoulder_neck_left, participant.PRMD_upper_arm_right, participant.PRMD_upper_arm_left,
+                  participant.PRMD_ever))
+            ids.append(cursor.lastrowid)
+        if commit:
+            self.conn.commit()
+        invalidate_identity_map("participant", ids)
+        return ids
+
     def update_pain_data(self, participant: Participant, exp_id):
         """
         Updates pain-related fields for a specific participant in a given experiment.
@@ -57,7 +113,9 @@ class ParticipantRepository:
         """, (participant.instrument, participant.PRMD_shoulder_neck_right, participant.PRMD_shoulder_neck_left,
               participant.PRMD_upper_arm_right, participant.PRMD_upper_arm_left, participant.PRMD_ever,
               exp_id, participant.participant_id))
-        self.conn.commit()        
+        self.conn.commit()
+        invalidate_identity_map("participant", experiment_id=exp_id, participant_id=participant.participant_id)
+        invalidate_experiment(exp_id)
 # endregion Setter
 
 #region Getter
@@ -66,7 +124,8 @@ class ParticipantRepository:
     def get_participants_by_exp_name(self, exp_name: str) -> pd.DataFrame:
         """
         Retrieves all participants associated with a given experiment name,
-        including experiment metadata such as name and data state.
+        including experiment metadata such as name and data state
+        (from the shards of the experiments with that name in a sharded database).
 
         Args:
             exp_name (str): The name of the experiment.
@@ -74,7 +133,8 @@ class ParticipantRepository:
         Returns:
             pd.DataFrame: A DataFrame containing participant data joined with experiment info.
         """
-        cursor = self.conn.cursor()
+        exp_ids = [row[0] for row in get_catalog_read_connection().execute(
+            "SELECT id FROM experiment WHERE name = ?", (exp_name.lower(),))]
         query = """
             SELECT 
                 participant.*, 
@@ -84,16 +144,31 @@ class ParticipantRepository:
             JOIN experiment ON participant.experiment_id = experiment.id
             WHERE experiment.name = ?
         """
-        cursor.execute(query, (exp_name.lower(),))
+        rows, columns = query_shards(query, (exp_name.lower(),), exp_ids)
+        if not rows:
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
+        
+    
+    def get_participants_by_exp_id(self, exp_id: int) -> pd.DataFrame:
+        """
+        Retrieves all participants (including instrument and pain data) of an experiment.
+
+        Args:
+            exp_id (int): The ID of the experiment.
+
+        Returns:
+            pd.DataFrame: A DataFrame containing the participant rows, empty if the experiment has no participants.
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute("SELECT * FROM participant WHERE experiment_id = ? ORDER BY participant_id", (exp_id,))
         rows = cursor.fetchall()
 
+        columns = [desc[0] for desc in cursor.description]
         if not rows:
-            return pd.DataFrame()
+            return empty_result(columns, self.result_type)
+        return rows_to_result(rows, columns, self.result_type)
 
-        columns = [desc[0] for desc in cursor.description]
-        return pd.DataFrame(rows, columns=columns)     
-        
-    
     def get_participant_by_id(self, participant_id: int) -> Participant | None:
         """
         Retrieves a participant by their internal database ID.
@@ -104,19 +179,20 @@ class ParticipantRepository:
         Returns:
             Participant | None: A Participant object if found, otherwise None.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM participant WHERE id = ?", (participant_id,))
-        row = cursor.fetchone()
-        if row:
-            # currently does not retrieve age, height, etc., as this information is currently not stored in the DB
-            return Participant(id=row["id"], participant_id=row["participant_id"], 
-                               experiment_id=row["experiment_id"], instrument= row["instrument"], 
-                               PRMD_shoulder_neck_right=row["PRMD_shoulder_neck_right"],
-                               PRMD_shoulder_neck_left=row["PRMD_shoulder_neck_left"],
-                               PRMD_upper_arm_right=row["PRMD_upper_arm_right"],
-                               PRMD_upper_arm_left=row["PRMD_upper_arm_left"],
-                               PRMD_ever=row["PRMD_ever"],)
-        return None
+        return self.get_participants_by_ids([participant_id]).get(participant_id)
+
+    def get_participants_by_ids(self, participant_ids: list[int]) -> dict[int, Participant]:
+        """
+        Retrieves participants by their internal database IDs, from the identity map (see data_access/identity_map.py):
+        the participant table is read once, further lookups do not query the database.
+
+        Args:
+            participant_ids (list[int]): The internal database IDs of the participants.
+
+        Returns:
+            dict[int, Participant]: The Participant object of every ID found (shared, do not modify).
+        """
+        return get_identity_map().get("participant", participant_ids)
 
     def get_participant_db_id(self, participant_id: int, exp_id: int) -> Participant | None:
         """
@@ -131,7 +207,7 @@ class ParticipantRepository:
             int | None: The internal database ID of the participant if found, otherwise None.
         """
         
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         cursor.execute("SELECT id FROM participant WHERE participant_id = ? AND experiment_id = ?", 
                        (participant_id, exp_id))
         row = cursor.fetchone()
@@ -150,7 +226,7 @@ class ParticipantRepository:
             list[str] | None: A list of participant IDs if any exist, otherwise None.
         """
         
-        cursor = self.conn.cursor()
+        cursor = self.read_conn.cursor()
         cursor.execute("SELECT DISTINCT participant_id FROM participant WHERE experiment_id = ?", (exp_id,))
         rows = cursor.fetchall()
         if rows:
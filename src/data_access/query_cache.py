@@ -0,0 +1,180 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from sqlite3 import Connection
+from db.connection import get_connection, get_connection_manager, get_read_connection
+from data_access.results import pd
+
+# the parent of the cache directories of an in-memory database (otherwise the directory of the database file,
+# see default_cache_dir)
+DEFAULT_CACHE_PARENT = 'data'
+
+# cache directories (absolute paths) registered by this process, the repositories invalidate the entries in all of them
+# and in the default cache directory of the database
+_cache_dirs = set()
+
+class QueryCache:
+    def __init__(self, cache_dir: str | None = None):
+        """
+        Initializes the QueryCache, a persistent on-disk cache of repository query results.
+
+        Every result is stored in its own uncompressed .npz file (one array per column, string columns as
+        category codes + categories) under <cache_dir>/exp_<exp_id>/, keyed by the repository method and its arguments.
+        An entry is only served as long as the experiment's data_folder/upload_complete state is unchanged;
+        inserting datapoints or changing participants of the experiment through the repositories removes its entries.
+
+        Args:
+            cache_dir (str | None): The directory the cache entries are stored in, default_cache_dir() if None.
+        """
+        self.conn = get_connection()
+        self.cache_dir = default_cache_dir() if cache_dir is None else os.path.abspath(cache_dir)
+        register_cache_dir(self.cache_dir)
+
+    @property
+    def read_conn(self) -> Connection:
+        """
+        The read-only connection of the calling thread (see db.connection.get_read_connection).
+        """
+        return get_read_connection()
+
+    def call(self, method, exp_id: int, *args) -> pd.DataFrame | None:
+        """
+        Returns the result of a repository getter (e.g. DatapointRepository.get_datapoints_by_exp_id_device_and_timepoint)
+        from the cache, or runs the query and stores its result if there is no valid entry.
+
+        Args:
+            method: The bound repository method, taking the experiment ID as first argument and returning a DataFrame or None
+                    (i.e. of a repository with the default result_type 'frame').
+            exp_id (int): The ID of the experiment.
+            *args: The remaining arguments of the method (e.g. device, timepoint).
+
+        Returns:
+            pd.DataFrame | None: The result of the method.
+        """
+        path = self._entry_path(method, exp_id, args)
+        state = self._experiment_state(exp_id)
+        cached = _read_entry(path, state)
+        if cached is not _MISS:
+            return cached
+        result = method(exp_id, *args)
+        _write_entry(path, state, result)
+        return result
+
+    def invalidate_experiment(self, exp_id: int):
+        """
+        Removes all cache entries of an experiment.
+        """
+        shutil.rmtree(_experiment_dir(exp_id, self.cache_dir), ignore_errors=True)
+
+    def clear(self):
+        """
+        Removes all cache entries.
+        """
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _entry_path(self, method, exp_id: int, args: tuple) -> str:
+        """
+        Returns the file path of the cache entry of a method call.
+        """
+        name = f"{type(method.__self__).__name__}.{method.__name__}"
+        digest = hashlib.sha1(repr((name, exp_id, args)).encode()).hexdigest()[:16]
+        return os.path.join(_experiment_dir(exp_id, self.cache_dir), f"{method.__name__}_{digest}.npz")
+
+    def _experiment_state(self, exp_id: int) -> str:
+        """
+        Returns the data_folder/upload_complete state of an experiment, an entry is only valid for the state it was created with.
+        """
+        cursor = self.read_conn.cursor()
+        cursor.execute("SELECT data_folder, upload_complete FROM experiment WHERE id = ?", (exp_id,))
+        return json.dumps(cursor.fetchone())
+
+
+def default_cache_dir(name: str = "cache") -> str:
+    """
+    Returns the default directory of a cache (e.g. 'cache' of the QueryCache, 'models' of analysis.model_store.ModelStore):
+    the directory name in the directory of the database of db.connection, as an absolute path, so every process using
+    the database uses (and invalidates) the same entries regardless of its working directory
+    (in DEFAULT_CACHE_PARENT for an in-memory database).
+
+    Args:
+        name (str): The name of the directory.
+    """
+    manager = get_connection_manager()
+    if manager.in_memory:
+        return os.path.abspath(os.path.join(DEFAULT_CACHE_PARENT, name))
+    return os.path.join(os.path.dirname(os.path.abspath(manager.db_path)), name)
+
+def register_cache_dir(cache_dir: str):
+    """
+    Registers a directory with per-experiment entries (in exp_<exp_id>/ subdirectories) that invalidate_experiment
+    clears, e.g. the aliases of analysis.model_store.ModelStore.
+
+    Args:
+        cache_dir (str): The directory (relative to the current working directory).
+    """
+    _cache_dirs.add(os.path.abspath(cache_dir))
+
+
+def invalidate_experiment(exp_id: int):
+    """
+    Removes all cache entries of an experiment in every cache directory in use
+    (called by the repositories when the data of an experiment changes).
+
+    Args:
+        exp_id (int): The ID of the experiment.
+    """
+    for cache_dir in {default_cache_dir(), *_cache_dirs}:
+        shutil.rmtree(_experiment_dir(exp_id, cache_dir), ignore_errors=True)
+
+
+# sentinel for a missing/outdated entry (None is a valid, cached result)
+_MISS = object()
+
+def _experiment_dir(exp_id: int, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"exp_{exp_id}")
+
+def _read_entry(path: str, state: str):
+    """
+    Reads a cache entry, returns _MISS if the entry does not exist or was created for another experiment state.
+    """
+    try:
+        with np.load(path, allow_pickle=True) as entry:
+            if str(entry["__state__"]) != state:
+                return _MISS
+            if "__columns__" not in entry.files:
+                return None
+            data = {}
+            for i, column in enumerate(entry["__columns__"]):
+                if f"{i}_codes" in entry.files:
+                    categories = np.append(entry[f"{i}_categories"], None)
+                    data[column] = categories[entry[f"{i}_codes"]]          # code -1 (missing) selects the appended None
+                else:
+                    data[column] = entry[str(i)]
+            return pd.DataFrame(data)
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        return _MISS
+
+def _write_entry(path: str, state: str, result: pd.DataFrame | None):
+    """
+    Writes a cache entry (atomically, so concurrent readers never see a partial file).
+    """
+    arrays = {"__state__": np.array(state)}
+    if result is not None:
+        arrays["__columns__"] = np.array(result.columns, dtype=object)
+        for i, column in enumerate(result.columns):
+            values = result[column]
+            if values.dtype == object:
+                codes, categories = pd.factorize(values)
+                arrays[f"{i}_codes"] = codes.astype(np.int32)
+                arrays[f"{i}_categories"] = np.asarray(categories, dtype=object)
+            else:
+                arrays[str(i)] = values.to_numpy()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_path, path)
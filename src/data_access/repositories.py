@@ -0,0 +1,44 @@
+from __future__ import annotations
+from functools import cached_property
+from typing import TYPE_CHECKING
+from data_access.results import RESULT_FRAME, check_result_type
+
+if TYPE_CHECKING:
+    from data_access.experiment_repository import ExperimentRepository
+    from data_access.participant_repository import ParticipantRepository
+    from data_access.measurement_repository import MeasurementRepository
+    from data_access.datapoint_repository import DatapointRepository
+
+class Repositories:
+    def __init__(self, result_type: str = RESULT_FRAME):
+        """
+        Initializes the Repositories, which create the repositories lazily: a repository (and its module) is only
+        created/imported on the first access of its attribute, e.g.
+            repos = Repositories(result_type='tuples')
+            exp_id = repos.experiment.get_experiment_id_by_name_and_data_state('mpa', 'clean')
+        only imports and creates the ExperimentRepository.
+
+        Args:
+            result_type (str): The result type of the repositories ('frame', 'records' or 'tuples', see data_access/results.py).
+        """
+        self.result_type = check_result_type(result_type)
+
+    @cached_property
+    def experiment(self) -> ExperimentRepository:
+        from data_access.experiment_repository import ExperimentRepository
+        return ExperimentRepository(self.result_type)
+
+    @cached_property
+    def participant(self) -> ParticipantRepository:
+        from data_access.participant_repository import ParticipantRepository
+        return ParticipantRepository(self.result_type)
+
+    @cached_property
+    def measurement(self) -> MeasurementRepository:
+        from data_access.measurement_repository import MeasurementRepository
+        return MeasurementRepository(self.result_type)
+
+    @cached_property
+    def datapoint(self) -> DatapointRepository:
+        from data_access.datapoint_repository import DatapointRepository
+        return DatapointRepository(self.result_type)
@@ -0,0 +1,100 @@
+"""
+Result types of the repository getters. Repositories are created with a result_type:
+    'frame'     pandas DataFrame (default)
+    'records'   NumPy record array (np.recarray, like the as_records chunks of the streaming getters)
+    'tuples'    list of row tuples, in the column order documented by the getter
+pandas is only imported when a DataFrame is built, so scripts that use the 'records' or 'tuples' results
+(or only IDs and models) do not pay its import time.
+"""
+import importlib
+import numpy as np
+
+RESULT_FRAME = "frame"
+RESULT_RECORDS = "records"
+RESULT_TUPLES = "tuples"
+RESULT_TYPES = (RESULT_FRAME, RESULT_RECORDS, RESULT_TUPLES)
+
+class LazyModule:
+    def __init__(self, name: str):
+        """
+        Initializes the LazyModule, a stand-in for a module that is imported on the first attribute access
+        (e.g. pd = LazyModule('pandas'); pd.DataFrame(...) imports pandas on this first call).
+
+        Args:
+            name (str): The name of the module.
+        """
+        self._name = name
+
+    def __getattr__(self, name: str):
+        return getattr(importlib.import_module(self._name), name)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self._name}'>"
+
+
+pd = LazyModule("pandas")
+
+def check_result_type(result_type: str) -> str:
+    """
+    Validates a result type (raises ValueError for unknown types) and returns it.
+    """
+    if result_type not in RESULT_TYPES:
+        raise ValueError(f"unknown result type '{result_type}', expected one of {', '.join(RESULT_TYPES)}")
+    return result_type
+
+def rows_to_result(rows: list[tuple], columns: list[str], result_type: str):
+    """
+    Converts the rows of a query to the result type.
+
+    Args:
+        rows (list[tuple]): The rows (fetchall/fetchmany).
+        columns (list[str]): The column names.
+        result_type (str): 'frame', 'records' or 'tuples'.
+
+    Returns:
+        pd.DataFrame | np.recarray | list[tuple]: The rows in the result type. Field names of a record array must be
+        unique, repeated column names (e.g. participant_id of participant and measurement) get the suffix _1, _2, ...
+    """
+    if result_type == RESULT_TUPLES:
+        return rows
+    if result_type == RESULT_RECORDS:
+        names = _unique_names(columns)
+        if not rows:
+            return np.rec.fromarrays([np.empty(0, dtype=object) for _ in names], names=names)
+        return np.rec.fromrecords(rows, names=names)
+    return pd.DataFrame(rows, columns=columns)
+
+def arrays_to_result(data: dict[str, np.ndarray], result_type: str):
+    """
+    Converts columns (equally long arrays by column name) to the result type, see rows_to_result.
+    """
+    if result_type == RESULT_TUPLES:
+        return list(zip(*(values.tolist() for values in data.values())))
+    if result_type == RESULT_RECORDS:
+        return np.rec.fromarrays([_infer_dtype(values) for values in data.values()], names=list(data))
+    return pd.DataFrame(data).infer_objects()
+
+def empty_result(columns: list[str], result_type: str):
+    """
+    Returns the empty result of the getters that return an empty result instead of None
+    (an empty DataFrame or record array with the columns of the query, or an empty list), so that indexing
+    a column of an empty result (e.g. df['id']) works.
+    """
+    return rows_to_result([], columns, result_type)
+
+def _infer_dtype(values: np.ndarray) -> np.ndarray:
+    """
+    Converts an object array of numbers to a numeric array (like DataFrame.infer_objects), other arrays are unchanged.
+    """
+    if values.dtype != object or len(values) == 0:
+        return values
+    inferred = np.array(values.tolist())
+    return inferred if inferred.dtype.kind in "biuf" else values
+
+def _unique_names(columns: list[str]) -> list[str]:
+    names, seen = [], {}
+    for column in columns:
+        count = seen.get(column, 0)
+        seen[column] = count + 1
+        names.append(f"{column}_{count}" if count else column)
+    return names
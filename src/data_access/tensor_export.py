@@ -0,0 +1,124 @@
+import os
+import numpy as np
+from data_access.datapoint_repository import DatapointRepository
+from data_access.results import pd
+from data_access.measurement_repository import MeasurementRepository
+from data_access.participant_repository import ParticipantRepository
+from models.experiment_tensor import ExperimentTensor
+
+# files of an exported experiment tensor (in the export folder), the values are stored in values.npy
+_LABEL_FILES = ["participant_ids", "timepoints", "targets", "axes", "bow_strokes", "time_points", "up_down"]
+
+def export_experiment_tensor(exp_id: int, device: str, out_dir: str, dtype=np.float32,
+                             timepoints: list[str] | None = None) -> ExperimentTensor | None:
+    """
+    Exports the datapoints of an experiment and measurement device as a dense 5-D tensor
+    (participant, measurement timepoint, target x axis, stroke, time_point) into a memory-mapped
+    .npy file (out_dir/values.npy), the label arrays are saved alongside (out_dir/<label>.npy).
+    The strokes (axis 3) are the (bow_stroke, up_down) pairs of the experiment, labelled from the row labels of the
+    feature matrices (up_down -1 if not set), a stroke a participant does not have is NaN.
+    The tensor is filled one (timepoint, target) block at a time, so the experiment is never loaded into RAM at once.
+
+    Args:
+        exp_id (int): The ID of the experiment.
+        device (str): The name of the measurement device (e.g., 'mocap').
+        out_dir (str): The folder the tensor and the label arrays are written to.
+        dtype: The float dtype of the tensor.
+        timepoints (list[str] | None): Optional list of measurement timepoints, all timepoints are exported if None.
+
+    Returns:
+        ExperimentTensor | None: The exported tensor (opened read-only, see load_experiment_tensor). 
+        Returns None if no data found.
+    """
+    datapoint_repo = DatapointRepository()
+    participant_ids = ParticipantRepository().get_participant_ids(exp_id)
+    timepoints = timepoints or MeasurementRepository().get_measurement_timepoints(exp_id, device)
+    if not participant_ids or not timepoints:
+        return None
+    participant_ids = sorted(participant_ids)
+
+    # layout of the tensor from the per-stroke summaries (no datapoint values are loaded)
+    strokes = {timepoint: datapoint_repo.get_strokes_by_exp_id_device_and_timepoint(exp_id, device, timepoint) 
+               for timepoint in timepoints}
+    strokes = {timepoint: df for timepoint, df in strokes.items() if df is not None}
+    if not strokes:
+        return None
+    channels = sorted({(target, axis or "") for df in strokes.values() for target, axis in zip(df["target"], df["axis"])})
+    # strokes are indexed by (bow_stroke, up_down), up_down -1 if not set (the convention of models.feature_matrix)
+    stroke_keys = sorted({(int(bow_stroke), -1 if pd.isna(direction) else int(direction))
+                          for df in strokes.values() for bow_stroke, direction in zip(df["bow_stroke"], df["up_down"])})
+    min_time_point = min(df["first_time_point"].min() for df in strokes.values())
+    max_time_point = max(df["last_time_point"].max() for df in strokes.values())
+
+    participant_index = {participant_id: i for i, participant_id in enumerate(participant_ids)}
+    channel_index = {channel: i for i, channel in enumerate(channels)}
+    stroke_index = {key: i for i, key in enumerate(stroke_keys)}
+    shape = (len(participant_ids), len(timepoints), len(channels), len(stroke_keys),
+             int(max_time_point - min_time_point + 1))
+
+    os.makedirs(out_dir, exist_ok=True)
+    values = np.lib.format.open_memmap(os.path.join(out_dir, "values.npy"), mode="w+", dtype=dtype, shape=shape)
+    for p in range(shape[0]):
+        values[p] = np.nan
+
+    for t, timepoint in enumerate(timepoints):
+        if timepoint not in strokes:
+            continue
+        for target in sorted(strokes[timepoint]["target"].unique()):
+            matrix = datapoint_repo.get_feature_matrix(exp_id, device, timepoint, targets=[target], dtype=dtype)
+            rows = np.array([participant_index[participant_id] for participant_id in matrix.row_labels["participant_id"]])
+            stroke_rows = np.array([stroke_index[(int(bow_stroke), int(direction))] for bow_stroke, direction
+                                    in zip(matrix.row_labels["bow_stroke"], matrix.row_labels["up_down"])])
+            n_time_points = len(matrix.column_labels) // len({(c["target"], c["axis"]) for c in matrix.column_labels})
+            column_channels = matrix.column_labels[::n_time_points]
+            channels_of_block = np.array([channel_index[(c["target"], c["axis"] or "")] for c in column_channels])
+            first = matrix.column_labels["time_point"][0] - min_time_point
+            block = matrix.values.reshape(len(rows), len(channels_of_block), n_time_points)
+            values[rows[:, None], t, channels_of_block[None, :], stroke_rows[:, None], first:first + n_time_points] = block
+    values.flush()
+    del values
+
+    labels = {
+        "participant_ids": np.array(participant_ids, dtype=str),
+        "timepoints": np.array(timepoints, dtype=str),
+        "targets": np.array([target for target, _ in channels], dtype=str),
+        "axes": np.array([axis for _, axis in channels], dtype=str),
+        "bow_strokes": np.array([bow_stroke for bow_stroke, _ in stroke_keys]),
+        "time_points": np.arange(min_time_point, max_time_point + 1),
+        "up_down": np.array([direction for _, direction in stroke_keys], dtype=np.int8),
+    }
+    for name, label in labels.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), label)
+    return load_experiment_tensor(out_dir)
+
+def load_experiment_tensor(out_dir: str) -> ExperimentTensor:
+    """
+    Loads an exported experiment tensor (see export_experiment_tensor). The values are memory-mapped read-only
+    (zero copy), so slicing e.g. only 'pre' or only one target reads only the needed parts of the file.
+
+    Args:
+        out_dir (str): The folder of the exported tensor.
+
+    Returns:
+        ExperimentTensor: The memory-mapped tensor with its label arrays.
+    """
+    values = np.load(os.path.join(out_dir, "values.npy"), mmap_mode="r")
+    labels = {name: np.load(os.path.join(out_dir, f"{name}.npy")) for name in _LABEL_FILES}
+    return ExperimentTensor(values=values, **labels)
+
+def select_channels(tensor: ExperimentTensor, target: str, axis: str | None = None) -> np.ndarray:
+    """
+    Returns the channel indices (axis 2 of the tensor) of a target, optionally restricted to one axis.
+
+    Args:
+        tensor (ExperimentTensor): The experiment tensor.
+        target (str): The name of the target (e.g., 'left elbow joint angle').
+        axis (str | None): Optional name of the axis (e.g., 'X').
+
+    Returns:
+        np.ndarray: The indices of the matching channels.
+    """
+    mask = tensor.targets == target
+    if axis is not None:
+        mask &= tensor.axes == axis
+    return np.flatnonzero(mask)
@@ -0,0 +1,48 @@
+"""
+Builds or refreshes the materialized aggregate tables (stroke_summary, waveform_summary, see db/schema.py) of an
+existing database. Databases created before the aggregate tables existed are computed completely, afterwards only
+the measurements listed as stale are recomputed (use --rebuild to recompute all measurements).
+
+Run from the src folder, e.g.:
+    python -m db.aggregates ../data/PAH_database.db
+"""
+import argparse
+import time
+from db.connection import get_connection, close_connection
+from db.schema import create_aggregate_tables, has_aggregate_tables
+from data_access.datapoint_repository import DatapointRepository
+
+
+def build_aggregates(rebuild: bool = False) -> int:
+    """
+    Creates the aggregate tables of the database of db.connection (if needed) and computes the missing aggregates.
+
+    Args:
+        rebuild (bool): Whether the aggregates of all measurements are recomputed.
+
+    Returns:
+        int: The number of measurements recomputed.
+    """
+    conn = get_connection()
+    measurement_ids = None
+    if rebuild or not has_aggregate_tables(conn):
+        create_aggregate_tables(conn)
+        measurement_ids = [row[0] for row in conn.execute("SELECT id FROM measurement ORDER BY id").fetchall()]
+    return DatapointRepository().refresh_aggregates(measurement_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="path of the database")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the aggregates of all measurements")
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    start = time.perf_counter()
+    n_measurements = build_aggregates(args.rebuild)
+    close_connection()
+    print(f"aggregates of {n_measurements} measurements computed in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,245 @@
+import os
 import sqlite3
 from sqlite3 import Connection
 import threading
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import quote
+from db.instrumentation import InstrumentedConnection
+
+DEFAULT_DB_PATH = 'data/PAH_database.db'
+
+class ConnectionManager:
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, pool_size: int = 8, wal: bool = True, timeout: float = 30.0,
+                 read_pool: bool = True):
+        """
+        Initializes the ConnectionManager: one writer connection (shared by all threads, used for all inserts/updates)
+        plus a pool of read-only connections for the queries of the repositories.
+
+        Lifecycle of the read connections:
+          - get_read_connection binds a connection to the calling thread, it is returned to the pool by
+            release_read_connection or (lazily) when the thread has ended.
+          - read_connection() borrows a connection for the duration of a with-block.
+          - at most pool_size idle connections are kept open for reuse, further returned connections are closed.
+        In WAL mode readers never block the writer (and vice versa), they see the data committed before their query started.
+        With read_pool=False (and for in-memory databases, which cannot be shared between connections) all reads
+        go through the writer connection, i.e. concurrent queries are serialized.
+
+        Args:
+            db_path (str): Path to SQLite database file.
+            pool_size (int): Number of idle read connections kept open.
+            wal (bool): Whether the database is switched to the WAL journal mode (persistent, needed for concurrent reads while writing).
+            timeout (float): Seconds a connection waits for a lock before raising 'database is locked'.
+            read_pool (bool): Whether reads use the pool of read-only connections.
+        """
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.wal = wal
+        self.timeout = timeout
+        self.in_memory = db_path == ':memory:' or 'mode=memory' in db_path
+        self.read_pool = read_pool and not self.in_memory
+        self._writer = None
+        self._lock = threading.Lock()
+        self._idle = []             # read connections ready to be borrowed
+        self._in_use = {}           # borrowed read connection -> thread it is bound to (None for read_connection blocks)
+        self._local = threading.local()
+        self._closed = False
+
+    def get_writer(self) -> Connection:
+        """
+        Returns the writer connection (opened on first use).
+        """
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = self._open_writer()
+        return self._writer
+
+    def get_read_connection(self) -> Connection:
+        """
+        Returns the read-only connection bound to the calling thread, borrowing one from the pool on first use.
+        """
+        if not self.read_pool:
+            return self.get_writer()
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = self._acquire(threading.current_thread())
+            self._local.connection = conn
+        return conn
+
+    def release_read_connection(self):
+        """
+        Returns the read connection bound to the calling thread (if any) to the pool.
+        """
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            self._local.connection = None
+            self._release(conn)
+
+    @contextmanager
+    def read_connection(self) -> Iterator[Connection]:
+        """
+        Context manager borrowing a read-only connection for the duration of the with-block
+        (the connection bound to the calling thread, if there is one).
+        """
+        conn = getattr(self._local, 'connection', None) if self.read_pool else None
+        if not self.read_pool or conn is not None:
+            yield conn or self.get_writer()
+            return
+        conn = self._acquire(None)
+        self._local.connection = conn
+        try:
+            yield conn
+        finally:
+            self._local.connection = None
+            self._release(conn)
+
+    def interrupt_read_connections(self, thread: threading.Thread):
+        """
+        Aborts the running queries of the read connections bound to a thread (see sqlite3.Connection.interrupt).
+        """
+        with self._lock:
+            connections = [conn for conn, owner in self._in_use.items() if owner is thread]
+        for conn in connections:
+            conn.interrupt()
+
+    def close(self):
+        """
+        Closes the writer and all read connections (borrowed connections are closed as well).
+        """
+        with self._lock:
+            self._closed = True
+            connections = self._idle + list(self._in_use)
+            self._idle, self._in_use = [], {}
+            if self._writer is not None:
+                connections.append(self._writer)
+                self._writer = None
+        for conn in connections:
+            conn.close()
+
+    def _acquire(self, owner: threading.Thread | None) -> Connection:
+        """
+        Borrows an idle read connection (or opens a new one), connections bound to ended threads are reclaimed first.
+        """
+        self.get_writer()           # creates the database file (and switches it to WAL) before it is opened read-only
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot operate on a closed connection manager.")
+            for conn, thread in list(self._in_use.items()):
+                if thread is not None and not thread.is_alive():
+                    del self._in_use[conn]
+                    self._idle.append(conn)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._open_read_connection()
+            self._in_use[conn] = owner
+        return conn
+
+    def _release(self, conn: Connection):
+        with self._lock:
+            if self._in_use.pop(conn, False) is False:
+                return              # closed in the meantime
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _open_writer(self) -> Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=self.timeout,
+                               factory=InstrumentedConnection)
+        if self.wal and not self.in_memory:
+            conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def _open_read_connection(self) -> Connection:
+        uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=self.timeout,
+                               factory=InstrumentedConnection)
+
 
 # Thread-safe Singleton for DB-connection
-_connection = None
-_connection_lock = threading.Lock()
+_manager = None
+_manager_lock = threading.Lock()
 
-def get_connection(db_path: str = 'data/PAH_database.db') -> Connection:
+def configure_connections(db_path: str = DEFAULT_DB_PATH, pool_size: int = 8, wal: bool = True,
+                          timeout: float = 30.0, read_pool: bool = True, shard_dir: str | None = None) -> ConnectionManager:
+    """
+    Replaces the connection manager (closing all connections of the previous one), see ConnectionManager for the options.
+    With a shard_dir, db_path is the catalog of a sharded database (one database per experiment in shard_dir,
+    see db/sharding.py) and the connections are routed to the shards.
+    Returns:
+        The new ConnectionManager.
     """
-    Returns Singleton-Database-Connection
+    global _manager
+    if shard_dir is not None:
+        from db.sharding import ShardedConnectionManager
+        manager = ShardedConnectionManager(db_path, shard_dir, pool_size=pool_size, wal=wal, timeout=timeout,
+                                           read_pool=read_pool)
+    else:
+        manager = ConnectionManager(db_path, pool_size=pool_size, wal=wal, timeout=timeout, read_pool=read_pool)
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+        _manager = manager
+    return _manager
+
+def get_connection_manager(db_path: str = DEFAULT_DB_PATH) -> ConnectionManager:
+    """
+    Returns the Singleton-ConnectionManager
+    If no manager exists, a new one (with the default options) is initiated.
+    Args:
+        db_path: Path to SQLite database file.
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ConnectionManager(db_path)
+    return _manager
+
+def get_connection(db_path: str = DEFAULT_DB_PATH) -> Connection:
+    """
+    Returns Singleton-Database-Connection (the writer connection)
     If no connection exists, a new one is initiated.
     Args:
         db_path: Path to SQLite database file.
     Returns:
         sqlite3.connection-object
     """
-    global _connection
-    if _connection is None:
-        with _connection_lock:
-            if _connection is None:
-                _connection = sqlite3.connect(db_path, check_same_thread=False)
-    return _connection
+    return get_connection_manager(db_path).get_writer()
+
+def get_read_connection() -> Connection:
+    """
+    Returns the read-only connection of the calling thread (see ConnectionManager.get_read_connection),
+    used by the getters of the repositories.
+    Returns:
+        sqlite3.connection-object
+    """
+    return get_connection_manager().get_read_connection()
+
+@contextmanager
+def read_connection() -> Iterator[Connection]:
+    """
+    Context manager borrowing a read-only connection for the duration of the with-block, e.g.:
+        with read_connection() as conn:
+            conn.execute(...)
+    """
+    with get_connection_manager().read_connection() as conn:
+        yield conn
+
+def release_read_connection():
+    """
+    Returns the read connection of the calling thread to the pool (e.g. at the end of a worker thread's job).
+    """
+    if _manager is not None:
+        _manager.release_read_connection()
 
 def close_connection():
     """
-    Closes the database connection, if it is open.
+    Closes the database connections (writer and read connections), if they are open.
     """
-    global _connection
-    if _connection:
-        _connection.close()
-        _connection = None
\ No newline at end of file
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close()
+            _manager = None
@@ -0,0 +1,420 @@
+"""
+Instrumentation of the repository layer: per-call timings of the repository methods, split into the phases
+    - execute:      cursor.execute/executemany (SQLite prepares the statement and steps to the first row)
+    - fetch:        fetchone/fetchmany/fetchall and row iteration (stepping through the remaining rows + tuple creation)
+    - materialize:  the rest of the call, i.e. building the DataFrame/arrays/objects of the result in Python
+along with the rows fetched, the size of the result, the SQL statements, the SQLite statements actually run
+(sqlite3 trace callback), the SQLite virtual machine steps (sqlite3 progress handler) and optionally the
+EXPLAIN QUERY PLAN of every distinct query.
+
+It is switched on with one call (or the environment variable PAH_PROFILE=1, PAH_PROFILE=explain adds the query plans,
+the report is then printed at exit):
+    from db import instrumentation
+    instrumentation.enable()
+    ... repository calls ...
+    print(instrumentation.report())                 # or report('json'), dump('profile.json')
+
+When it is off, the connections hand out plain sqlite3 cursors (no callbacks are installed) and the repository
+methods only check one flag, so the overhead is negligible.
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Iterator
+
+# distinct SQL texts kept per method (and plans in total), the per-call records are kept in a ring buffer
+_MAX_SQL_TEXTS = 20
+_MAX_PLANS = 1000
+_MAX_CALL_RECORDS = 10_000
+
+@dataclass
+class CallRecord:
+    name: str                           # <Repository>.<method>
+    seconds: float = 0.0
+    execute_seconds: float = 0.0
+    fetch_seconds: float = 0.0
+    nested_seconds: float = 0.0         # time spent in nested repository calls (not counted in the phases above)
+    rows: int = 0                       # rows fetched from SQLite
+    result_bytes: int = 0               # size of the returned data (summed over the chunks of iterators)
+    statements: int = 0                 # statements run by SQLite (trace callback), e.g. one per row of executemany
+    vm_steps: int = 0                   # SQLite virtual machine instructions (progress handler, in steps of progress_steps)
+    sql: list[str] = field(default_factory=list)
+
+    @property
+    def materialize_seconds(self) -> float:
+        return max(self.seconds - self.execute_seconds - self.fetch_seconds - self.nested_seconds, 0.0)
+
+@dataclass
+class QueryStats:
+    name: str
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    execute_seconds: float = 0.0
+    fetch_seconds: float = 0.0
+    materialize_seconds: float = 0.0
+    rows: int = 0
+    result_bytes: int = 0
+    statements: int = 0
+    vm_steps: int = 0
+    sql: list[str] = field(default_factory=list)
+
+    def add(self, call: CallRecord):
+        self.calls += 1
+        self.seconds += call.seconds
+        self.max_seconds = max(self.max_seconds, call.seconds)
+        self.execute_seconds += call.execute_seconds
+        self.fetch_seconds += call.fetch_seconds
+        self.materialize_seconds += call.materialize_seconds
+        self.rows += call.rows
+        self.result_bytes += call.result_bytes
+        self.statements += call.statements
+        self.vm_steps += call.vm_steps
+        for sql in call.sql:
+            if sql not in self.sql and len(self.sql) < _MAX_SQL_TEXTS:
+                self.sql.append(sql)
+
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.explain = False
+        self.progress_steps = 1000
+        self.lock = threading.Lock()
+        self.stats = {}                 # name -> QueryStats
+        self.calls = deque(maxlen=_MAX_CALL_RECORDS)
+        self.plans = {}                 # SQL text -> EXPLAIN QUERY PLAN lines
+        self.connections = weakref.WeakSet()    # connections with installed callbacks
+        self.local = threading.local()  # .stack: the active CallRecords of the thread
+
+_state = _State()
+
+
+def enable(explain: bool = False, progress_steps: int = 1000):
+    """
+    Switches the instrumentation on (the statistics collected so far are kept, see reset).
+
+    Args:
+        explain (bool): Whether the EXPLAIN QUERY PLAN of every distinct query is recorded (runs each plan once).
+        progress_steps (int): Granularity of the virtual machine step count (SQLite progress handler).
+    """
+    _state.explain = explain
+    _state.progress_steps = progress_steps
+    _state.enabled = True
+
+def disable():
+    """
+    Switches the instrumentation off and removes the SQLite callbacks from the connections.
+    """
+    _state.enabled = False
+    for conn in list(_state.connections):
+        try:
+            conn.set_trace_callback(None)
+            conn.set_progress_handler(None, 0)
+        except sqlite3.ProgrammingError:
+            pass                        # closed
+    _state.connections = weakref.WeakSet()
+
+def is_enabled() -> bool:
+    return _state.enabled
+
+def reset():
+    """
+    Discards the collected statistics, call records and query plans.
+    """
+    with _state.lock:
+        _state.stats = {}
+        _state.calls.clear()
+        _state.plans = {}
+
+@contextmanager
+def profiling(explain: bool = False) -> Iterator[None]:
+    """
+    Context manager switching the instrumentation on for the duration of the with-block, e.g.:
+        with profiling():
+            DatapointRepository().get_feature_matrix(1, 'mocap', 'pre')
+        print(report())
+    """
+    was_enabled = _state.enabled
+    enable(explain)
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+def get_stats() -> list[QueryStats]:
+    """
+    Returns the aggregated statistics per repository method, slowest (total time) first.
+    """
+    with _state.lock:
+        return sorted(_state.stats.values(), key=lambda stats: stats.seconds, reverse=True)
+
+def get_calls() -> list[CallRecord]:
+    """
+    Returns the records of the most recent calls (at most 10,000), oldest first.
+    """
+    with _state.lock:
+        return list(_state.calls)
+
+def get_plans() -> dict[str, list[str]]:
+    """
+    Returns the recorded query plans (SQL text -> EXPLAIN QUERY PLAN lines), empty unless enabled with explain=True.
+    """
+    with _state.lock:
+        return dict(_state.plans)
+
+def report(format: str = "table") -> str:
+    """
+    Returns the aggregated statistics as a text table or as JSON.
+
+    Args:
+        format (str): 'table' or 'json'.
+    """
+    stats = get_stats()
+    if format == "json":
+        return json.dumps({"stats": [asdict(entry) for entry in stats], "plans": get_plans()}, indent=2)
+    if format != "table":
+        raise ValueError(f"unknown format '{format}', expected 'table' or 'json'")
+    lines = [f"{'method':<62} {'calls':>6} {'total [s]':>10} {'execute':>9} {'fetch':>9} {'materialize':>11} "
+             f"{'rows':>10} {'result [MB]':>11} {'stmts':>7} {'vm steps':>11}"]
+    for entry in stats:
+        lines.append(f"{entry.name:<62} {entry.calls:>6} {entry.seconds:>10.4f} {entry.execute_seconds:>9.4f} "
+                     f"{entry.fetch_seconds:>9.4f} {entry.materialize_seconds:>11.4f} {entry.rows:>10} "
+                     f"{entry.result_bytes / 2**20:>11.2f} {entry.statements:>7} {entry.vm_steps:>11}")
+    return "\n".join(lines)
+
+def dump(path: str):
+    """
+    Writes the aggregated statistics and query plans to a JSON file.
+    """
+    with open(path, "w") as file:
+        file.write(report("json"))
+
+
+# region Repository methods
+def instrument_repository(cls):
+    """
+    Class decorator timing the public methods of a repository while the instrumentation is enabled.
+    Iterators returned by a method (streaming getters) are timed chunk by chunk until they are exhausted or closed.
+    """
+    for name, method in inspect.getmembers(cls, inspect.isfunction):
+        if not name.startswith("_"):
+            setattr(cls, name, _instrument_method(f"{cls.__name__}.{name}", method))
+    return cls
+
+def _instrument_method(name: str, method):
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        if not _state.enabled:
+            return method(*args, **kwargs)
+        record = CallRecord(name)
+        with _active(record):
+            result = method(*args, **kwargs)
+        if inspect.isgenerator(result):
+            return _instrument_generator(record, result)
+        record.result_bytes = _result_bytes(result)
+        _finish(record)
+        return result
+    return call
+
+def _instrument_generator(record: CallRecord, generator):
+    try:
+        while True:
+            with _active(record):
+                try:
+                    chunk = next(generator)
+                except StopIteration:
+                    return
+            record.result_bytes += _result_bytes(chunk)
+            yield chunk
+    finally:
+        generator.close()
+        _finish(record)
+
+@contextmanager
+def _active(record: CallRecord) -> Iterator[None]:
+    """
+    Makes record the current call of the thread (the cursors and SQLite callbacks report to it) and adds the
+    elapsed time to it (and to the nested time of the enclosing call).
+    """
+    stack = _stack()
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record.seconds += elapsed
+        stack.pop()
+        if stack:
+            stack[-1].nested_seconds += elapsed
+
+def _finish(record: CallRecord):
+    with _state.lock:
+        _state.stats.setdefault(record.name, QueryStats(record.name)).add(record)
+        _state.calls.append(record)
+
+def _stack() -> list[CallRecord]:
+    stack = getattr(_state.local, "stack", None)
+    if stack is None:
+        stack = _state.local.stack = []
+    return stack
+
+def _current() -> CallRecord | None:
+    """
+    Returns the current repository call of the thread, None outside of repository methods.
+    """
+    stack = _stack()
+    return stack[-1] if stack else None
+
+def _result_bytes(result) -> int:
+    if result is None:
+        return 0
+    if hasattr(result, "memory_usage"):                 # DataFrame
+        return int(result.memory_usage(index=True, deep=False).sum())
+    if hasattr(result, "nbytes"):                       # ndarray, DatapointFacts
+        return int(result.nbytes)
+    if hasattr(result, "values") and hasattr(result.values, "nbytes"):     # FeatureMatrix
+        return int(result.values.nbytes + result.row_labels.nbytes + result.column_labels.nbytes)
+    if isinstance(result, (list, tuple)):
+        return sys.getsizeof(result) + sum(sys.getsizeof(item) for item in result)
+    return sys.getsizeof(result)
+# endregion
+
+# region Connections
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection (factory of db.connection) handing out profiled cursors while the instrumentation is enabled.
+    """
+    def cursor(self, factory=sqlite3.Cursor):
+        if _state.enabled and factory is sqlite3.Cursor:
+            if self not in _state.connections:
+                self._install_callbacks()
+            factory = ProfiledCursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=(), /):
+        if _state.enabled:
+            return self.cursor().execute(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        if _state.enabled:
+            return self.cursor().executemany(sql, parameters)
+        return super().executemany(sql, parameters)
+
+    def _install_callbacks(self):
+        self.set_trace_callback(_trace)
+        self.set_progress_handler(_progress, _state.progress_steps)
+        _state.connections.add(self)
+
+def _trace(statement: str):
+    record = _current()
+    if record is not None and not getattr(_state.local, "explaining", False):
+        record.statements += 1
+
+def _progress() -> int:
+    record = _current()
+    if record is not None:
+        record.vm_steps += _state.progress_steps
+    return 0
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor timing execute and fetch calls (including row iteration) for the current repository call
+    (activity outside of repository methods is not recorded).
+    """
+    def execute(self, sql, parameters=(), /):
+        record = _current()
+        if record is None:
+            return super().execute(sql, parameters)
+        _add_sql(record, sql)
+        if _state.explain:
+            _explain(self.connection, sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record.execute_seconds += time.perf_counter() - start
+
+    def executemany(self, sql, parameters, /):
+        record = _current()
+        if record is None:
+            return super().executemany(sql, parameters)
+        _add_sql(record, sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            record.execute_seconds += time.perf_counter() - start
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add_fetch(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add_fetch(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add_fetch(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()            # raises StopIteration at the end
+        self._add_fetch(start, 1)
+        return row
+
+    @staticmethod
+    def _add_fetch(start: float, rows: int):
+        record = _current()
+        if record is not None:
+            record.fetch_seconds += time.perf_counter() - start
+            record.rows += rows
+
+def _add_sql(record: CallRecord, sql: str):
+    sql = " ".join(sql.split())
+    if sql not in record.sql and len(record.sql) < _MAX_SQL_TEXTS:
+        record.sql.append(sql)
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters):
+    """
+    Records the query plan of a SELECT the first time it is run (not counted in the statistics of the call).
+    """
+    text = " ".join(sql.split())
+    if text in _state.plans or len(_state.plans) >= _MAX_PLANS or not text.upper().startswith(("SELECT", "WITH")):
+        return
+    _state.local.explaining = True
+    try:
+        plan = [row[3] for row in sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", parameters)]
+    except sqlite3.Error as error:
+        plan = [f"EXPLAIN failed: {error}"]
+    finally:
+        _state.local.explaining = False
+    with _state.lock:
+        _state.plans[text] = plan
+# endregion
+
+
+if os.environ.get("PAH_PROFILE"):
+    enable(explain=os.environ["PAH_PROFILE"].lower() == "explain")
+    atexit.register(lambda: print(report(), file=sys.stderr))
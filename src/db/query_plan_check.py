@@ -0,0 +1,156 @@
+"""
+Query plan regression check: calls every getter of the four repositories, runs EXPLAIN QUERY PLAN for every
+query they execute and fails (exit code 1) if any of them does a full scan of the datapoint (or waveform) table.
+
+By default the check runs on in-memory databases with the schema of db/schema.py (both storage layouts) and one 
+sample bow stroke, pass --db to check the indexes of an existing database instead. Run from the src folder, e.g.:
+    python -m db.query_plan_check
+    python -m db.query_plan_check --db ../data/PAH_database.db
+"""
+import argparse
+import inspect
+import re
+import sys
+from dataclasses import dataclass
+from sqlite3 import Connection
+from db.connection import get_connection, get_read_connection, close_connection
+from db.schema import LAYOUT_ROWS, LAYOUT_WAVEFORM, create_schema, get_datapoint_layout
+
+# arguments the repository getters are called with (by parameter name)
+SAMPLE_ARGUMENTS = {
+    "exp_id": 1,
+    "experiment_id": 1,
+    "exp_name": "mpa",
+    "experiment_name": "mpa",
+    "data_state": "clean",
+    "participant_id": 1,
+    "measurement_id": 1,
+    "datapoint_id": 1,
+    "device": "mocap",
+    "timepoint": "pre",
+    "target": "left elbow joint angle",
+    "axis": "X",
+    "targets": ["left elbow joint angle"],
+    "axes": ["X"],
+}
+
+_FULL_SCAN = re.compile(r"^SCAN (datapoint|waveform)\b")
+
+@dataclass
+class QueryPlan:
+    method: str                     # repository method that executed the query (e.g. 'DatapointRepository.get_feature_matrix')
+    sql: str                        # the query (with the bound parameters)
+    plan: list[str]                 # the EXPLAIN QUERY PLAN lines
+    full_scan: bool                 # whether the plan contains a full scan of the datapoint/waveform table
+    error: str | None = None        # exception the method raised after executing its queries (e.g. while building the result)
+
+
+def collect_query_plans(conn: Connection) -> list[QueryPlan]:
+    """
+    Calls every public getter (get_*/iter_*) of the repositories with SAMPLE_ARGUMENTS and returns the query plan
+    of every SELECT they execute. The repositories use the connections of db.connection.
+
+    Args:
+        conn (Connection): The writer connection of db.connection.get_connection.
+
+    Returns:
+        list[QueryPlan]: The query plans, in the order the queries were executed.
+    """
+    from data_access.experiment_repository import ExperimentRepository
+    from data_access.participant_repository import ParticipantRepository
+    from data_access.measurement_repository import MeasurementRepository
+    from data_access.datapoint_repository import DatapointRepository
+
+    read_conn = get_read_connection()       # the getters query through the read connection of this thread
+    plans = []
+    for repo in (ExperimentRepository(), ParticipantRepository(), MeasurementRepository(), DatapointRepository()):
+        for name, method in inspect.getmembers(repo, inspect.ismethod):
+            if not name.startswith(("get_", "iter_")):
+                continue
+            statements, error = [], None
+            conn.set_trace_callback(statements.append)
+            read_conn.set_trace_callback(statements.append)
+            try:
+                kwargs = {parameter: SAMPLE_ARGUMENTS[parameter]
+                          for parameter in inspect.signature(method).parameters if parameter in SAMPLE_ARGUMENTS}
+                result = method(**kwargs)
+                if name.startswith("iter_"):
+                    next(result, None)
+            except Exception as exception:
+                error = f"{type(exception).__name__}: {exception}"
+            finally:
+                conn.set_trace_callback(None)
+                read_conn.set_trace_callback(None)
+            for sql in statements:
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+                plans.append(QueryPlan(method=f"{type(repo).__name__}.{name}", sql=sql, plan=plan,
+                                       full_scan=any(_FULL_SCAN.match(line) for line in plan), error=error))
+    return plans
+
+
+def insert_sample_data():
+    """
+    Inserts one bow stroke matching SAMPLE_ARGUMENTS through the repositories, so the getters run all their queries
+    (most of them return early on empty tables).
+    """
+    from data_access.experiment_repository import ExperimentRepository
+    from data_access.participant_repository import ParticipantRepository
+    from data_access.measurement_repository import MeasurementRepository
+    from data_access.datapoint_repository import DatapointRepository
+    from models.experiment import Experiment
+    from models.participant import Participant
+    from models.measurement import Measurement
+
+    exp_id = ExperimentRepository().insert_experiment(Experiment(id=None, name=SAMPLE_ARGUMENTS["exp_name"],
+                                                                 data_state=SAMPLE_ARGUMENTS["data_state"]))
+    participant_ids = ParticipantRepository().insert_many_participants([Participant(id=None, participant_id="P001",
+                                                                                    experiment_id=exp_id)])
+    measurement_ids = MeasurementRepository().insert_many_measurements([
+        Measurement(id=None, participant_id=participant_ids[0], timepoint=SAMPLE_ARGUMENTS["timepoint"],
+                    device=SAMPLE_ARGUMENTS["device"], target=SAMPLE_ARGUMENTS["target"], axis=SAMPLE_ARGUMENTS["axis"],
+                    unit="degree")])
+    DatapointRepository().insert_datapoint_rows([(measurement_ids[0], 1, 0, None, time_point, 0.0) 
+                                                 for time_point in range(101)])
+
+
+def check_query_plans(conn: Connection) -> list[QueryPlan]:
+    """
+    Returns the query plans (see collect_query_plans) that do a full scan of the datapoint/waveform table.
+    """
+    return [plan for plan in collect_query_plans(conn) if plan.full_scan]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="path of an existing database (default: in-memory databases of both layouts)")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every query")
+    args = parser.parse_args()
+
+    violations = []
+    for layout in ([None] if args.db else [LAYOUT_ROWS, LAYOUT_WAVEFORM]):
+        close_connection()
+        conn = get_connection(args.db or ":memory:")
+        if layout is not None:
+            create_schema(conn, layout)
+            insert_sample_data()
+        plans = collect_query_plans(conn)
+        print(f"{get_datapoint_layout(conn)} layout: {len(plans)} queries checked")
+        for plan in plans:
+            if plan.full_scan or args.verbose:
+                print(f"{'FULL SCAN' if plan.full_scan else 'ok'}: {plan.method}")
+                print("    " + "\n    ".join(plan.plan))
+            if plan.error:
+                print(f"note: {plan.method} raised {plan.error}")
+        violations.extend(plan for plan in plans if plan.full_scan)
+    close_connection()
+
+    if violations:
+        print(f"{len(violations)} queries do a full scan of the datapoint table")
+        sys.exit(1)
+    print("no full scans of the datapoint table")
+
+
+if __name__ == "__main__":
+    main()
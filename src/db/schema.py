@@ -0,0 +1,252 @@
+"""
+Schema of the PAH database: table and index DDL, storage layouts of the datapoint values.
+
+Apply the indexes to an existing database (idempotent), from the src folder:
+    python -m db.schema ../data/PAH_database.db
+"""
+import argparse
+import sqlite3
+from sqlite3 import Connection
+import numpy as np
+
+# storage layouts of the datapoint values
+#   'rows':     one row per time point in the datapoint table (101 rows per bow stroke)
+#   'waveform': one row per (measurement, bow_stroke) in the waveform table, the values are packed in a float32 BLOB
+LAYOUT_ROWS = "rows"
+LAYOUT_WAVEFORM = "waveform"
+
+# dtype of the packed waveform samples (little endian float32), missing time points are stored as NaN
+WAVEFORM_SAMPLE_DTYPE = np.dtype("<f4")
+
+EXPERIMENT_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS experiment (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        data_state TEXT,
+        data_folder TEXT,
+        upload_complete INTEGER
+    )
+"""
+
+PARTICIPANT_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS participant (
+        id INTEGER PRIMARY KEY,
+        experiment_id INTEGER NOT NULL REFERENCES experiment(id),
+        participant_id TEXT NOT NULL,
+        age INTEGER,
+        height_cm REAL,
+        weight_kg REAL,
+        instrument TEXT,
+        PRMD_shoulder_neck_right INTEGER,
+        PRMD_shoulder_neck_left INTEGER,
+        PRMD_upper_arm_right INTEGER,
+        PRMD_upper_arm_left INTEGER,
+        PRMD_ever INTEGER
+    )
+"""
+
+MEASUREMENT_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS measurement (
+        id INTEGER PRIMARY KEY,
+        participant_id INTEGER NOT NULL REFERENCES participant(id),
+        timepoint TEXT,
+        device TEXT,
+        target TEXT,
+        axis TEXT,
+        unit TEXT
+    )
+"""
+
+DATAPOINT_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS datapoint (
+        id INTEGER PRIMARY KEY,
+        measurement_id INTEGER NOT NULL REFERENCES measurement(id),
+        bow_stroke INTEGER,
+        up_down INTEGER,
+        key TEXT,
+        time_point INTEGER,
+        value REAL
+    )
+"""
+
+WAVEFORM_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS waveform (
+        id INTEGER PRIMARY KEY,
+        measurement_id INTEGER NOT NULL REFERENCES measurement(id),
+        bow_stroke INTEGER NOT NULL,
+        up_down INTEGER,
+        key TEXT,
+        first_time_point INTEGER NOT NULL,
+        samples BLOB NOT NULL,
+        UNIQUE (measurement_id, bow_stroke, up_down)
+    )
+"""
+
+# materialized aggregates of the datapoint values, one set per measurement, recomputed (DatapointRepository.refresh_aggregates)
+# for the measurements listed in aggregate_stale, i.e. the measurements datapoints were inserted for since the last refresh
+#   - stroke_summary:   one row per bow stroke (mean, min, max, range of motion and time point of the maximum)
+#   - waveform_summary: the mean and standard deviation waveform over the bow strokes, one row per time point
+STROKE_SUMMARY_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS stroke_summary (
+        measurement_id INTEGER NOT NULL REFERENCES measurement(id),
+        bow_stroke INTEGER NOT NULL,
+        up_down INTEGER,
+        n_time_points INTEGER NOT NULL,
+        mean REAL,
+        min REAL,
+        max REAL,
+        range_of_motion REAL,
+        peak_time_point INTEGER,
+        UNIQUE (measurement_id, bow_stroke, up_down)
+    )
+"""
+
+WAVEFORM_SUMMARY_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS waveform_summary (
+        measurement_id INTEGER NOT NULL REFERENCES measurement(id),
+        time_point INTEGER NOT NULL,
+        n_strokes INTEGER NOT NULL,
+        mean REAL,
+        sd REAL,
+        PRIMARY KEY (measurement_id, time_point)
+    ) WITHOUT ROWID
+"""
+
+AGGREGATE_STALE_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS aggregate_stale (
+        measurement_id INTEGER PRIMARY KEY
+    )
+"""
+
+AGGREGATE_TABLE_DDL = [STROKE_SUMMARY_TABLE_DDL, WAVEFORM_SUMMARY_TABLE_DDL, AGGREGATE_STALE_TABLE_DDL]
+
+# indexes matched to the repository queries, as (table, DDL)
+#   - the datapoint getters go experiment -> participant (experiment_id) -> measurement (participant_id, device, timepoint, target)
+#     -> datapoint (measurement_id), the datapoint index covers all selected datapoint columns
+#   - the measurement getters filter on device/timepoint/target(/axis) of an experiment
+#   (the waveform table is covered by its UNIQUE (measurement_id, bow_stroke, up_down) index)
+INDEX_DDL = [
+    ("experiment", "CREATE INDEX IF NOT EXISTS idx_experiment_name ON experiment (name, data_state)"),
+    ("participant", "CREATE INDEX IF NOT EXISTS idx_participant_experiment ON participant (experiment_id, participant_id)"),
+    ("participant", "CREATE INDEX IF NOT EXISTS idx_participant_participant_id ON participant (participant_id)"),
+    ("measurement", "CREATE INDEX IF NOT EXISTS idx_measurement_participant ON measurement (participant_id, device, timepoint, target, axis)"),
+    ("measurement", "CREATE INDEX IF NOT EXISTS idx_measurement_device ON measurement (device, timepoint, target, axis)"),
+    ("measurement", "CREATE INDEX IF NOT EXISTS idx_measurement_target ON measurement (target, axis)"),
+    ("datapoint", "CREATE INDEX IF NOT EXISTS idx_datapoint_measurement ON datapoint "
+                  "(measurement_id, bow_stroke, up_down, time_point, value, key)"),
+]
+
+def create_schema(conn: Connection, layout: str = LAYOUT_ROWS):
+    """
+    Creates all tables (the datapoint table or the waveform table, depending on the layout) and indexes
+    that do not exist yet.
+
+    Args:
+        conn (Connection): The database connection.
+        layout (str): The storage layout of the datapoint values (LAYOUT_ROWS or LAYOUT_WAVEFORM).
+    """
+    cursor = conn.cursor()
+    for ddl in (EXPERIMENT_TABLE_DDL, PARTICIPANT_TABLE_DDL, MEASUREMENT_TABLE_DDL):
+        cursor.execute(ddl)
+    cursor.execute(WAVEFORM_TABLE_DDL if layout == LAYOUT_WAVEFORM else DATAPOINT_TABLE_DDL)
+    create_aggregate_tables(conn, commit=False)
+    conn.commit()
+    apply_indexes(conn)
+
+def create_aggregate_tables(conn: Connection, commit: bool = True):
+    """
+    Creates the aggregate tables (stroke_summary, waveform_summary, aggregate_stale) that do not exist yet.
+
+    Args:
+        conn (Connection): The database connection.
+        commit (bool): Whether the transaction is committed.
+    """
+    cursor = conn.cursor()
+    for ddl in AGGREGATE_TABLE_DDL:
+        cursor.execute(ddl)
+    if commit:
+        conn.commit()
+
+def has_aggregate_tables(conn: Connection) -> bool:
+    """
+    Determines whether the aggregate tables of a database exist (see db/aggregates.py to build them).
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('stroke_summary', 'waveform_summary')")
+    return cursor.fetchone()[0] == 2
+
+def apply_indexes(conn: Connection) -> list[str]:
+    """
+    Creates the indexes of INDEX_DDL on the existing tables of a database (idempotent, existing indexes are kept)
+    and updates the query planner statistics.
+
+    Args:
+        conn (Connection): The database connection.
+
+    Returns:
+        list[str]: The names of the indexes that were created.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    existing = {row[0] for row in cursor.fetchall()}
+
+    created = []
+    for table, ddl in INDEX_DDL:
+        if table not in tables:
+            continue
+        name = ddl.split(" ON ")[0].split()[-1]
+        if name not in existing:
+            cursor.execute(ddl)
+            created.append(name)
+    conn.commit()
+    cursor.execute("PRAGMA optimize")
+    return created
+
+def get_datapoint_layout(conn: Connection) -> str:
+    """
+    Determines in which layout the datapoint values of a database are stored.
+
+    Args:
+        conn (Connection): The database connection.
+
+    Returns:
+        str: LAYOUT_WAVEFORM if the database contains the waveform table, otherwise LAYOUT_ROWS
+        (the layout of the shards for the catalog of a sharded database, see db/sharding.py).
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('waveform', 'shard_config')")
+    tables = {row[0] for row in cursor.fetchall()}
+    if "shard_config" in tables:
+        return cursor.execute("SELECT layout FROM main.shard_config").fetchone()[0]
+    if "waveform" in tables:
+        return LAYOUT_WAVEFORM
+    return LAYOUT_ROWS
+
+def pack_waveform(values) -> bytes:
+    """
+    Packs the values of one bow stroke into a waveform BLOB.
+    """
+    return np.asarray(values, dtype=WAVEFORM_SAMPLE_DTYPE).tobytes()
+
+def unpack_waveform(samples: bytes) -> np.ndarray:
+    """
+    Unpacks a waveform BLOB into a (read-only) float32 array without copying.
+    """
+    return np.frombuffer(samples, dtype=WAVEFORM_SAMPLE_DTYPE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="path of the database")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    created = apply_indexes(conn)
+    conn.close()
+    print(f"created indexes: {', '.join(created)}" if created else "all indexes exist already")
+
+
+if __name__ == "__main__":
+    main()
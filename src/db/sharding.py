@@ -0,0 +1,623 @@
+"""
+Per-experiment sharding of the PAH database: a catalog database holds the experiment table (and the registry of the
+shards), every experiment has its own shard database with its participant, measurement, datapoint (or waveform)
+and aggregate tables, e.g.:
+    data/PAH_catalog.db
+    data/shards/experiment_1.db
+    data/shards/experiment_2.db
+
+Use a sharded database for the process with (instead of configure_connections(db_path)):
+    configure_connections('data/PAH_catalog.db', shard_dir='data/shards')
+Split an existing database into a catalog and shards, from the src folder:
+    python -m db.sharding ../data/PAH_database.db --catalog ../data/PAH_catalog.db --shard-dir ../data/shards
+
+Routing: the public methods of the repositories decorated with route_to_shards run in the experiment scope of their
+arguments (exp_id, the participant/measurement/datapoint objects or the database IDs), in which get_connection and
+get_read_connection return the writer and read connections of the experiment's shard; experiment_scope sets the
+scope explicitly (e.g. for the transaction of an ingestion). Every shard has its own file, WAL, writer and read pool,
+so an upload to one experiment never blocks the reads of (or an upload to) another one. The connections of a shard
+ATTACH the catalog read-only, so the queries joining the experiment table run unchanged.
+Outside of an experiment scope the connections are the ones of the catalog, its read connections have empty TEMP
+tables in place of the shard tables (as has an experiment without a shard, so its queries return no rows).
+Cross-experiment queries (e.g. the identity map, get_participants_by_exp_name) run once per shard, see shard_scopes;
+the shards are never attached to each other, so their number is not limited by SQLITE_MAX_ATTACHED.
+
+IDs: the shard of experiment e hands out the participant, measurement and datapoint IDs from e << SHARD_ID_BITS on
+(AUTOINCREMENT), so the IDs are unique across the shards and the experiment of an ID is id >> SHARD_ID_BITS.
+"""
+import argparse
+import functools
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager, nullcontext
+from sqlite3 import Connection
+from typing import Iterable, Iterator
+from urllib.parse import quote
+import numpy as np
+from db.connection import ConnectionManager, get_connection, get_connection_manager, get_read_connection
+from db.instrumentation import InstrumentedConnection
+from db.schema import (EXPERIMENT_TABLE_DDL, PARTICIPANT_TABLE_DDL, MEASUREMENT_TABLE_DDL, DATAPOINT_TABLE_DDL,
+                       WAVEFORM_TABLE_DDL, AGGREGATE_TABLE_DDL, LAYOUT_ROWS, LAYOUT_WAVEFORM, apply_indexes,
+                       create_aggregate_tables, get_datapoint_layout, has_aggregate_tables)
+
+DEFAULT_CATALOG_PATH = 'data/PAH_catalog.db'
+DEFAULT_SHARD_DIR = 'data/shards'
+
+# the IDs of the shard of experiment e start at e << SHARD_ID_BITS (2**40 IDs per table and experiment)
+SHARD_ID_BITS = 40
+
+# catalog tables: the storage layout of all shards (one row) and the shard file of every experiment with data
+SHARD_CONFIG_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS shard_config (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        layout TEXT NOT NULL
+    )
+"""
+
+SHARD_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS shard (
+        experiment_id INTEGER PRIMARY KEY REFERENCES experiment(id),
+        file TEXT NOT NULL
+    )
+"""
+
+# tables with an ID of a shard, in the order they are copied by split_database
+_ID_TABLES = ("participant", "measurement", "datapoint", "waveform")
+
+# columns holding the ID of a shard table (offset by split_database)
+_ID_COLUMNS = {
+    "participant": ("id",),
+    "measurement": ("id", "participant_id"),
+    "datapoint": ("id", "measurement_id"),
+    "waveform": ("id", "measurement_id"),
+    "stroke_summary": ("measurement_id",),
+    "waveform_summary": ("measurement_id",),
+    "aggregate_stale": ("measurement_id",),
+}
+
+# prefixes of the repository methods that write (they must be routed to exactly one shard)
+_SETTER_PREFIXES = ("insert", "update", "refresh")
+
+
+class ShardedConnectionManager:
+    def __init__(self, catalog_path: str = DEFAULT_CATALOG_PATH, shard_dir: str = DEFAULT_SHARD_DIR, pool_size: int = 8,
+                 wal: bool = True, timeout: float = 30.0, read_pool: bool = True):
+        """
+        Initializes the ShardedConnectionManager, the connection manager of a sharded database (see the module
+        docstring) with the interface of db.connection.ConnectionManager: the connections it returns are the ones of
+        the shard of the current experiment scope (one ConnectionManager per shard, opened on first use) or, outside
+        of a scope, the ones of the catalog.
+        A shard is created on the first write to its experiment (the experiment must exist in the catalog).
+
+        Args:
+            catalog_path (str): Path of the catalog database (created if it does not exist, with the row layout).
+            shard_dir (str): Directory of the shard databases.
+            pool_size (int): Number of idle read connections kept open (per shard and for the catalog).
+            wal (bool): Whether the databases are switched to the WAL journal mode.
+            timeout (float): Seconds a connection waits for a lock before raising 'database is locked'.
+            read_pool (bool): Whether reads use the pools of read-only connections.
+        """
+        if catalog_path == ':memory:' or 'mode=memory' in catalog_path:
+            raise ValueError("a sharded database cannot be in memory")
+        self.db_path = catalog_path
+        self.shard_dir = shard_dir
+        self.pool_size = pool_size
+        self.wal = wal
+        self.timeout = timeout
+        self.in_memory = False
+        self.read_pool = read_pool
+        self.catalog = _CatalogConnectionManager(self)
+        self._shards = {}           # experiment ID -> ConnectionManager of its shard
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_writer(self) -> Connection:
+        """
+        Returns the writer connection of the shard of the current experiment scope (created if needed),
+        the writer connection of the catalog outside of a scope.
+        """
+        exp_id = self.current_experiment()
+        if exp_id is None:
+            return self.catalog.get_writer()
+        return self._shard(exp_id, create=True).get_writer()
+
+    def get_read_connection(self) -> Connection:
+        """
+        Returns the read-only connection of the calling thread to the shard of the current experiment scope,
+        to the catalog outside of a scope or if the experiment has no shard yet.
+        """
+        return self._scoped_manager().get_read_connection()
+
+    def release_read_connection(self):
+        """
+        Returns the read connections bound to the calling thread (of the catalog and all shards) to their pools.
+        """
+        for manager in self._managers():
+            manager.release_read_connection()
+
+    @contextmanager
+    def read_connection(self) -> Iterator[Connection]:
+        """
+        Context manager borrowing a read-only connection (see get_read_connection) for the duration of the with-block.
+        """
+        with self._scoped_manager().read_connection() as conn:
+            yield conn
+
+    def interrupt_read_connections(self, thread: threading.Thread):
+        """
+        Aborts the running queries of the read connections bound to a thread, of the catalog and all shards.
+        """
+        for manager in self._managers():
+            manager.interrupt_read_connections(thread)
+
+    def close(self):
+        """
+        Closes the connections of the catalog and all shards.
+        """
+        managers = self._managers()
+        with self._lock:
+            self._shards = {}
+        for manager in managers:
+            manager.close()
+
+    def current_experiment(self) -> int | None:
+        """
+        Returns the experiment of the current scope of the calling thread, None outside of a scope.
+        """
+        scopes = getattr(self._local, "scopes", None)
+        return scopes[-1] if scopes else None
+
+    @contextmanager
+    def experiment_scope(self, exp_id: int | None) -> Iterator[None]:
+        """
+        Context manager routing the connections of the calling thread to the shard of an experiment for the duration
+        of the with-block (scopes nest, exp_id None keeps the current scope).
+        """
+        if exp_id is None:
+            yield
+            return
+        scopes = getattr(self._local, "scopes", None)
+        if scopes is None:
+            scopes = self._local.scopes = []
+        scopes.append(int(exp_id))
+        try:
+            yield
+        finally:
+            scopes.pop()
+
+    def shard_path(self, exp_id: int) -> str | None:
+        """
+        Returns the path of the shard of an experiment, None if the experiment has no shard.
+        """
+        row = self.catalog.get_writer().execute("SELECT file FROM shard WHERE experiment_id = ?", (exp_id,)).fetchone()
+        return os.path.join(self.shard_dir, row[0]) if row else None
+
+    def shard_experiments(self, exp_ids: Iterable[int] | None = None) -> list[int]:
+        """
+        Returns the experiments that have a shard (of exp_ids, all experiments if None), in the order of their IDs.
+        """
+        with self.catalog.read_connection() as conn:
+            experiments = [row[0] for row in conn.execute("SELECT experiment_id FROM shard ORDER BY experiment_id")]
+        if exp_ids is None:
+            return experiments
+        exp_ids = {int(exp_id) for exp_id in exp_ids}
+        return [exp_id for exp_id in experiments if exp_id in exp_ids]
+
+    def _scoped_manager(self) -> ConnectionManager:
+        exp_id = self.current_experiment()
+        if exp_id is None:
+            return self.catalog
+        return self._shard(exp_id, create=False) or self.catalog
+
+    def _shard(self, exp_id: int, create: bool) -> ConnectionManager | None:
+        """
+        Returns the connection manager of the shard of an experiment, None if it has no shard (and create is False).
+
+        Raises:
+            ValueError: If a shard is created for an experiment that does not exist in the catalog.
+        """
+        manager = self._shards.get(exp_id)
+        if manager is not None:
+            return manager
+        with self._lock:
+            manager = self._shards.get(exp_id)
+            if manager is None:
+                path = self.shard_path(exp_id)
+                if path is None:
+                    if not create:
+                        return None
+                    path = create_shard(self.db_path, self.shard_dir, exp_id)
+                manager = _ShardConnectionManager(path, self.db_path, pool_size=self.pool_size, wal=self.wal,
+                                                  timeout=self.timeout, read_pool=self.read_pool)
+                self._shards[exp_id] = manager
+        return manager
+
+    def _managers(self) -> list[ConnectionManager]:
+        with self._lock:
+            return [self.catalog, *self._shards.values()]
+
+
+class _CatalogConnectionManager(ConnectionManager):
+    """
+    Connections of the catalog: the writer creates the catalog tables, the read connections have empty TEMP tables
+    of the shard tables (the queries of an experiment without a shard return no rows).
+    """
+    def __init__(self, sharded: ShardedConnectionManager):
+        super().__init__(sharded.db_path, pool_size=sharded.pool_size, wal=sharded.wal, timeout=sharded.timeout,
+                         read_pool=sharded.read_pool)
+
+    def _open_writer(self) -> Connection:
+        conn = super()._open_writer()
+        create_catalog(conn)
+        if not self.read_pool:
+            _create_empty_shard_tables(conn)        # the reads go through the writer
+        return conn
+
+    def _open_read_connection(self) -> Connection:
+        conn = super()._open_read_connection()
+        _create_empty_shard_tables(conn)
+        return conn
+
+
+class _ShardConnectionManager(ConnectionManager):
+    """
+    Connections of a shard, the catalog is attached (read-only) to all of them as 'catalog'.
+    """
+    def __init__(self, db_path: str, catalog_path: str, **options):
+        super().__init__(db_path, **options)
+        self.catalog_path = catalog_path
+
+    def _open_writer(self) -> Connection:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.db_path))}", uri=True, check_same_thread=False,
+                               timeout=self.timeout, factory=InstrumentedConnection)
+        if self.wal:
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("ATTACH DATABASE ? AS catalog", (_read_only_uri(self.catalog_path),))
+        return conn
+
+    def _open_read_connection(self) -> Connection:
+        conn = super()._open_read_connection()
+        conn.execute("ATTACH DATABASE ? AS catalog", (_read_only_uri(self.catalog_path),))
+        return conn
+
+
+# region Routing
+def experiment_scope(exp_id: int | None):
+    """
+    Context manager routing the connections of the calling thread to the shard of an experiment, e.g. for a transaction
+    spanning several repository calls:
+        with experiment_scope(exp_id):
+            ...
+            get_connection().commit()
+    Does nothing if the database of db.connection is not sharded.
+    """
+    manager = get_connection_manager()
+    if isinstance(manager, ShardedConnectionManager):
+        return manager.experiment_scope(exp_id)
+    return nullcontext()
+
+def get_experiment_connection(exp_id: int) -> Connection:
+    """
+    Returns the writer connection of the shard of an experiment (the writer connection if the database is not sharded).
+    """
+    with experiment_scope(exp_id):
+        return get_connection()
+
+def get_catalog_read_connection() -> Connection:
+    """
+    Returns the read-only connection of the calling thread to the catalog regardless of the experiment scope, e.g. for
+    lookups in the experiment table (the read connection if the database is not sharded).
+    """
+    manager = get_connection_manager()
+    if isinstance(manager, ShardedConnectionManager):
+        return manager.catalog.get_read_connection()
+    return manager.get_read_connection()
+
+def shard_scopes(exp_ids: Iterable[int] | None = None) -> Iterator[int | None]:
+    """
+    Runs a cross-experiment query once per shard: yields the experiment of every shard (of exp_ids, all shards if None)
+    inside its experiment scope, e.g.:
+        for exp_id in shard_scopes():
+            rows += get_read_connection().execute(...).fetchall()
+    Yields None once (without a scope) if the database of db.connection is not sharded, i.e. the query runs once
+    over all experiments.
+    """
+    manager = get_connection_manager()
+    if not isinstance(manager, ShardedConnectionManager):
+        yield None
+        return
+    for exp_id in manager.shard_experiments(exp_ids):
+        with manager.experiment_scope(exp_id):
+            yield exp_id
+
+def query_shards(query: str, params: tuple = (), exp_ids: Iterable[int] | None = None) -> tuple[list[tuple], list[str]]:
+    """
+    Runs a read query once per shard (see shard_scopes) and returns the rows of all shards and the column names.
+
+    Args:
+        query (str): The SQL query.
+        params (tuple): The parameters of the query.
+        exp_ids (Iterable[int] | None): The experiments whose shards are queried; if None, the shard of the current
+                                        experiment scope (e.g. of a repository method routed by a database ID)
+                                        or all shards outside of a scope.
+
+    Returns:
+        tuple[list[tuple], list[str]]: The rows and the column names.
+    """
+    manager = get_connection_manager()
+    if exp_ids is None and isinstance(manager, ShardedConnectionManager) and manager.current_experiment() is not None:
+        exp_ids = [manager.current_experiment()]
+    rows, cursor = [], None
+    for _ in shard_scopes(exp_ids):
+        cursor = get_read_connection().execute(query, params)
+        rows += cursor.fetchall()
+    if cursor is None:
+        cursor = get_read_connection().execute(query, params)      # no shard: the empty tables of the catalog
+    return rows, [desc[0] for desc in cursor.description]
+
+def shard_of_id(db_id: int) -> int:
+    """
+    Returns the experiment (shard) of a participant, measurement or datapoint ID of a sharded database.
+    """
+    return int(db_id) >> SHARD_ID_BITS
+
+def route_to_shards(cls):
+    """
+    Class decorator running the public methods of a repository in the experiment scope of their arguments, if the
+    database of db.connection is sharded: exp_id/experiment_id, else the experiments of participant(s) (experiment_id),
+    measurement(s) (participant_id), datapoint(s)/batch/rows (measurement_id) and of the database IDs
+    (participant_id, measurement_id(s), datapoint_id). Methods whose arguments do not identify an experiment keep the
+    current scope, iterators returned by a method run every step in its scope.
+
+    Raises (when a method is called):
+        ValueError: If a setter (insert_*, update_*, refresh_*) writes to several experiments or to none
+                    (outside of an experiment scope).
+    """
+    for name, method in inspect.getmembers(cls, inspect.isfunction):
+        if not name.startswith("_"):
+            setattr(cls, name, _route_method(f"{cls.__name__}.{name}", method))
+    return cls
+
+def _route_method(name: str, method):
+    signature = inspect.signature(method)
+    setter = name.split(".")[-1].startswith(_SETTER_PREFIXES)
+
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        manager = get_connection_manager()
+        if not isinstance(manager, ShardedConnectionManager):
+            return method(*args, **kwargs)
+        experiments = _experiments_of(signature.bind(*args, **kwargs).arguments)
+        exp_id = experiments.pop() if len(experiments) == 1 else None
+        if setter and exp_id is None and (experiments or manager.current_experiment() is None):
+            raise ValueError(f"{name} must write to exactly one experiment of the sharded database, "
+                             f"got {len(experiments) or 'none'} (use db.sharding.experiment_scope)")
+        with manager.experiment_scope(exp_id):
+            result = method(*args, **kwargs)
+        if inspect.isgenerator(result):
+            return _route_generator(manager, manager.current_experiment() if exp_id is None else exp_id, result)
+        return result
+    return call
+
+def _route_generator(manager: ShardedConnectionManager, exp_id: int | None, generator):
+    try:
+        while True:
+            with manager.experiment_scope(exp_id):
+                try:
+                    chunk = next(generator)
+                except StopIteration:
+                    return
+            yield chunk
+    finally:
+        generator.close()
+
+def _experiments_of(arguments: dict) -> set[int]:
+    """
+    Returns the experiments identified by the arguments of a repository method (see route_to_shards).
+    """
+    for name in ("exp_id", "experiment_id"):
+        if arguments.get(name) is not None:
+            return {int(arguments[name])}
+    experiments = set()
+    for name, value in arguments.items():
+        if value is not None and name in _ROUTING_ARGUMENTS:
+            experiments.update(_ROUTING_ARGUMENTS[name](value))
+    return experiments
+
+def _datapoint_experiments(datapoints) -> set[int]:
+    if isinstance(getattr(datapoints, "measurement_id", None), np.ndarray):       # DatapointBatch
+        return set(np.unique(datapoints.measurement_id >> SHARD_ID_BITS).tolist())
+    return {shard_of_id(datapoint.measurement_id) for datapoint in datapoints}
+
+def _id_experiments(db_id) -> set[int]:
+    # participant_id is the database ID of a participant or its name (e.g. 'P001', routed by exp_id)
+    return {shard_of_id(db_id)} if isinstance(db_id, (int, np.integer)) else set()
+
+# arguments of the repository methods identifying experiments (besides exp_id/experiment_id), name -> experiments
+_ROUTING_ARGUMENTS = {
+    "participant": lambda participant: {participant.experiment_id},
+    "participants": lambda participants: {participant.experiment_id for participant in participants},
+    "measurement": lambda measurement: {shard_of_id(measurement.participant_id)},
+    "measurements": lambda measurements: {shard_of_id(measurement.participant_id) for measurement in measurements},
+    "datapoint": lambda datapoint: {shard_of_id(datapoint.measurement_id)},
+    "datapoints": _datapoint_experiments,
+    "batch": _datapoint_experiments,
+    "rows": lambda rows: {shard_of_id(row[0]) for row in rows},
+    "participant_id": _id_experiments,
+    "measurement_id": _id_experiments,
+    "datapoint_id": _id_experiments,
+    "measurement_ids": lambda ids: {shard_of_id(db_id) for db_id in ids},
+}
+# endregion Routing
+
+
+# region Catalog and shards
+def create_catalog(conn: Connection, layout: str = LAYOUT_ROWS):
+    """
+    Creates the tables of a catalog (experiment, shard_config, shard) that do not exist yet; the layout is the storage
+    layout of the shards of a new catalog (an existing catalog keeps its layout).
+
+    Args:
+        conn (Connection): The connection to the catalog database.
+        layout (str): LAYOUT_ROWS or LAYOUT_WAVEFORM.
+    """
+    cursor = conn.cursor()
+    for ddl in (EXPERIMENT_TABLE_DDL, SHARD_CONFIG_TABLE_DDL, SHARD_TABLE_DDL):
+        cursor.execute(ddl)
+    cursor.execute("INSERT OR IGNORE INTO shard_config (id, layout) VALUES (1, ?)", (layout,))
+    conn.commit()
+    apply_indexes(conn)
+
+def create_shard(catalog_path: str, shard_dir: str, exp_id: int) -> str:
+    """
+    Creates the shard database of an experiment (in the layout of the catalog) and registers it in the catalog.
+
+    Args:
+        catalog_path (str): Path of the catalog database.
+        shard_dir (str): Directory of the shard databases.
+        exp_id (int): The ID of the experiment.
+
+    Returns:
+        str: The path of the shard.
+
+    Raises:
+        ValueError: If the experiment does not exist in the catalog.
+    """
+    with closing(sqlite3.connect(catalog_path, timeout=30.0)) as catalog:
+        if catalog.execute("SELECT 1 FROM experiment WHERE id = ?", (exp_id,)).fetchone() is None:
+            raise ValueError(f"experiment {exp_id} does not exist in the catalog {catalog_path}")
+        row = catalog.execute("SELECT file FROM shard WHERE experiment_id = ?", (exp_id,)).fetchone()
+        file = row[0] if row else f"experiment_{exp_id}.db"
+        os.makedirs(shard_dir, exist_ok=True)
+        with closing(sqlite3.connect(os.path.join(shard_dir, file), timeout=30.0)) as shard:
+            create_shard_schema(shard, exp_id, get_datapoint_layout(catalog))
+            apply_indexes(shard)
+        catalog.execute("INSERT OR IGNORE INTO shard (experiment_id, file) VALUES (?, ?)", (exp_id, file))
+        catalog.commit()
+    return os.path.join(shard_dir, file)
+
+def create_shard_schema(conn: Connection, exp_id: int, layout: str = LAYOUT_ROWS):
+    """
+    Creates the tables of a shard that do not exist yet (without the indexes, see db.schema.apply_indexes):
+    participant, measurement, datapoint or waveform (depending on the layout) with AUTOINCREMENT IDs starting at
+    exp_id << SHARD_ID_BITS, and the aggregate tables.
+
+    Args:
+        conn (Connection): The connection to the shard database.
+        exp_id (int): The ID of the experiment of the shard.
+        layout (str): LAYOUT_ROWS or LAYOUT_WAVEFORM.
+    """
+    cursor = conn.cursor()
+    for ddl in _shard_table_ddl(layout)[:3]:
+        cursor.execute(ddl.replace("id INTEGER PRIMARY KEY,", "id INTEGER PRIMARY KEY AUTOINCREMENT,", 1))
+    create_aggregate_tables(conn, commit=False)
+    first_id = exp_id << SHARD_ID_BITS
+    for table in _shard_tables(layout)[:3]:
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                       "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)", (table, first_id, table))
+    conn.commit()
+
+def split_database(db_path: str, catalog_path: str, shard_dir: str) -> list[tuple[int, str, int]]:
+    """
+    Splits a (non-sharded) database into a new catalog and one shard per experiment; the IDs of every shard are offset
+    by exp_id << SHARD_ID_BITS (the source database is not changed).
+
+    Args:
+        db_path (str): Path of the database to split.
+        catalog_path (str): Path of the new catalog database.
+        shard_dir (str): Directory of the shard databases.
+
+    Returns:
+        list[tuple[int, str, int]]: (experiment ID, shard path, number of measurements) per experiment.
+
+    Raises:
+        ValueError: If the catalog exists already.
+    """
+    if os.path.exists(catalog_path):
+        raise ValueError(f"the catalog {catalog_path} exists already")
+    with closing(sqlite3.connect(db_path)) as source:
+        layout = get_datapoint_layout(source)
+        aggregates = has_aggregate_tables(source)
+        experiments = source.execute("SELECT id, name, data_state, data_folder, upload_complete "
+                                     "FROM experiment ORDER BY id").fetchall()
+    with closing(sqlite3.connect(catalog_path)) as catalog:
+        create_catalog(catalog, layout)
+        if experiments:
+            catalog.executemany("INSERT INTO experiment (id, name, data_state, data_folder, upload_complete) "
+                                "VALUES (?, ?, ?, ?, ?)", experiments)
+        catalog.commit()
+
+    tables = [table for table in _ID_TABLES if table in _shard_tables(layout)]
+    if aggregates:
+        tables += ["stroke_summary", "waveform_summary", "aggregate_stale"]
+    shards = []
+    for experiment in experiments:
+        exp_id = experiment[0]
+        path = create_shard(catalog_path, shard_dir, exp_id)
+        with closing(sqlite3.connect(path)) as shard:
+            shard.execute("ATTACH DATABASE ? AS source", (_read_only_uri(db_path),))
+            for table in tables:
+                _copy_shard_rows(shard, table, exp_id)
+            shard.commit()
+            shard.execute("DETACH DATABASE source")
+            shard.execute("PRAGMA optimize")
+            shards.append((exp_id, path, shard.execute("SELECT COUNT(*) FROM measurement").fetchone()[0]))
+    return shards
+
+def _copy_shard_rows(shard: Connection, table: str, exp_id: int):
+    """
+    Copies the rows of a table belonging to an experiment from the attached source database into a shard,
+    with the IDs offset by exp_id << SHARD_ID_BITS.
+    """
+    columns = [row[1] for row in shard.execute(f"PRAGMA source.table_info({table})")]
+    offset = exp_id << SHARD_ID_BITS
+    selected = ", ".join(f"{column} + {offset}" if column in _ID_COLUMNS[table] else column for column in columns)
+    if table == "participant":
+        where = "experiment_id = ?"
+    elif table == "measurement":
+        where = "participant_id IN (SELECT id FROM source.participant WHERE experiment_id = ?)"
+    else:
+        where = ("measurement_id IN (SELECT measurement.id FROM source.measurement JOIN source.participant "
+                 "ON measurement.participant_id = participant.id WHERE participant.experiment_id = ?)")
+    shard.execute(f"INSERT INTO main.{table} ({', '.join(columns)}) SELECT {selected} FROM source.{table} WHERE {where}",
+                  (exp_id,))
+
+def _shard_tables(layout: str) -> tuple[str, ...]:
+    return ("participant", "measurement", "waveform" if layout == LAYOUT_WAVEFORM else "datapoint",
+            "stroke_summary", "waveform_summary", "aggregate_stale")
+
+def _shard_table_ddl(layout: str) -> list[str]:
+    return [PARTICIPANT_TABLE_DDL, MEASUREMENT_TABLE_DDL,
+            WAVEFORM_TABLE_DDL if layout == LAYOUT_WAVEFORM else DATAPOINT_TABLE_DDL, *AGGREGATE_TABLE_DDL]
+
+def _create_empty_shard_tables(conn: Connection):
+    """
+    Creates empty TEMP tables of the shard tables (in the layout of the catalog) on a catalog connection.
+    """
+    for ddl in _shard_table_ddl(get_datapoint_layout(conn)):
+        conn.execute(ddl.replace("CREATE TABLE", "CREATE TEMP TABLE", 1))
+
+def _read_only_uri(path: str) -> str:
+    return f"file:{quote(os.path.abspath(path))}?mode=ro"
+# endregion Catalog and shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="path of the database to split")
+    parser.add_argument("--catalog", default="../" + DEFAULT_CATALOG_PATH, help="path of the new catalog database")
+    parser.add_argument("--shard-dir", default="../" + DEFAULT_SHARD_DIR, help="directory of the shard databases")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    shards = split_database(args.db, args.catalog, args.shard_dir)
+    for exp_id, path, n_measurements in shards:
+        print(f"experiment {exp_id}: {n_measurements} measurements -> {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
+    print(f"{len(shards)} shards written in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Generator of synthetic PAH databases (schema of db/schema.py) of configurable scale, for benchmarks and tests
+without the real data.
+
+One experiment ('synthetic', 'clean', upload complete) with N participants (random instrument and PRMD flags),
+timepoints pre/post, M mocap targets x axes X/Y/Z (unit degree) plus E EMG targets (axis None, unit mV),
+S bow strokes per measurement (alternating up/down) and 101 time points per stroke. The waveforms are smooth
+curves with noise, shifted per participant depending on PRMD_ever (so PCA/LDA find some structure).
+With --raw the experiment has data_state 'raw' and every bow stroke has its own number of samples
+(RAW_STROKE_LENGTHS, time points 0..n-1), like the recordings before time normalization.
+
+Run from the src folder, e.g.:
+    python -m db.synthetic_database ../data/synthetic.db --participants 20 --targets 6 --strokes 30
+"""
+import argparse
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, asdict
+import numpy as np
+from db.schema import LAYOUT_ROWS, LAYOUT_WAVEFORM, create_schema, pack_waveform
+
+TIMEPOINTS = ("pre", "post")
+AXES = ("X", "Y", "Z")
+N_TIME_POINTS = 101
+RAW_STROKE_LENGTHS = (60, 240)      # range of the number of samples per bow stroke of raw experiments
+INSTRUMENTS = ("violin", "viola", "cello")
+
+@dataclass
+class SyntheticScale:
+    participants: int = 10
+    targets: int = 4                # mocap targets (x 3 axes)
+    emg_targets: int = 2
+    strokes: int = 20
+    seed: int = 0
+
+    @property
+    def n_measurements(self) -> int:
+        return self.participants * len(TIMEPOINTS) * (self.targets * len(AXES) + self.emg_targets)
+
+    @property
+    def n_datapoints(self) -> int:
+        return self.n_measurements * self.strokes * N_TIME_POINTS
+
+    def target_names(self) -> list[str]:
+        return [f"target {i + 1} joint angle" for i in range(self.targets)]
+
+    def emg_target_names(self) -> list[str]:
+        return [f"muscle {i + 1}" for i in range(self.emg_targets)]
+
+
+def generate_database(db_path: str, scale: SyntheticScale = SyntheticScale(), layout: str = LAYOUT_ROWS,
+                      data_state: str = "clean") -> int:
+    """
+    Creates a synthetic database (see the module docstring), an existing file is replaced.
+
+    Args:
+        db_path (str): Path of the database file.
+        scale (SyntheticScale): The number of participants, targets and strokes, and the random seed.
+        layout (str): The storage layout of the datapoint values (LAYOUT_ROWS or LAYOUT_WAVEFORM).
+        data_state (str): 'clean' (101 time points per bow stroke) or 'raw' (variable number of samples per bow stroke).
+
+    Returns:
+        int: The number of datapoints generated.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    rng = np.random.default_rng(scale.seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    create_schema(conn, layout)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO experiment (name, data_state, data_folder, upload_complete) VALUES (?, ?, ?, ?)",
+                   ("synthetic", data_state, f"synthetic/{data_state}", 1))
+    exp_id = cursor.lastrowid
+
+    channels = ([("mocap", target, axis, "degree") for target in scale.target_names() for axis in AXES]
+                + [("emg", target, None, "mV") for target in scale.emg_target_names()])
+    time_axis = np.linspace(0, 2 * np.pi, N_TIME_POINTS)
+    stroke_numbers = np.arange(1, scale.strokes + 1)
+    n_datapoints = 0
+    for p in range(1, scale.participants + 1):
+        regions = rng.random(4) < 0.2           # PRMD per region, PRMD_ever is set for about 60% of the participants
+        cursor.execute("""
+            INSERT INTO participant (experiment_id, participant_id, instrument, PRMD_shoulder_neck_right,
+            PRMD_shoulder_neck_left, PRMD_upper_arm_right, PRMD_upper_arm_left, PRMD_ever)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (exp_id, f"P{p:03d}", INSTRUMENTS[p % len(INSTRUMENTS)], *map(int, regions), int(regions.any())))
+        participant_db_id = cursor.lastrowid
+        shift = 0.3 * regions.any() + 0.1 * rng.standard_normal()
+        for timepoint in TIMEPOINTS:
+            for channel, (device, target, axis, unit) in enumerate(channels):
+                cursor.execute("""
+                    INSERT INTO measurement (participant_id, timepoint, device, target, axis, unit)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (participant_db_id, timepoint, device, target, axis, unit))
+                measurement_id = cursor.lastrowid
+                # one waveform per stroke (strokes x time points if clean)
+                amplitude = 20.0 if device == "mocap" else 0.5
+                if data_state == "raw":
+                    lengths = rng.integers(*RAW_STROKE_LENGTHS, size=scale.strokes, endpoint=True)
+                    values = [amplitude * np.sin(np.linspace(0, 2 * np.pi, n) + channel + shift)
+                              + 0.05 * amplitude * rng.standard_normal(n) for n in lengths]
+                else:
+                    values = (amplitude * np.sin(time_axis[None, :] + channel + shift)
+                              + 0.05 * amplitude * rng.standard_normal((scale.strokes, N_TIME_POINTS)))
+                up_down = stroke_numbers % 2
+                if layout == LAYOUT_WAVEFORM:
+                    cursor.executemany("""
+                        INSERT INTO waveform (measurement_id, bow_stroke, up_down, key, first_time_point, samples)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, ((measurement_id, int(s), int(u), str(s), 0, pack_waveform(v))
+                          for s, u, v in zip(stroke_numbers, up_down, values)))
+                else:
+                    cursor.executemany("""
+                        INSERT INTO datapoint (measurement_id, bow_stroke, up_down, key, time_point, value)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, ((measurement_id, int(s), int(u), str(s), t, float(v))
+                          for s, u, stroke_values in zip(stroke_numbers, up_down, values)
+                          for t, v in enumerate(stroke_values)))
+                n_datapoints += sum(len(v) for v in values)
+    # the aggregate tables are filled by the first DatapointRepository.refresh_aggregates (or python -m db.aggregates)
+    cursor.execute("INSERT INTO aggregate_stale (measurement_id) SELECT id FROM measurement")
+    conn.commit()
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return n_datapoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="path of the database file (replaced if it exists)")
+    parser.add_argument("--participants", type=int, default=SyntheticScale.participants)
+    parser.add_argument("--targets", type=int, default=SyntheticScale.targets, help="mocap targets (x 3 axes)")
+    parser.add_argument("--emg-targets", type=int, default=SyntheticScale.emg_targets)
+    parser.add_argument("--strokes", type=int, default=SyntheticScale.strokes)
+    parser.add_argument("--seed", type=int, default=SyntheticScale.seed)
+    parser.add_argument("--layout", choices=[LAYOUT_ROWS, LAYOUT_WAVEFORM], default=LAYOUT_ROWS)
+    parser.add_argument("--raw", action="store_true", help="variable number of samples per bow stroke (data_state 'raw')")
+    args = parser.parse_args()
+
+    scale = SyntheticScale(participants=args.participants, targets=args.targets, emg_targets=args.emg_targets,
+                           strokes=args.strokes, seed=args.seed)
+    start = time.perf_counter()
+    n_datapoints = generate_database(args.db, scale, args.layout, "raw" if args.raw else "clean")
+    print(f"{args.db}: {asdict(scale)}, {n_datapoints} datapoints, {os.path.getsize(args.db) / 2**20:.1f} MB "
+          f"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
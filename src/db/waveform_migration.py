@@ -0,0 +1,134 @@
+"""
+Migration of a database from the row layout (one datapoint row per time point) to the waveform layout
+(one waveform row per (measurement, bow_stroke), the values packed in a float32 BLOB), see db/schema.py.
+
+Run from the src folder, e.g.:
+    python -m db.waveform_migration ../data/PAH_database.db --output ../data/PAH_database_waveform.db
+
+Reports the file size and the full-experiment load time (DatapointRepository.get_datapoints_by_exp_id)
+before and after the migration. A waveform row has a single key, so a database with strokes whose datapoints have
+differing keys is not migrated (the strokes are reported instead).
+"""
+import argparse
+import os
+import sqlite3
+import time
+from sqlite3 import Connection
+import numpy as np
+from db.connection import get_connection, close_connection
+from db.schema import WAVEFORM_TABLE_DDL, LAYOUT_WAVEFORM, get_datapoint_layout, pack_waveform
+
+
+def migrate_to_waveform_layout(conn: Connection, batch_size: int = 100_000) -> int:
+    """
+    Converts the datapoint table of a database into the waveform table (in place) and drops the datapoint table.
+    The migration is refused (and the database left unchanged) if the datapoints of a stroke have differing keys,
+    the waveform layout stores one key per stroke.
+
+    Args:
+        conn (Connection): The connection to the database that is migrated.
+        batch_size (int): Number of datapoint rows fetched at once.
+
+    Returns:
+        int: The number of waveform rows written.
+
+    Raises:
+        ValueError: If the datapoints of a stroke have differing keys.
+    """
+    if get_datapoint_layout(conn) == LAYOUT_WAVEFORM:
+        return 0
+
+    read_cursor = conn.cursor()
+    write_cursor = conn.cursor()
+    write_cursor.execute("BEGIN")
+    write_cursor.execute(WAVEFORM_TABLE_DDL)
+    read_cursor.execute("""
+        SELECT measurement_id, bow_stroke, up_down, key, time_point, value
+        FROM datapoint
+        ORDER BY measurement_id, bow_stroke, up_down, time_point
+    """)
+
+    n_waveforms = 0
+    stroke, stroke_rows = None, []
+    mixed_key_strokes = []
+    def flush():
+        if any(row[3] != stroke_rows[0][3] for row in stroke_rows):
+            mixed_key_strokes.append(stroke)
+            return
+        first_time_point = stroke_rows[0][4]
+        waveform = np.full(stroke_rows[-1][4] - first_time_point + 1, np.nan)
+        for row in stroke_rows:
+            waveform[row[4] - first_time_point] = np.nan if row[5] is None else row[5]
+        write_cursor.execute("""
+            INSERT INTO waveform (measurement_id, bow_stroke, up_down, key, first_time_point, samples)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (*stroke, stroke_rows[0][3], first_time_point, pack_waveform(waveform)))
+
+    while True:
+        rows = read_cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            if row[:3] != stroke:
+                if stroke_rows:
+                    flush()
+                    n_waveforms += 1
+                stroke, stroke_rows = row[:3], []
+            stroke_rows.append(row)
+    if stroke_rows:
+        flush()
+        n_waveforms += 1
+
+    if mixed_key_strokes:
+        conn.rollback()
+        raise ValueError(f"{len(mixed_key_strokes)} strokes have datapoints with differing keys "
+                         f"(measurement_id, bow_stroke, up_down: {mixed_key_strokes[:5]}), "
+                         "the waveform layout stores one key per stroke")
+    write_cursor.execute("DROP TABLE datapoint")
+    conn.commit()
+    conn.execute("VACUUM")
+    return n_waveforms
+
+
+def _load_times(db_path: str) -> dict[int, float]:
+    """
+    Measures the full-experiment load time (s) of every experiment in a database.
+    """
+    from data_access.datapoint_repository import DatapointRepository
+
+    close_connection()
+    conn = get_connection(db_path)
+    repo = DatapointRepository()
+    load_times = {}
+    for (exp_id,) in conn.execute("SELECT id FROM experiment").fetchall():
+        start = time.perf_counter()
+        repo.get_datapoints_by_exp_id(exp_id)
+        load_times[exp_id] = time.perf_counter() - start
+    close_connection()
+    return load_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="path of the database in the row layout")
+    parser.add_argument("--output", help="path of the migrated database (default: <db>_waveform.db)")
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.db)[0] + "_waveform.db"
+
+    source = sqlite3.connect(args.db)
+    target = sqlite3.connect(output)
+    source.backup(target)
+    source.close()
+    n_waveforms = migrate_to_waveform_layout(target)
+    target.close()
+    print(f"migrated {args.db} -> {output} ({n_waveforms} waveforms)")
+
+    size_before, size_after = os.path.getsize(args.db), os.path.getsize(output)
+    print(f"file size:  {size_before / 1e6:10.1f} MB -> {size_after / 1e6:10.1f} MB ({size_before / size_after:.1f}x)")
+    before, after = _load_times(args.db), _load_times(output)
+    for exp_id in before:
+        print(f"experiment {exp_id} load time: {before[exp_id]:8.3f} s -> {after[exp_id]:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Bulk ingestion of an experiment folder (from Sample_Data_PAH) into the database.
+
+The files are parsed in a process pool while the main process writes participants, measurements and datapoints
+in large batches inside a single transaction (with SQLite PRAGMAs tuned for the load). The experiment is only
+marked as upload complete (ExperimentRepository.experiment_upload_complete) after the whole load has committed.
+
+Expected folder layout (relative to the Sample_Data_PAH root):
+    <data_folder>/
+        participants.csv                            participant_id, instrument, PRMD_shoulder_neck_right,
+                                                    PRMD_shoulder_neck_left, PRMD_upper_arm_right, PRMD_upper_arm_left, PRMD_ever
+        <participant_id>/<timepoint>/<device>/<target>.csv
+                                                    bow_stroke, up_down, time_point, [key], and one value column
+                                                    per axis (e.g. X, Y, Z) or a single 'value' column (e.g. emg)
+Files without the bow_stroke column are continuous recordings: they are segmented into bow strokes in the parser
+processes (ingestion/stroke_segmentation.py, reference: SegmentationParams.reference or the first value column),
+samples outside of the detected strokes are not stored.
+
+Run from the src folder, e.g.:
+    python -m ingestion.bulk_ingestion ../Sample_Data_PAH mpa/clean --name mpa --data-state clean --db ../data/PAH_database.db
+into a sharded database (see db/sharding.py), the experiment is written to its own shard:
+    python -m ingestion.bulk_ingestion ../Sample_Data_PAH mpa/clean --name mpa --db ../data/PAH_catalog.db --shard-dir ../data/shards
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from sqlite3 import Connection
+from typing import Iterator
+import numpy as np
+import pandas as pd
+from db.connection import configure_connections
+from db.sharding import experiment_scope, get_experiment_connection
+from ingestion.stroke_segmentation import SegmentationParams, segment_recording
+from data_access.experiment_repository import ExperimentRepository
+from data_access.participant_repository import ParticipantRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.datapoint_repository import DatapointRepository
+from models.experiment import Experiment
+from models.participant import Participant
+from models.measurement import Measurement
+from models.datapoint_batch import DatapointBatch
+
+# units of the measurement devices (the unit is not part of the source files)
+DEFAULT_UNITS = {"mocap": "degree", "emg": "mV"}
+
+_STROKE_COLUMNS = ("bow_stroke", "up_down", "time_point", "key")
+_PAIN_COLUMNS = ("PRMD_shoulder_neck_right", "PRMD_shoulder_neck_left", "PRMD_upper_arm_right",
+                 "PRMD_upper_arm_left", "PRMD_ever")
+
+@dataclass
+class IngestionReport:
+    exp_id: int
+    n_files: int
+    n_participants: int
+    n_measurements: int
+    n_datapoints: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.n_datapoints / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"experiment {self.exp_id}: {self.n_files} files, {self.n_participants} participants, "
+                f"{self.n_measurements} measurements, {self.n_datapoints} datapoints in {self.seconds:.1f} s "
+                f"({self.rows_per_second:,.0f} rows/s)")
+
+
+def ingest_experiment(sample_data_root: str, data_folder: str, name: str, data_state: str, workers: int | None = None,
+                      batch_size: int = 500_000, units: dict[str, str] = DEFAULT_UNITS,
+                      segmentation: SegmentationParams = SegmentationParams()) -> IngestionReport | None:
+    """
+    Ingests an experiment folder into the database (see the module docstring for the expected folder layout).
+
+    Args:
+        sample_data_root (str): The path of the Sample_Data_PAH folder.
+        data_folder (str): The folder of the experiment, relative to sample_data_root (stored as experiment.data_folder).
+        name (str): The name of the experiment (e.g. 'mpa').
+        data_state (str): The data state of the experiment ('clean' or 'raw').
+        workers (int | None): Number of parser processes (default: number of CPUs).
+        batch_size (int): Number of datapoints written per executemany batch.
+        units (dict[str, str]): The unit of every measurement device.
+        segmentation (SegmentationParams): The bow-stroke segmentation of continuous recordings (files without bow_stroke).
+
+    Returns:
+        IngestionReport | None: The counts and throughput of the load, None if the folder was already uploaded completely.
+    """
+    experiment_repo = ExperimentRepository()
+    participant_repo = ParticipantRepository()
+    measurement_repo = MeasurementRepository()
+    datapoint_repo = DatapointRepository()
+    if data_folder in (experiment_repo.get_complete_data_folders() or []):
+        return None
+
+    start = time.perf_counter()
+    folder = os.path.join(sample_data_root, data_folder)
+    files = _find_measurement_files(folder)
+    exp_id = (experiment_repo.get_experiment_id_by_name_and_data_state(name, data_state)
+              or experiment_repo.insert_experiment(Experiment(id=None, name=name, data_state=data_state)))
+    conn = get_experiment_connection(exp_id)            # the writer of the experiment's shard in a sharded database
+
+    n_measurements, n_datapoints = 0, 0
+    workers = workers or os.cpu_count() or 1
+    with experiment_scope(exp_id), _bulk_load_settings(conn), ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            participants = _read_participants(folder, exp_id, {f[0] for f in files})
+            participant_ids = participant_repo.insert_many_participants(participants, commit=False)
+            participant_db_id = {p.participant_id: db_id for p, db_id in zip(participants, participant_ids)}
+
+            batches, n_pending = [], 0
+            # the parsed files arrive in order while the pool parses the next ones
+            for (participant_id, timepoint, device, target, _), parsed in zip(
+                    files, _parse_files(pool, [f[4] for f in files], segmentation, window=2 * workers)):
+                measurements = [Measurement(id=None, participant_id=participant_db_id[participant_id], timepoint=timepoint,
+                                            device=device, target=target, axis=axis, unit=units.get(device))
+                                for axis in parsed["values"]]
+                measurement_ids = measurement_repo.insert_many_measurements(measurements, commit=False)
+                n_measurements += len(measurement_ids)
+                for measurement_id, values in zip(measurement_ids, parsed["values"].values()):
+                    batches.append(DatapointBatch(measurement_id=measurement_id, bow_stroke=parsed["bow_stroke"],
+                                                  up_down=parsed["up_down"], key=parsed["key"],
+                                                  time_point=parsed["time_point"], value=values))
+                    n_pending += len(values)
+                    if n_pending >= batch_size:
+                        datapoint_repo.insert_datapoint_batch(DatapointBatch.concatenate(batches), commit=False)
+                        n_datapoints += n_pending
+                        batches, n_pending = [], 0
+            if batches:
+                datapoint_repo.insert_datapoint_batch(DatapointBatch.concatenate(batches), commit=False)
+                n_datapoints += n_pending
+            datapoint_repo.refresh_aggregates(commit=False)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    experiment_repo.experiment_upload_complete(data_folder, exp_id)
+    return IngestionReport(exp_id=exp_id, n_files=len(files), n_participants=len(participants),
+                           n_measurements=n_measurements, n_datapoints=n_datapoints, seconds=time.perf_counter() - start)
+
+
+@contextmanager
+def _bulk_load_settings(conn: Connection):
+    """
+    Tunes the SQLite PRAGMAs for a bulk load (WAL journal, no fsync per transaction, large page cache)
+    and restores the synchronous/cache settings afterwards.
+    """
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+    conn.commit()
+    conn.execute("PRAGMA main.journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")          # 256 MB
+    conn.execute("PRAGMA temp_store = MEMORY")
+    try:
+        yield
+    finally:
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.execute(f"PRAGMA cache_size = {cache_size}")
+        conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")     # not the attached catalog of a shard
+
+
+def _parse_files(pool: ProcessPoolExecutor, paths: list[str], segmentation: SegmentationParams,
+                 window: int) -> Iterator[dict]:
+    """
+    Parses the measurement files in the pool and yields the results in the order of paths, with at most window files
+    submitted at a time (the parsed files do not pile up in memory when the parsers are faster than the writer).
+    """
+    pending = deque()
+    for path in paths:
+        pending.append(pool.submit(_parse_measurement_file, path, segmentation))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _find_measurement_files(folder: str) -> list[tuple[str, str, str, str, str]]:
+    """
+    Finds the measurement files of an experiment folder.
+
+    Returns:
+        list[tuple]: (participant_id, timepoint, device, target, path) per file, sorted.
+    """
+    files = []
+    for root, _, names in os.walk(folder):
+        parts = os.path.relpath(root, folder).split(os.sep)
+        if len(parts) != 3:
+            continue
+        participant_id, timepoint, device = parts
+        for file_name in names:
+            if file_name.endswith(".csv"):
+                files.append((participant_id, timepoint, device, file_name[:-4], os.path.join(root, file_name)))
+    return sorted(files)
+
+
+def _read_participants(folder: str, exp_id: int, participant_ids: set[str]) -> list[Participant]:
+    """
+    Reads the participants (instrument and pain data) from participants.csv, participants that only have a
+    measurement folder are added without pain data.
+    """
+    participants = {}
+    path = os.path.join(folder, "participants.csv")
+    if os.path.exists(path):
+        df = pd.read_csv(path, dtype={"participant_id": str})
+        for row in df.to_dict("records"):
+            pain = {column: _optional_int(row.get(column)) for column in _PAIN_COLUMNS}
+            participants[row["participant_id"]] = Participant(id=None, participant_id=row["participant_id"], experiment_id=exp_id,
+                                                              instrument=row.get("instrument"), **pain)
+    for participant_id in sorted(participant_ids - participants.keys()):
+        participants[participant_id] = Participant(id=None, participant_id=participant_id, experiment_id=exp_id)
+    return list(participants.values())
+
+
+def _optional_int(value) -> int | None:
+    return None if value is None or pd.isna(value) else int(value)
+
+
+def _parse_measurement_file(path: str, segmentation: SegmentationParams = SegmentationParams()) -> dict:
+    """
+    Parses a measurement file (runs in the parser processes), continuous recordings are segmented into bow strokes.
+
+    Returns:
+        dict: NumPy arrays bow_stroke, up_down and time_point, the keys (array, None if the file has no keys) and the
+        values per axis ({axis: array}, axis None for files with a single 'value' column).
+    """
+    df = pd.read_csv(path, dtype={"key": str})
+    value_columns = [column for column in df.columns if column not in _STROKE_COLUMNS]
+    if value_columns == ["value"]:
+        values = {None: df["value"].to_numpy(np.float64)}
+    else:
+        values = {column: df[column].to_numpy(np.float64) for column in value_columns}
+    if "bow_stroke" not in df.columns:
+        reference = values[segmentation.reference if segmentation.reference in values else next(iter(values))]
+        segments = segment_recording(reference, segmentation)
+        index = segments.sample_index()
+        labels = segments.sample_labels()
+        return {
+            "bow_stroke": labels["bow_stroke"],
+            "up_down": labels["up_down"],
+            "time_point": labels["time_point"],
+            "key": None,
+            "values": {axis: axis_values[index] for axis, axis_values in values.items()},
+        }
+    return {
+        "bow_stroke": df["bow_stroke"].to_numpy(np.int64),
+        "up_down": df["up_down"].to_numpy(np.int64),
+        "time_point": df["time_point"].to_numpy(np.int64),
+        "key": _key_column(df["key"]) if "key" in df.columns else None,
+        "values": values,
+    }
+
+
+def _key_column(keys: pd.Series) -> np.ndarray:
+    """
+    Returns the key column as strings, missing keys as None (stored as NULL instead of 'nan').
+    """
+    missing = keys.isna().to_numpy()
+    keys = keys.astype(str).to_numpy(object)
+    keys[missing] = None
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sample_data_root", help="path of the Sample_Data_PAH folder")
+    parser.add_argument("data_folder", help="experiment folder, relative to sample_data_root")
+    parser.add_argument("--name", required=True, help="name of the experiment (e.g. 'mpa')")
+    parser.add_argument("--data-state", default="clean", help="'clean' or 'raw'")
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--shard-dir", default=None, help="shard directory of a sharded database (--db is its catalog)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    configure_connections(args.db, shard_dir=args.shard_dir)
+    report = ingest_experiment(args.sample_data_root, args.data_folder, args.name.lower(), args.data_state, args.workers)
+    print(report if report else f"{args.data_folder} is already uploaded completely")
+
+
+if __name__ == "__main__":
+    main()
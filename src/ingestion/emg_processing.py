@@ -0,0 +1,308 @@
+"""
+EMG processing of 'raw' experiments: the EMG measurements (device 'emg', target = muscle) are
+    1. band-pass filtered (zero-phase Butterworth, removes movement artefacts and high-frequency noise)
+    2. full-wave rectified
+    3. low-pass filtered to the linear envelope (zero-phase Butterworth)
+    4. amplitude normalized, in percent of the peak of the envelope of the measurement
+    5. time normalized, every bow stroke is resampled to 101 time points (ingestion/time_normalization.py)
+and written as a new experiment (same name and participants) with its own data_state (default 'emg_envelope'),
+so the processed data is selected like any other experiment, e.g.
+ExperimentRepository.get_experiment_id_by_name_and_data_state('mpa', 'emg_envelope').
+
+The signals are processed as stacked 2-D arrays (measurements x samples, the strokes of a measurement concatenated
+in time, every row extended at its own ends), every filter runs along the sample axis of the whole block at once. The measurements of an experiment are read per timepoint and muscle, and split into blocks of
+at most `block_samples` samples to cap the memory. The blocks are filtered in a process pool while the main process
+reads the next timepoint and muscle and writes the results, in one transaction like the bulk ingestion; the
+experiment is marked as upload complete (data folder '<raw data folder>/<data_state>') after it has committed.
+
+Run from the src folder, e.g.:
+    python -m ingestion.emg_processing --db ../data/PAH_database.db --exp-id 2 --sample-rate 2000
+"""
+import argparse
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+from scipy.signal import butter, sosfiltfilt
+from db.connection import get_connection
+from db.sharding import experiment_scope, get_experiment_connection
+from data_access.experiment_repository import ExperimentRepository
+from data_access.participant_repository import ParticipantRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.datapoint_repository import DatapointRepository
+from ingestion.bulk_ingestion import _bulk_load_settings
+from ingestion.time_normalization import (N_TIME_POINTS, _copy_participants, _order_strokes, _stroke_batch,
+                                          resample_strokes)
+from models.experiment import Experiment
+from models.measurement import Measurement
+from models.datapoint_batch import DatapointBatch
+
+EMG_DEVICE = "emg"
+NORMALIZED_UNIT = "%peak"
+
+@dataclass(frozen=True)
+class EMGParams:
+    sample_rate: float = 2000.0     # sampling frequency of the recordings [Hz]
+    band: tuple[float, float] = (20.0, 450.0)   # pass band of the band-pass filter [Hz]
+    envelope_cutoff: float = 6.0    # cutoff frequency of the low-pass (linear envelope) filter [Hz]
+    order: int = 4                  # order of the Butterworth filters (doubled by the zero-phase filtering)
+    normalize_amplitude: bool = True    # whether the envelope is scaled to percent of its peak (unit '%peak')
+
+@dataclass
+class EMGReport:
+    raw_exp_id: int
+    exp_id: int                     # the processed experiment
+    n_measurements: int
+    n_strokes: int
+    n_samples: int                  # raw samples processed
+    n_datapoints: int               # datapoints written
+    filter_seconds: float           # time spent filtering (worker processes, summed over the blocks)
+    seconds: float                  # total time (reading, filtering, resampling, writing)
+
+    @property
+    def samples_per_second(self) -> float:
+        return self.n_samples / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"experiment {self.raw_exp_id} -> {self.exp_id}: {self.n_measurements} measurements, "
+                f"{self.n_strokes} strokes, {self.n_samples} samples -> {self.n_datapoints} datapoints in "
+                f"{self.seconds:.1f} s ({self.samples_per_second:,.0f} samples/s, filtering {self.filter_seconds:.1f} s)")
+
+
+def envelope_signals(signals: np.ndarray, lengths: np.ndarray, params: EMGParams = EMGParams()) -> np.ndarray:
+    """
+    Computes the linear envelope of stacked EMG signals: band-pass filter, full-wave rectification, low-pass filter
+    and (params.normalize_amplitude) scaling to percent of the peak of every signal, all along axis 1 at once.
+
+    Args:
+        signals (np.ndarray): The signals (signals x samples), rows shorter than the block padded at the end.
+        lengths (np.ndarray): The number of valid samples of every row.
+        params (EMGParams): The filter parameters.
+
+    Returns:
+        np.ndarray: The envelopes (same shape as signals, the values of the padding are not meaningful).
+    """
+    band_pass = butter(params.order, params.band, btype="bandpass", fs=params.sample_rate, output="sos")
+    low_pass = butter(params.order, params.envelope_cutoff, btype="lowpass", fs=params.sample_rate, output="sos")
+    # every row is extended at its own ends (not at the end of the block), so its envelope does not depend on the
+    # other rows of the block, over two periods of the envelope cutoff for the transients of the filters to decay
+    n = int(np.ceil(2 * params.sample_rate / params.envelope_cutoff))
+    filtered = sosfiltfilt(band_pass, _odd_extension(signals, lengths, n), axis=1, padlen=0)[:, n:-n]
+    envelopes = sosfiltfilt(low_pass, _odd_extension(np.abs(filtered), lengths, n), axis=1, padlen=0)[:, n:-n]
+    np.maximum(envelopes, 0.0, out=envelopes)       # the low-pass filter overshoots below zero at sharp onsets
+    if params.normalize_amplitude:
+        valid = np.arange(signals.shape[1])[None, :] < np.asarray(lengths)[:, None]
+        peaks = np.where(valid, envelopes, 0.0).max(axis=1)
+        envelopes *= np.divide(100.0, peaks, out=np.zeros_like(peaks), where=peaks > 0)[:, None]
+    return envelopes
+
+
+def process_emg_experiment(exp_id: int, params: EMGParams = EMGParams(), data_state: str = "emg_envelope",
+                           n_points: int | None = N_TIME_POINTS, workers: int | None = None,
+                           block_samples: int = 5_000_000, batch_size: int = 500_000) -> EMGReport | None:
+    """
+    Writes the processed EMG measurements of a raw experiment as a new experiment (see the module docstring).
+
+    Args:
+        exp_id (int): The ID of the raw experiment.
+        params (EMGParams): The filter parameters.
+        data_state (str): The data state of the processed experiment.
+        n_points (int | None): The number of time points per bow stroke, None keeps the samples of the strokes.
+        workers (int | None): Number of filter processes (default: number of CPUs).
+        block_samples (int): Maximum number of samples (rows x columns, including padding) of a 2-D block.
+        batch_size (int): Number of datapoints written per executemany batch.
+
+    Returns:
+        EMGReport | None: The counts and throughput, None if the experiment was already processed.
+    """
+    experiment_repo = ExperimentRepository()
+    participant_repo = ParticipantRepository()
+    measurement_repo = MeasurementRepository()
+    datapoint_repo = DatapointRepository()
+
+    experiments = experiment_repo.get_all_experiments()
+    raw = experiments[experiments["id"] == exp_id] if experiments is not None else None
+    if raw is None or raw.empty:
+        raise ValueError(f"experiment {exp_id} does not exist")
+    raw = raw.iloc[0]
+    if raw["data_state"] != "raw":
+        raise ValueError(f"experiment {exp_id} has data_state '{raw['data_state']}', expected 'raw'")
+    data_folder = f"{raw['data_folder'] or raw['name']}/{data_state}"
+    if data_folder in (experiment_repo.get_complete_data_folders() or []):
+        return None
+    emg = measurement_repo.get_measurements_by_device(EMG_DEVICE, exp_id)
+    if emg is None or emg.empty:
+        raise ValueError(f"experiment {exp_id} has no {EMG_DEVICE} measurements")
+    new_exp_id = experiment_repo.get_experiment_id_by_name_and_data_state(raw["name"], data_state)
+    if new_exp_id is not None and not participant_repo.get_participants_by_exp_id(new_exp_id).empty:
+        raise ValueError(f"the experiment '{raw['name']}' ({data_state}) contains data already")
+
+    start = time.perf_counter()
+    report = EMGReport(raw_exp_id=exp_id, exp_id=0, n_measurements=0, n_strokes=0, n_samples=0, n_datapoints=0,
+                       filter_seconds=0.0, seconds=0.0)
+    report.exp_id = new_exp_id or experiment_repo.insert_experiment(Experiment(id=None, name=raw["name"], data_state=data_state))
+    chunks = [(timepoint, target) for timepoint, target in
+              emg[["timepoint", "target"]].drop_duplicates().sort_values(["timepoint", "target"]).itertuples(index=False)]
+    conn = get_experiment_connection(report.exp_id)     # the writer of the experiment's shard in a sharded database
+    with experiment_scope(report.exp_id), _bulk_load_settings(conn), ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            participant_db_id = _copy_participants(participant_repo, exp_id, report.exp_id)
+            pending = None
+            # the blocks of a timepoint and muscle are filtered while the next one is read
+            for timepoint, target in chunks:
+                facts = datapoint_repo.get_datapoint_facts(exp_id, EMG_DEVICE, timepoint, target)
+                if facts is None:
+                    continue
+                ordered, stroke_starts = _order_strokes(facts.facts)
+                starts, lengths, blocks = _measurement_blocks(ordered, block_samples, workers)
+                futures = [pool.submit(_filter_block, _stack_block(ordered, starts[block], lengths[block]),
+                                       lengths[block], params) for block in blocks]
+                if pending is not None:
+                    _write_chunk(*pending, participant_db_id, measurement_repo, datapoint_repo, params, n_points,
+                                 batch_size, report)
+                pending = (facts.measurements, ordered, stroke_starts, lengths, blocks, futures)
+            if pending is not None:
+                _write_chunk(*pending, participant_db_id, measurement_repo, datapoint_repo, params, n_points,
+                             batch_size, report)
+            datapoint_repo.refresh_aggregates(commit=False)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    experiment_repo.experiment_upload_complete(data_folder, report.exp_id)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def _measurement_blocks(facts: np.ndarray, block_samples: int,
+                        workers: int | None) -> tuple[np.ndarray, np.ndarray, list[slice]]:
+    """
+    Splits the measurements of an ordered fact array into blocks of consecutive measurements whose stacked signals
+    (rows x longest measurement) have at most block_samples samples, and at least one block per worker if there are
+    enough measurements.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, list[slice]]: The index of the first fact and the number of samples of every
+        measurement, and the row slices of the blocks.
+    """
+    ids = facts["measurement_id"]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    lengths = np.diff(np.append(starts, len(facts)))
+    per_worker = -(-len(starts) // (workers or os.cpu_count() or 1))
+    blocks, first, longest = [], 0, 0
+    for row, length in enumerate(lengths.tolist()):
+        longest = max(longest, length)
+        if row > first and ((row - first + 1) * longest > block_samples or row - first == per_worker):
+            blocks.append(slice(first, row))
+            first, longest = row, length
+    blocks.append(slice(first, len(starts)))
+    return starts, lengths, blocks
+
+def _stack_block(facts: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Stacks the samples of measurements to a 2-D array (measurements x samples), padded with the last value of every
+    measurement.
+    """
+    columns = np.arange(int(lengths.max()))[None, :]
+    return facts["value"][np.minimum(starts[:, None] + columns, (starts + lengths - 1)[:, None])]
+
+def _odd_extension(signals: np.ndarray, lengths: np.ndarray, n: int) -> np.ndarray:
+    """
+    Extends every row by its point reflection at its first and last valid sample (n samples each, as sosfiltfilt does
+    for a single signal), the columns after the extension of shorter rows repeat its last value.
+
+    Returns:
+        np.ndarray: The extended signals (rows x n + columns + n), the valid samples start at column n.
+    """
+    rows = np.arange(len(signals))[:, None]
+    last = (np.asarray(lengths) - 1)[:, None]
+    position = np.minimum(np.arange(-n, signals.shape[1] + n)[None, :], last + n)
+    before, after = position < 0, position > last
+    mirrored = np.clip(np.where(before, -position, np.where(after, 2 * last - position, position)), 0, last)
+    values = signals[rows, mirrored]
+    return np.where(before, 2 * signals[:, :1] - values,
+                    np.where(after, 2 * signals[rows, last] - values, values))
+
+def _filter_block(signals: np.ndarray, lengths: np.ndarray, params: EMGParams) -> tuple[np.ndarray, float]:
+    """
+    Computes the envelopes of a block (runs in the filter processes).
+
+    Returns:
+        tuple[np.ndarray, float]: The envelopes and the filter time in seconds.
+    """
+    start = time.perf_counter()
+    envelopes = envelope_signals(signals, lengths, params)
+    return envelopes, time.perf_counter() - start
+
+def _write_chunk(measurements, facts: np.ndarray, stroke_starts: np.ndarray, lengths: np.ndarray,
+                 blocks: list[slice], futures: list[Future], participant_db_id: dict[int, int],
+                 measurement_repo: MeasurementRepository, datapoint_repo: DatapointRepository, params: EMGParams,
+                 n_points: int | None, batch_size: int, report: EMGReport):
+    """
+    Collects the envelopes of a timepoint and muscle and writes its measurements and datapoints (without committing).
+    """
+    values = np.empty(len(facts))
+    for block, future in zip(blocks, futures):
+        envelopes, seconds = future.result()
+        report.filter_seconds += seconds
+        block_lengths = lengths[block]
+        first = int(np.sum(lengths[:block.start]))
+        values[first:first + block_lengths.sum()] = envelopes[
+            np.repeat(np.arange(len(block_lengths)), block_lengths),
+            np.arange(block_lengths.sum()) - np.repeat(np.cumsum(block_lengths) - block_lengths, block_lengths)]
+
+    new_measurement_ids = measurement_repo.insert_many_measurements(
+        [Measurement(id=None, participant_id=participant_db_id[row.participant_db_id], timepoint=row.timepoint,
+                     device=row.device, target=row.target, axis=row.axis,
+                     unit=NORMALIZED_UNIT if params.normalize_amplitude else row.unit)
+         for row in measurements.itertuples()], commit=False)
+    measurement_id = dict(zip(measurements.index, new_measurement_ids))
+    report.n_measurements += len(new_measurement_ids)
+    report.n_strokes += len(stroke_starts)
+    report.n_samples += len(facts)
+
+    if n_points is None:
+        new_ids = np.array([measurement_id[m_id] for m_id in facts["measurement_id"].tolist()], dtype=np.int64)
+        for first in range(0, len(facts), batch_size):
+            last = first + batch_size
+            batch = DatapointBatch(measurement_id=new_ids[first:last], bow_stroke=facts["bow_stroke"][first:last],
+                                   up_down=facts["up_down"][first:last], key=None,
+                                   time_point=facts["time_point"][first:last], value=values[first:last])
+            datapoint_repo.insert_datapoint_batch(batch, commit=False)
+            report.n_datapoints += len(batch)
+        return
+
+    strokes = facts[stroke_starts]
+    resampled = resample_strokes(facts["time_point"], values, stroke_starts, n_points)
+    new_ids = np.array([measurement_id[m_id] for m_id in strokes["measurement_id"].tolist()], dtype=np.int64)
+    per_batch = max(1, batch_size // n_points)
+    for first in range(0, len(strokes), per_batch):
+        last = first + per_batch
+        batch = _stroke_batch(new_ids[first:last], strokes[first:last], resampled[first:last])
+        datapoint_repo.insert_datapoint_batch(batch, commit=False)
+        report.n_datapoints += len(batch)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, required=True, help="ID of the raw experiment")
+    parser.add_argument("--sample-rate", type=float, default=EMGParams.sample_rate, help="sampling frequency [Hz]")
+    parser.add_argument("--band", type=float, nargs=2, default=EMGParams.band, help="pass band [Hz]")
+    parser.add_argument("--envelope-cutoff", type=float, default=EMGParams.envelope_cutoff, help="[Hz]")
+    parser.add_argument("--no-amplitude-normalization", action="store_true")
+    parser.add_argument("--data-state", default="emg_envelope")
+    parser.add_argument("--n-points", type=int, default=N_TIME_POINTS, help="0 keeps the samples of the strokes")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    params = EMGParams(sample_rate=args.sample_rate, band=tuple(args.band), envelope_cutoff=args.envelope_cutoff,
+                       normalize_amplitude=not args.no_amplitude_normalization)
+    report = process_emg_experiment(args.exp_id, params, args.data_state, args.n_points or None, args.workers)
+    print(report if report is not None else "experiment was already processed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Bow-stroke segmentation of continuous motion-capture recordings: derives bow_stroke and up_down from the
+kinematics of a reference signal (e.g. a joint angle of the bowing arm), vectorized over the whole recording:
+    1. missing samples are interpolated and the signal is smoothed (moving average of `smoothing` samples)
+    2. the velocity (sample-to-sample gradient) is classified as moving in one direction (+1), the other (-1) or
+       undecided (0, |velocity| below the hysteresis threshold); undecided samples keep the last direction, so jitter
+       around a turning point does not split a stroke
+    3. runs of the same direction shorter than `min_samples` are merged into the preceding stroke
+    4. every remaining run is one bow stroke, the partial strokes at the start and end of the recording are dropped
+
+segment_recordings runs the segmentation of many recordings in a process pool, and the bulk ingestion
+(ingestion/bulk_ingestion.py) segments measurement files without bow_stroke/up_down columns in its parser processes.
+The resulting StrokeSegments give the stroke-indexed labels of the samples and the rows or DatapointBatch for
+DatapointRepository.insert_datapoint_rows/insert_datapoint_batch.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+import numpy as np
+from models.datapoint_batch import DatapointBatch
+
+@dataclass(frozen=True)
+class SegmentationParams:
+    smoothing: int = 5              # samples of the moving average applied before differentiating
+    hysteresis: float = 0.1         # velocity threshold, as a fraction of the 95th percentile of the absolute velocity
+    min_samples: int = 20           # shorter direction changes are merged into the preceding stroke
+    up_direction: int = 1           # direction (+1 increasing, -1 decreasing reference) of the up-strokes (up_down = 0)
+    drop_edges: bool = True         # whether the partial strokes at the start and end of the recording are dropped
+    reference: str | None = None    # column of a measurement file used as reference (bulk ingestion), the first if None
+
+@dataclass
+class StrokeSegments:
+    starts: np.ndarray              # first sample of every stroke
+    stops: np.ndarray               # sample after the last sample of every stroke
+    up_down: np.ndarray             # 0 = 'up', 1 = 'down' per stroke
+    n_samples: int                  # length of the recording
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.stops - self.starts
+
+    def sample_index(self) -> np.ndarray:
+        """
+        Returns the indices of the samples that belong to a stroke, stroke by stroke.
+        """
+        lengths = self.lengths
+        return np.arange(lengths.sum()) + np.repeat(self.starts - (np.cumsum(lengths) - lengths), lengths)
+
+    def sample_labels(self) -> dict[str, np.ndarray]:
+        """
+        Returns the stroke labels of the samples that belong to a stroke (in the order of sample_index):
+        bow_stroke (numbered from 1), up_down and time_point (sample number within the stroke, from 0).
+        """
+        lengths = self.lengths
+        index = self.sample_index()
+        return {
+            "bow_stroke": np.repeat(np.arange(1, len(self) + 1), lengths),
+            "up_down": np.repeat(self.up_down, lengths),
+            "time_point": index - np.repeat(self.starts, lengths),
+        }
+
+    def datapoint_rows(self, measurement_id: int, values: np.ndarray, key: str | None = None) -> list[tuple]:
+        """
+        Returns the datapoint rows (measurement_id, bow_stroke, up_down, key, time_point, value) of a signal recorded
+        along with the reference (same number of samples), for DatapointRepository.insert_datapoint_rows.
+        """
+        labels = self.sample_labels()
+        values = np.asarray(values, dtype=np.float64)[self.sample_index()]
+        return list(zip(repeat(measurement_id), labels["bow_stroke"].tolist(), labels["up_down"].tolist(), repeat(key),
+                        labels["time_point"].tolist(), values.tolist()))
+
+    def datapoint_batch(self, measurement_id: int, values: np.ndarray, key: str | None = None) -> DatapointBatch:
+        """
+        Returns the datapoints of a signal recorded along with the reference (same number of samples) as a
+        DatapointBatch, for DatapointRepository.insert_datapoint_batch.
+        """
+        labels = self.sample_labels()
+        values = np.asarray(values, dtype=np.float64)[self.sample_index()]
+        return DatapointBatch(measurement_id=measurement_id, bow_stroke=labels["bow_stroke"], up_down=labels["up_down"],
+                              key=None if key is None else np.full(len(values), key, dtype=object),
+                              time_point=labels["time_point"], value=values)
+
+
+def segment_recording(reference: np.ndarray, params: SegmentationParams = SegmentationParams()) -> StrokeSegments:
+    """
+    Detects the bow strokes of a continuous recording (see the module docstring).
+
+    Args:
+        reference (np.ndarray): The reference signal (one value per sample, NaN for missing samples).
+        params (SegmentationParams): The segmentation parameters.
+
+    Returns:
+        StrokeSegments: The detected strokes (none if the reference has no movement).
+    """
+    signal = np.asarray(reference, dtype=np.float64)
+    n = len(signal)
+    valid = ~np.isnan(signal)
+    if valid.sum() < 2:
+        return _no_strokes(n)
+    signal = np.interp(np.arange(n), np.flatnonzero(valid), signal[valid])
+    if params.smoothing > 1:
+        width = min(params.smoothing, n)
+        padded = np.pad(signal, (width // 2, width - 1 - width // 2), mode="edge")
+        cumulative = np.cumsum(np.insert(padded, 0, 0.0))
+        signal = (cumulative[width:] - cumulative[:-width]) / width
+    velocity = np.gradient(signal)
+    threshold = params.hysteresis * np.percentile(np.abs(velocity), 95)
+    direction = np.zeros(n, dtype=np.int8)
+    direction[velocity > threshold] = 1
+    direction[velocity < -threshold] = -1
+    direction = _fill_undecided(direction)
+    if direction[0] == 0:
+        return _no_strokes(n)
+
+    starts = _run_starts(direction)
+    lengths = np.diff(np.append(starts, n))
+    short = lengths < params.min_samples
+    if short.any():
+        direction[np.repeat(short, lengths)] = 0
+        direction = _fill_undecided(direction)
+        if direction[0] == 0:
+            return _no_strokes(n)
+        starts = _run_starts(direction)
+    stops = np.append(starts[1:], n)
+    if params.drop_edges:
+        starts, stops = starts[1:-1], stops[1:-1]
+    up_down = np.where(direction[starts] == params.up_direction, 0, 1).astype(np.int64)
+    return StrokeSegments(starts=starts, stops=stops, up_down=up_down, n_samples=n)
+
+
+def segment_recordings(references: list[np.ndarray], params: SegmentationParams = SegmentationParams(),
+                       workers: int | None = None) -> list[StrokeSegments]:
+    """
+    Segments many recordings in parallel (process pool).
+
+    Args:
+        references (list[np.ndarray]): The reference signal of every recording.
+        params (SegmentationParams): The segmentation parameters.
+        workers (int | None): Number of worker processes (default: number of CPUs).
+
+    Returns:
+        list[StrokeSegments]: The strokes of every recording, in the order of references.
+    """
+    chunksize = max(1, len(references) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(segment_recording, references, repeat(params), chunksize=chunksize))
+
+
+def _fill_undecided(direction: np.ndarray) -> np.ndarray:
+    """
+    Replaces the undecided (0) samples by the last decided direction (leading ones by the first decided direction).
+    """
+    decided = np.flatnonzero(direction)
+    if len(decided) == 0:
+        return direction
+    last = np.maximum.accumulate(np.where(direction != 0, np.arange(len(direction)), decided[0]))
+    return direction[last]
+
+def _run_starts(direction: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.r_[True, direction[1:] != direction[:-1]])
+
+def _no_strokes(n_samples: int) -> StrokeSegments:
+    empty = np.empty(0, dtype=np.int64)
+    return StrokeSegments(starts=empty, stops=empty, up_down=empty, n_samples=n_samples)
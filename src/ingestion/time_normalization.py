@@ -0,0 +1,258 @@
+"""
+Time normalization of 'raw' experiments: every bow stroke (a variable number of samples) is resampled to
+101 equidistant time points by linear interpolation over its time points, and the result is written as a new
+'clean' experiment (same name, participants and measurements) through the repositories.
+
+The strokes of a whole measurement device and timepoint are resampled at once: the samples of all strokes are
+concatenated into one ragged array and interpolated with a single searchsorted over all strokes, there is no loop
+over the strokes in Python. Like the bulk ingestion, the clean experiment is written in one transaction and only
+marked as upload complete (data folder '<raw data folder>/time_normalized') after it has committed.
+
+Run from the src folder, e.g.:
+    python -m ingestion.time_normalization --db ../data/PAH_database.db --exp-id 2
+"""
+import argparse
+import time
+from dataclasses import dataclass
+import numpy as np
+from db.connection import get_connection
+from db.sharding import experiment_scope, get_experiment_connection
+from data_access.experiment_repository import ExperimentRepository
+from data_access.participant_repository import ParticipantRepository
+from data_access.measurement_repository import MeasurementRepository
+from data_access.datapoint_repository import DatapointRepository
+from ingestion.bulk_ingestion import _bulk_load_settings
+from models.experiment import Experiment
+from models.participant import Participant
+from models.measurement import Measurement
+from models.datapoint_batch import DatapointBatch
+
+N_TIME_POINTS = 101
+
+_PARTICIPANT_COLUMNS = ("participant_id", "age", "height_cm", "weight_kg", "instrument", "PRMD_shoulder_neck_right",
+                        "PRMD_shoulder_neck_left", "PRMD_upper_arm_right", "PRMD_upper_arm_left", "PRMD_ever")
+
+@dataclass
+class NormalizationReport:
+    raw_exp_id: int
+    exp_id: int                     # the clean experiment
+    n_measurements: int
+    n_strokes: int
+    n_datapoints: int               # datapoints written (n_strokes x time points)
+    resample_seconds: float         # time spent resampling
+    seconds: float                  # total time (reading, resampling, writing)
+
+    @property
+    def strokes_per_second(self) -> float:
+        return self.n_strokes / self.seconds if self.seconds else 0.0
+
+    @property
+    def resample_strokes_per_second(self) -> float:
+        return self.n_strokes / self.resample_seconds if self.resample_seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"experiment {self.raw_exp_id} -> {self.exp_id}: {self.n_measurements} measurements, "
+                f"{self.n_strokes} strokes, {self.n_datapoints} datapoints in {self.seconds:.1f} s "
+                f"({self.strokes_per_second:,.0f} strokes/s, resampling alone {self.resample_strokes_per_second:,.0f} strokes/s)")
+
+
+def resample_strokes(time_points: np.ndarray, values: np.ndarray, starts: np.ndarray,
+                     n_points: int = N_TIME_POINTS) -> np.ndarray:
+    """
+    Resamples ragged bow strokes to n_points equidistant points each (linear interpolation over the time points,
+    from the first to the last sample of every stroke), vectorized over all strokes.
+
+    Args:
+        time_points (np.ndarray): The time points of the samples of all strokes, concatenated stroke by stroke
+                                  and ascending within every stroke.
+        values (np.ndarray): The values of the samples (same length as time_points).
+        starts (np.ndarray): The index of the first sample of every stroke (ascending, starting at 0).
+        n_points (int): The number of time points per stroke after resampling.
+
+    Returns:
+        np.ndarray: The resampled strokes (strokes x n_points, float64).
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.diff(np.append(starts, len(values)))
+    ends = starts + lengths - 1
+    first = time_points[starts].astype(np.float64)
+    span = time_points[ends] - first
+    span[span == 0] = 1                     # single sample (or constant time point): every grid point takes its value
+    # the position of every sample within its stroke (0..1), offset by 2 per stroke, is ascending over all strokes,
+    # so one searchsorted finds the neighbouring samples of every grid point of every stroke
+    offsets = 2.0 * np.arange(len(starts))
+    position = (time_points - np.repeat(first, lengths)) / np.repeat(span, lengths) + np.repeat(offsets, lengths)
+    grid = np.linspace(0.0, 1.0, n_points)[None, :] + offsets[:, None]
+    right = np.minimum(np.searchsorted(position, grid), ends[:, None])
+    left = np.maximum(right - 1, starts[:, None])
+    distance = position[right] - position[left]
+    weight = np.divide(grid - position[left], distance, out=np.zeros_like(grid), where=distance > 0)
+    values = np.asarray(values, dtype=np.float64)
+    return values[left] + weight * (values[right] - values[left])
+
+
+def normalize_experiment(exp_id: int, n_points: int = N_TIME_POINTS, name: str | None = None,
+                         batch_size: int = 500_000) -> NormalizationReport | None:
+    """
+    Writes the time-normalized copy of a raw experiment as a new clean experiment (see the module docstring).
+
+    Args:
+        exp_id (int): The ID of the raw experiment.
+        n_points (int): The number of time points per bow stroke.
+        name (str | None): The name of the clean experiment (default: the name of the raw experiment).
+        batch_size (int): Number of datapoints written per executemany batch.
+
+    Returns:
+        NormalizationReport | None: The counts and throughput, None if the experiment was already normalized.
+    """
+    experiment_repo = ExperimentRepository()
+    participant_repo = ParticipantRepository()
+    measurement_repo = MeasurementRepository()
+    datapoint_repo = DatapointRepository()
+
+    experiments = experiment_repo.get_all_experiments()
+    raw = experiments[experiments["id"] == exp_id] if experiments is not None else None
+    if raw is None or raw.empty:
+        raise ValueError(f"experiment {exp_id} does not exist")
+    raw = raw.iloc[0]
+    if raw["data_state"] != "raw":
+        raise ValueError(f"experiment {exp_id} has data_state '{raw['data_state']}', expected 'raw'")
+    data_folder = f"{raw['data_folder'] or raw['name']}/time_normalized"
+    if data_folder in (experiment_repo.get_complete_data_folders() or []):
+        return None
+    name = name or raw["name"]
+    clean_exp_id = experiment_repo.get_experiment_id_by_name_and_data_state(name, "clean")
+    if clean_exp_id is not None and not participant_repo.get_participants_by_exp_id(clean_exp_id).empty:
+        raise ValueError(f"the clean experiment '{name}' contains data already, pass another name")
+
+    start = time.perf_counter()
+    resample_seconds = 0.0
+    n_measurements, n_strokes, n_datapoints = 0, 0, 0
+    clean_exp_id = clean_exp_id or experiment_repo.insert_experiment(Experiment(id=None, name=name, data_state="clean"))
+    conn = get_experiment_connection(clean_exp_id)      # the writer of the experiment's shard in a sharded database
+    with experiment_scope(clean_exp_id), _bulk_load_settings(conn):
+        try:
+            participant_db_id = _copy_participants(participant_repo, exp_id, clean_exp_id)
+
+            for device in measurement_repo.get_measurement_devices(exp_id) or []:
+                for timepoint in measurement_repo.get_measurement_timepoints(exp_id, device) or []:
+                    facts = datapoint_repo.get_datapoint_facts(exp_id, device, timepoint)
+                    if facts is None:
+                        continue
+                    measurements = facts.measurements
+                    new_measurement_ids = measurement_repo.insert_many_measurements(
+                        [Measurement(id=None, participant_id=participant_db_id[row.participant_db_id],
+                                     timepoint=row.timepoint, device=row.device, target=row.target, axis=row.axis,
+                                     unit=row.unit) for row in measurements.itertuples()], commit=False)
+                    measurement_id = dict(zip(measurements.index, new_measurement_ids))
+                    n_measurements += len(new_measurement_ids)
+
+                    resample_start = time.perf_counter()
+                    strokes, resampled = _resample_facts(facts.facts, n_points)
+                    resample_seconds += time.perf_counter() - resample_start
+                    n_strokes += len(strokes)
+
+                    new_ids = np.array([measurement_id[m_id] for m_id in strokes["measurement_id"].tolist()], dtype=np.int64)
+                    per_batch = max(1, batch_size // n_points)
+                    for first in range(0, len(strokes), per_batch):
+                        last = first + per_batch
+                        batch = _stroke_batch(new_ids[first:last], strokes[first:last], resampled[first:last])
+                        datapoint_repo.insert_datapoint_batch(batch, commit=False)
+                        n_datapoints += len(batch)
+            datapoint_repo.refresh_aggregates(commit=False)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    experiment_repo.experiment_upload_complete(data_folder, clean_exp_id)
+    return NormalizationReport(raw_exp_id=exp_id, exp_id=clean_exp_id, n_measurements=n_measurements,
+                               n_strokes=n_strokes, n_datapoints=n_datapoints, resample_seconds=resample_seconds,
+                               seconds=time.perf_counter() - start)
+
+
+def _resample_facts(facts: np.ndarray, n_points: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Resamples the strokes of a fact array (FACT_DTYPE).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The first fact of every stroke (for measurement_id, bow_stroke, up_down)
+        and the resampled strokes (strokes x n_points).
+    """
+    facts, starts = _order_strokes(facts)
+    return facts[starts], resample_strokes(facts["time_point"], facts["value"], starts, n_points)
+
+def _stroke_batch(measurement_ids: np.ndarray, strokes: np.ndarray, values: np.ndarray) -> DatapointBatch:
+    """
+    Builds the DatapointBatch of resampled strokes: one row of values (time points 0 .. n_points - 1) per stroke,
+    the stroke labels (bow_stroke, up_down) from the facts of its first sample and the new measurement IDs.
+    """
+    n_points = values.shape[1]
+    return DatapointBatch(measurement_id=np.repeat(measurement_ids, n_points),
+                          bow_stroke=np.repeat(strokes["bow_stroke"], n_points),
+                          up_down=np.repeat(strokes["up_down"], n_points), key=None,
+                          time_point=np.tile(np.arange(n_points), len(strokes)), value=values.ravel())
+
+def _order_strokes(facts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sorts a fact array (FACT_DTYPE) by (measurement_id, bow_stroke, up_down, time_point).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The sorted facts and the index of the first fact of every stroke.
+    """
+    if not _is_stroke_ordered(facts):       # the facts usually arrive in index order already
+        facts = facts[np.lexsort((facts["time_point"], facts["up_down"], facts["bow_stroke"], facts["measurement_id"]))]
+    new_stroke = np.ones(len(facts), dtype=bool)
+    new_stroke[1:] = ((facts["measurement_id"][1:] != facts["measurement_id"][:-1])
+                      | (facts["bow_stroke"][1:] != facts["bow_stroke"][:-1])
+                      | (facts["up_down"][1:] != facts["up_down"][:-1]))
+    return facts, np.flatnonzero(new_stroke)
+
+def _is_stroke_ordered(facts: np.ndarray) -> bool:
+    """
+    Whether a fact array is sorted by (measurement_id, bow_stroke, up_down, time_point).
+    """
+    ascending = np.diff(facts["time_point"].astype(np.int64)) >= 0
+    for name in ("up_down", "bow_stroke", "measurement_id"):
+        difference = np.diff(facts[name].astype(np.int64))
+        ascending = (difference > 0) | ((difference == 0) & ascending)
+    return bool(ascending.all())
+
+def _copy_participants(participant_repo: ParticipantRepository, exp_id: int, new_exp_id: int) -> dict[int, int]:
+    """
+    Copies the participants of an experiment to another experiment (without committing).
+
+    Returns:
+        dict[int, int]: The new database ID of every copied participant (by its database ID).
+    """
+    participants = participant_repo.get_participants_by_exp_id(exp_id)
+    new_participant_ids = participant_repo.insert_many_participants(
+        [Participant(id=None, experiment_id=new_exp_id,
+                     **{column: _optional(row[column]) for column in _PARTICIPANT_COLUMNS})
+         for _, row in participants.iterrows()], commit=False)
+    return dict(zip(participants["id"], new_participant_ids))
+
+def _optional(value):
+    """
+    Converts missing values (NaN/None of a DataFrame row) to None and numpy scalars to Python values.
+    """
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="../data/PAH_database.db")
+    parser.add_argument("--exp-id", type=int, required=True, help="ID of the raw experiment")
+    parser.add_argument("--n-points", type=int, default=N_TIME_POINTS)
+    parser.add_argument("--name", default=None, help="name of the clean experiment (default: name of the raw experiment)")
+    args = parser.parse_args()
+
+    get_connection(args.db)
+    report = normalize_experiment(args.exp_id, args.n_points, args.name)
+    print(report if report is not None else "experiment was already normalized")
+
+
+if __name__ == "__main__":
+    main()
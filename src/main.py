@@ -1,29 +1,25 @@
-from data_access.experiment_repository import ExperimentRepository
-from data_access.participant_repository import ParticipantRepository
-from data_access.measurement_repository import MeasurementRepository
-from data_access.datapoint_repository import DatapointRepository
+from data_access.repositories import Repositories
 
-# intialize the database repos
-experiment_repo = ExperimentRepository()
-participant_repo = ParticipantRepository()
-measurement_repo = MeasurementRepository()
-datapoint_repo = DatapointRepository()          # this should be enough, if you only want to access the actual values
+# the database repos, every repository is only created when it is used first (repos.experiment, repos.participant,
+#       repos.measurement, repos.datapoint). Repositories(result_type='records') or Repositories(result_type='tuples')
+#       return NumPy record arrays or lists of tuples instead of DataFrames (and pandas is not imported)
+repos = Repositories()
 
 ###########################################################################################################################
 #                                           EXAMPLE DATA ACCESS
 ###########################################################################################################################
 # load the data from the database (there are different functions for different data-subsets.
 #       more functions for data access can be created, if needed)
-exp_id = experiment_repo.get_experiment_id_by_name_and_data_state('mpa', 'clean')           # selects the database id from the database, 
+exp_id = repos.experiment.get_experiment_id_by_name_and_data_state('mpa', 'clean')           # selects the database id from the database, 
                                                                                             # that corresponds to the experiment with 'clean mpa' data (you can also replace it with 1, as there is currently only one id)  
 
-df = datapoint_repo.get_datapoints_by_exp_id_device_and_timepoint(exp_id, 'mocap', 'pre')   # selects all datapoints for mocap of the pre-measurement
+df = repos.datapoint.get_datapoints_by_exp_id_device_and_timepoint(exp_id, 'mocap', 'pre')   # selects all datapoints for mocap of the pre-measurement
 
-df_nopain = datapoint_repo.get_datapoints_nopain_by_exp_id_device_and_timepoint(exp_id, 'mocap', 'pre') # selects all datapoints for mocap of the pre-measurement, 
+df_nopain = repos.datapoint.get_datapoints_nopain_by_exp_id_device_and_timepoint(exp_id, 'mocap', 'pre') # selects all datapoints for mocap of the pre-measurement, 
                                                                                                         # but without the pain information 
-meas_target = measurement_repo.get_measurement_target_by_id(1)                                          # selects a target (e.g. 'left elbow joint angle', by the measurement id, you can also replace this variable with the actual name of the target)                                                 
+meas_target = repos.measurement.get_measurement_target_by_id(1)                                          # selects a target (e.g. 'left elbow joint angle', by the measurement id, you can also replace this variable with the actual name of the target)                                                 
 
-df_target = datapoint_repo.get_datapoints_by_exp_id_device_timepoint_target(exp_id, 'mocap', 'pre', meas_target)    # selects all datapoints one target for mocap of the pre-measurement, 
+df_target = repos.datapoint.get_datapoints_by_exp_id_device_timepoint_target(exp_id, 'mocap', 'pre', meas_target)    # selects all datapoints one target for mocap of the pre-measurement, 
 
 print("")
 
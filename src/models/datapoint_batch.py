@@ -0,0 +1,109 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterator
+import numpy as np
+from models.datapoint import Datapoint
+
+@dataclass
+class DatapointBatch:
+    measurement_id: np.ndarray      # int64 per datapoint
+    bow_stroke: np.ndarray          # int64 per datapoint
+    up_down: np.ndarray             # int8 per datapoint, -1 where up_down is not set
+    key: np.ndarray | None          # object (str or None) per datapoint, None if no datapoint has a key
+    time_point: np.ndarray          # int64 per datapoint
+    value: np.ndarray               # float64 per datapoint, NaN where the datapoint has no value
+
+    def __post_init__(self):
+        """
+        Converts the columns to their dtypes; scalar columns (e.g. the measurement_id of a batch of one measurement)
+        are repeated for every datapoint.
+        """
+        self.value = np.asarray(self.value, dtype=np.float64)
+        n = len(self.value)
+        for name, dtype in (("measurement_id", np.int64), ("bow_stroke", np.int64), ("up_down", np.int8),
+                            ("time_point", np.int64)):
+            column = np.asarray(getattr(self, name), dtype=dtype)
+            setattr(self, name, np.full(n, column, dtype=dtype) if column.ndim == 0 else column)
+        if self.key is not None:
+            self.key = np.asarray(self.key, dtype=object)
+        if any(len(column) != n for column in self._columns() if column is not None):
+            raise ValueError("all columns of a DatapointBatch must have the same length")
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The memory used by the columns (in bytes, the key strings not included).
+        """
+        return sum(column.nbytes for column in self._columns() if column is not None)
+
+    @classmethod
+    def from_datapoints(cls, datapoints: list[Datapoint]) -> DatapointBatch:
+        """
+        Builds a batch from Datapoint objects (up_down None becomes -1, value None becomes NaN).
+        """
+        keys = [dp.key for dp in datapoints]
+        return cls(measurement_id=[dp.measurement_id for dp in datapoints],
+                   bow_stroke=[dp.bow_stroke for dp in datapoints],
+                   up_down=[-1 if dp.up_down is None else dp.up_down for dp in datapoints],
+                   key=keys if any(key is not None for key in keys) else None,
+                   time_point=[dp.time_point for dp in datapoints],
+                   value=[np.nan if dp.value is None else dp.value for dp in datapoints])
+
+    @classmethod
+    def concatenate(cls, batches: list[DatapointBatch]) -> DatapointBatch:
+        """
+        Concatenates batches into one batch (in the order of batches).
+        """
+        has_key = any(batch.key is not None for batch in batches)
+        return cls(measurement_id=np.concatenate([batch.measurement_id for batch in batches]),
+                   bow_stroke=np.concatenate([batch.bow_stroke for batch in batches]),
+                   up_down=np.concatenate([batch.up_down for batch in batches]),
+                   key=np.concatenate([batch.key if batch.key is not None else np.full(len(batch), None, dtype=object)
+                                       for batch in batches]) if has_key else None,
+                   time_point=np.concatenate([batch.time_point for batch in batches]),
+                   value=np.concatenate([batch.value for batch in batches]))
+
+    def to_datapoints(self) -> list[Datapoint]:
+        """
+        Converts the batch to Datapoint objects (without database IDs).
+        """
+        return [Datapoint(None, *row) for row in self.rows()]
+
+    def rows(self, chunk_size: int = 65_536) -> Iterator[tuple]:
+        """
+        Yields the datapoints as (measurement_id, bow_stroke, up_down, key, time_point, value) tuples with Python
+        scalars (up_down -1 and value NaN as None), e.g. to bind them with executemany. The columns are converted
+        chunk by chunk, so only chunk_size tuples exist at a time.
+        """
+        for start in range(0, len(self), chunk_size):
+            stop = start + chunk_size
+            up_down = self.up_down[start:stop]
+            value = self.value[start:stop]
+            yield from zip(self.measurement_id[start:stop].tolist(), self.bow_stroke[start:stop].tolist(),
+                           _with_none(up_down, up_down < 0),
+                           self.key[start:stop].tolist() if self.key is not None else [None] * len(value),
+                           self.time_point[start:stop].tolist(),
+                           _with_none(value, np.isnan(value)))
+
+    def take(self, index) -> DatapointBatch:
+        """
+        Returns the datapoints at the given positions (slice, integer or boolean index array, not a single integer) as a new batch.
+        """
+        return DatapointBatch(measurement_id=self.measurement_id[index], bow_stroke=self.bow_stroke[index],
+                              up_down=self.up_down[index], key=self.key[index] if self.key is not None else None,
+                              time_point=self.time_point[index], value=self.value[index])
+
+    def _columns(self) -> tuple:
+        return self.measurement_id, self.bow_stroke, self.up_down, self.key, self.time_point, self.value
+
+
+def _with_none(values: np.ndarray, missing: np.ndarray) -> list:
+    """
+    Converts values to a list of Python scalars with None where missing is True.
+    """
+    if not missing.any():
+        return values.tolist()
+    return np.where(missing, None, values).tolist()
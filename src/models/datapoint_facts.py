@@ -0,0 +1,63 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# dtype of the fact array, one entry per datapoint (up_down is -1 where it is not set)
+FACT_DTYPE = np.dtype([("measurement_id", np.int64), ("bow_stroke", np.int32), ("up_down", np.int8),
+                       ("time_point", np.int16), ("value", np.float64)])
+
+@dataclass
+class DatapointFacts:
+    facts: np.ndarray               # structured array (FACT_DTYPE), one entry per datapoint
+    measurements: pd.DataFrame      # measurement dimension, index measurement_id: participant_db_id, timepoint, device, target, axis, unit
+    participants: pd.DataFrame      # participant dimension, index participant_db_id: experiment_id, experiment_name, participant_id,
+                                    # instrument, PRMD_shoulder_neck_right, ..., PRMD_ever
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns one column per datapoint: a fact column, or a column of the measurement/participant dimension
+        joined to the facts (only this column is materialized).
+
+        Args:
+            name (str): The name of the column (e.g. 'value', 'target' or 'participant_id').
+
+        Returns:
+            np.ndarray: The values of the column, one per datapoint.
+        """
+        if name in FACT_DTYPE.names:
+            return self.facts[name]
+        measurement_rows = self.measurements.index.get_indexer(self.facts["measurement_id"])
+        if name in self.measurements.columns:
+            return self.measurements[name].to_numpy().take(measurement_rows)
+        participant_db_ids = self.measurements["participant_db_id"].to_numpy().take(measurement_rows)
+        return self.participants[name].to_numpy().take(self.participants.index.get_indexer(participant_db_ids))
+
+    def to_frame(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """
+        Joins the facts with their dimensions into a long-format DataFrame (one row per datapoint),
+        like the result of DatapointRepository.get_datapoints_by_exp_id.
+
+        Args:
+            columns (list[str] | None): The fact and dimension columns to include, all columns if None.
+
+        Returns:
+            pd.DataFrame: The joined datapoints.
+        """
+        import pandas as pd
+        if columns is None:
+            columns = [*self.participants.columns, "measurement_id",
+                       *(column for column in self.measurements.columns if column != "participant_db_id"),
+                       "bow_stroke", "up_down", "time_point", "value"]
+        return pd.DataFrame({column: self.column(column) for column in columns})
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The memory used by the facts and both dimensions (in bytes, including the strings of the dimensions).
+        """
+        return (self.facts.nbytes + int(self.measurements.memory_usage(deep=True).sum())
+                + int(self.participants.memory_usage(deep=True).sum()))
@@ -0,0 +1,13 @@
+from dataclasses import dataclass
+import numpy as np
+
+@dataclass
+class ExperimentTensor:
+    values: np.ndarray              # (participant, timepoint, channel, stroke, time_point), NaN where a stroke is missing
+    participant_ids: np.ndarray     # participant_id per index of axis 0
+    timepoints: np.ndarray          # measurement timepoint (e.g. 'pre') per index of axis 1
+    targets: np.ndarray             # target per channel (axis 2)
+    axes: np.ndarray                # axis per channel (axis 2), '' for measurements without axis (e.g. emg)
+    bow_strokes: np.ndarray         # bow_stroke number per stroke (axis 3)
+    time_points: np.ndarray         # time_point per index of axis 4
+    up_down: np.ndarray             # up_down per stroke (axis 3), -1 if not set (see models.feature_matrix.ROW_LABEL_DTYPE)
@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+import numpy as np
+
+# dtypes of the label arrays that describe the rows and columns of a FeatureMatrix
+# (up_down is -1 for strokes without up_down, a NULL in the database, like in DatapointBatch and DatapointFacts)
+ROW_LABEL_DTYPE = np.dtype([("participant_id", object), ("bow_stroke", np.int64), ("up_down", np.int64)])
+COLUMN_LABEL_DTYPE = np.dtype([("target", object), ("axis", object), ("time_point", np.int64)])
+# column labels of matrices that combine several devices/timepoints (data_access/fanout_loader.py)
+SELECTION_COLUMN_LABEL_DTYPE = np.dtype([("device", object), ("timepoint", object), ("target", object), ("axis", object),
+                                         ("time_point", np.int64)])
+
+@dataclass
+class FeatureMatrix:
+    values: np.ndarray              # (strokes x targets*axes*time_points), NaN where a stroke is missing for a target/axis
+    row_labels: np.ndarray          # structured array (participant_id, bow_stroke, up_down), one entry per row
+    column_labels: np.ndarray       # structured array (target, axis, time_point), one entry per column